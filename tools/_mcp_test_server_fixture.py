@@ -0,0 +1,573 @@
+#!/usr/bin/env python3
+"""
+Shared MCP Server Fixture for the Compliance Test Suites
+Starts the server under test once and lets every test talk to it over one session
+"""
+
+import asyncio
+import contextlib
+import json
+import os
+import select
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, List
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# orjson encodes straight to bytes and is much faster when available
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj) -> bytes:
+        # Compact separators match orjson's output and skip the padding bytes
+        return json.dumps(obj, separators=(",", ":")).encode()
+    _loads = json.loads
+
+# Server under test, resolved once at import; None when it is missing
+SERVER_SCRIPT_PATH = Path(__file__).parent / "esp32_debug_mcp_server.py"
+try:
+    SERVER_SCRIPT = SERVER_SCRIPT_PATH.resolve(strict=True)
+except (FileNotFoundError, RuntimeError):
+    SERVER_SCRIPT = None
+
+# Incremental decoder for messages that span several lines
+_DECODER = json.JSONDecoder()
+_INCOMPLETE = object()
+_GARBAGE = object()
+
+# Longest wait for the server to produce a response
+RESPONSE_TIMEOUT = 10.0
+
+# Large pipes let the server write a whole tools/list response without blocking
+PIPE_SIZE = 1 << 20
+# fcntl only exposes F_SETPIPE_SZ from Python 3.10; 1031 is the Linux value
+F_SETPIPE_SZ = getattr(fcntl, "F_SETPIPE_SZ", 1031) if fcntl else None
+
+def _pipe_size() -> int:
+    """Return PIPE_SIZE clamped to the system limit, or 0 where pipe size cannot be set"""
+    if F_SETPIPE_SZ is None:
+        return 0
+    try:
+        with open("/proc/sys/fs/pipe-max-size") as f:
+            return min(PIPE_SIZE, int(f.read()))
+    except (OSError, ValueError):
+        return 0
+
+def _enlarge_pipes(*pipes):
+    """Grow the given pipes to the clamped size on Linux; other systems keep their default"""
+    size = _pipe_size()
+    if not size:
+        return
+    for pipe in pipes:
+        try:
+            fcntl.fcntl(pipe.fileno(), F_SETPIPE_SZ, size)
+        except (OSError, ValueError):
+            pass
+
+def _popen_pipe_kwargs() -> Dict[str, int]:
+    """Popen keyword arguments asking for enlarged pipes (Python 3.10+)"""
+    size = _pipe_size()
+    return {"pipesize": size} if size and sys.version_info >= (3, 10) else {}
+
+# MCP_TEST_TRANSPORT=unix gives the server a UNIX socket pair as stdin/stdout
+# instead of pipes; the default stdio pipes suit CI hosts without AF_UNIX
+TRANSPORT = os.environ.get("MCP_TEST_TRANSPORT", "stdio")
+
+def _use_unix_socket() -> bool:
+    """Return True when the server should talk over a UNIX socket pair"""
+    return TRANSPORT == "unix" and hasattr(socket, "AF_UNIX")
+
+def _socket_pair():
+    """Return (ours, theirs) connected UNIX stream sockets with large buffers"""
+    ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    for sock in (ours, theirs):
+        for option in (socket.SO_SNDBUF, socket.SO_RCVBUF):
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, option, PIPE_SIZE)
+            except OSError:
+                pass
+    return ours, theirs
+
+DEFAULT_INIT_PARAMS = {
+    "protocolVersion": "2024-11-05",
+    "capabilities": {},
+    "clientInfo": {"name": "test-client", "version": "1.0.0"}
+}
+
+# Default handshake, serialised once; id 1 is reserved for it
+_INIT_REQUEST = _dumps({
+    "jsonrpc": "2.0",
+    "method": "initialize",
+    "params": DEFAULT_INIT_PARAMS,
+    "id": 1
+})
+_INITIALIZED = _dumps({"jsonrpc": "2.0", "method": "notifications/initialized"})
+# Both handshake messages go out in one write; the server handles them in order
+_HANDSHAKE = _INIT_REQUEST + b"\n" + _INITIALIZED + b"\n"
+
+class _JSONRPCFraming:
+    """Receive buffer and message framing shared by the sync and async proxies"""
+    
+    def __init__(self):
+        self._rx_buf = b""
+        self._stderr_buf = b""
+        self._use_content_length = False
+        self._request_id = 1
+        self._tools_cache = None
+        
+    def _handle_notification(self, message: Dict[str, Any]):
+        """React to server notifications that invalidate cached results"""
+        if message.get("method") == "notifications/tools/list_changed":
+            self._tools_cache = None
+        
+    def _frame(self, body: bytes) -> bytes:
+        """Frame an encoded message the way the server frames its responses"""
+        if self._use_content_length:
+            return b"Content-Length: %d\r\n\r\n" % len(body) + body
+        return body + b"\n"
+    
+    def _next_buffered_message(self):
+        """Pop and decode one complete JSON-RPC message from the receive buffer, or None if more data is needed
+        
+        The MCP stdio transport frames one message per line. A server that
+        sends Content-Length headers instead is read with one slice per
+        message, and requests switch to the same framing from then on.
+        A message that spans several lines, such as pretty-printed JSON, is
+        decoded incrementally with raw_decode().
+        """
+        while True:
+            self._rx_buf = self._rx_buf.lstrip()
+            if self._rx_buf.startswith(b"Content-Length:"):
+                header_end = self._rx_buf.find(b"\r\n\r\n")
+                if header_end < 0:
+                    return None
+                length = int(self._rx_buf[len(b"Content-Length:"):header_end].split(b"\r\n", 1)[0])
+                body_start = header_end + 4
+                if len(self._rx_buf) < body_start + length:
+                    return None
+                self._use_content_length = True
+                body = self._rx_buf[body_start:body_start + length]
+                self._rx_buf = self._rx_buf[body_start + length:]
+                return _loads(body)
+            
+            newline = self._rx_buf.find(b"\n")
+            if self._rx_buf.startswith((b"{", b"[")):
+                # Fast path: the whole message is on one line
+                if newline >= 0:
+                    try:
+                        message = _loads(self._rx_buf[:newline])
+                        self._rx_buf = self._rx_buf[newline + 1:]
+                        return message
+                    except ValueError:
+                        pass
+                message = self._raw_decode()
+                if message is _INCOMPLETE:
+                    return None
+                if message is not _GARBAGE:
+                    return message
+            
+            # Anything else, such as the startup banner, is skipped a line at a time
+            if newline < 0:
+                return None
+            self._rx_buf = self._rx_buf[newline + 1:]
+            
+    def _raw_decode(self):
+        """Decode one JSON value from the start of the receive buffer
+        
+        Returns _INCOMPLETE while the value is still arriving and _GARBAGE
+        when the buffer does not start with valid JSON.
+        """
+        try:
+            text = self._rx_buf.decode("utf-8")
+        except UnicodeDecodeError as e:
+            # A multi-byte character may be split across reads
+            text = self._rx_buf[:e.start].decode("utf-8")
+        try:
+            message, end = _DECODER.raw_decode(text)
+        except json.JSONDecodeError as e:
+            if e.pos >= len(text.rstrip()) or e.msg.startswith("Unterminated string"):
+                return _INCOMPLETE
+            return _GARBAGE
+        self._rx_buf = self._rx_buf[len(text[:end].encode("utf-8")):]
+        return message
+
+class MCPServerProxy(_JSONRPCFraming):
+    """Thread-safe JSON-RPC client for one running MCP server process
+    
+    Requests get unique ids and responses are matched by id, so several
+    tests can have requests in flight on the same session at once.
+    """
+    
+    def __init__(self, proc: subprocess.Popen, sock: socket.socket = None):
+        super().__init__()
+        self.proc = proc
+        self.init_response = None
+        # A socket pair carries both directions on one descriptor
+        if sock is not None:
+            self._stdin_fd = self._stdout_fd = sock.fileno()
+        else:
+            self._stdin_fd = proc.stdin.fileno()
+            self._stdout_fd = proc.stdout.fileno()
+        self._stderr_fd = proc.stderr.fileno()
+        # Non-blocking pipes so select() decides which one to read
+        os.set_blocking(self._stdout_fd, False)
+        os.set_blocking(self._stderr_fd, False)
+        self._responses = {}
+        self._id_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+    
+    def next_id(self) -> int:
+        """Return a fresh request id so responses can be matched to requests"""
+        with self._id_lock:
+            self._request_id += 1
+            return self._request_id
+    
+    def handshake(self) -> Dict[str, Any]:
+        """Run the default initialize/initialized handshake, returning the initialize response"""
+        try:
+            self._write(_HANDSHAKE)
+            self.init_response = self.wait_response(1)
+        except OSError as e:
+            self.init_response = {"error": str(e)}
+        return self.init_response
+    
+    def initialize(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Re-initialize the session with the given params, sending initialized in the same write"""
+        request_id = self.next_id()
+        request = {"jsonrpc": "2.0", "method": "initialize", "params": params, "id": request_id}
+        try:
+            self._write(self._frame(_dumps(request)) + self._frame(_INITIALIZED))
+        except OSError as e:
+            return {"error": str(e)}
+        return self.wait_response(request_id)
+    
+    def request(self, method: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Send JSON-RPC request and wait for its response"""
+        request_id = self.next_id()
+        request = {"jsonrpc": "2.0", "method": method, "id": request_id}
+        if params is not None:
+            request["params"] = params
+        
+        try:
+            self._write(self._frame(_dumps(request)))
+        except OSError as e:
+            return {"error": str(e)}
+        return self.wait_response(request_id)
+    
+    def get_tools(self) -> Dict[str, Any]:
+        """Return the tools/list response, cached until the server reports a change"""
+        if self._tools_cache is None:
+            response = self.request("tools/list", {})
+            if "error" in response:
+                return response
+            self._tools_cache = response
+        return self._tools_cache
+        
+    def notify(self, method: str, params: Dict[str, Any] = None):
+        """Send JSON-RPC notification (no response expected)"""
+        notification = {"jsonrpc": "2.0", "method": method}
+        if params is not None:
+            notification["params"] = params
+        try:
+            self._write(self._frame(_dumps(notification)))
+        except OSError:
+            pass
+    
+    def send_batch(self, requests: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+        """Send several JSON-RPC messages in one write and collect the responses by id
+        
+        Messages are pipelined as consecutive lines because the MCP stdio
+        transport frames one message per line; a server replying with a
+        batch array is accepted too. Notifications get no response.
+        """
+        try:
+            self._write(b"".join(self._frame(_dumps(request)) for request in requests))
+        except OSError as e:
+            print(f"⚠️  Batch request failed: {e}")
+            return {}
+        
+        responses = {}
+        for request in requests:
+            if "id" in request:
+                response = self.wait_response(request["id"])
+                if "id" in response:
+                    responses[request["id"]] = response
+        return responses
+    
+    def wait_response(self, request_id: int, timeout: float = RESPONSE_TIMEOUT) -> Dict[str, Any]:
+        """Wait for the response with the given id
+        
+        Whichever thread holds the read lock reads frames for everyone and
+        parks responses that belong to other requests.
+        """
+        deadline = time.monotonic() + timeout
+        if not self._read_lock.acquire(timeout=timeout):
+            return {"error": "Request timeout"}
+        try:
+            while request_id not in self._responses:
+                message = self._read_message(deadline)
+                if message is None:
+                    return {"error": f"No response. stderr: {self.stderr_text()}"}
+                for response in (message if isinstance(message, list) else [message]):
+                    if not isinstance(response, dict):
+                        continue
+                    if "id" in response:
+                        self._responses[response["id"]] = response
+                    else:
+                        self._handle_notification(response)
+            return self._responses.pop(request_id)
+        finally:
+            self._read_lock.release()
+    
+    def stderr_text(self) -> str:
+        """Return the server's stderr output so far, for error messages"""
+        try:
+            self._stderr_buf += os.read(self._stderr_fd, 65536)
+        except (BlockingIOError, OSError):
+            pass
+        return self._stderr_buf.decode(errors="replace")
+    
+    def _write(self, data: bytes):
+        """Write already-framed bytes straight to the server's stdin descriptor"""
+        with self._write_lock:
+            view = memoryview(data)
+            while view:
+                try:
+                    view = view[os.write(self._stdin_fd, view):]
+                except BlockingIOError:
+                    # A socket shares its non-blocking flag with the read side
+                    select.select([], [self._stdin_fd], [])
+    
+    def _read_message(self, deadline: float):
+        """Return the next decoded JSON-RPC message from the server, or None at end of output or deadline
+        
+        Output is read in large chunks, skipping non-JSON lines such as the
+        server's startup banner. stderr is drained into a separate buffer as
+        it arrives so the server never blocks on it.
+        """
+        watched = [self._stdout_fd, self._stderr_fd]
+        while True:
+            message = self._next_buffered_message()
+            if message is not None:
+                return message
+            
+            remaining = deadline - time.monotonic()
+            ready = select.select(watched, [], [], remaining)[0] if remaining > 0 else []
+            if not ready:
+                return None
+            
+            if self._stderr_fd in ready:
+                data = os.read(self._stderr_fd, 65536)
+                if data:
+                    self._stderr_buf += data
+                else:
+                    watched.remove(self._stderr_fd)
+            
+            if self._stdout_fd in ready:
+                chunk = os.read(self._stdout_fd, 65536)
+                if not chunk:
+                    return None
+                self._rx_buf += chunk
+
+class AsyncMCPServerProxy(_JSONRPCFraming):
+    """asyncio JSON-RPC client for one running MCP server process
+    
+    A reader task resolves one future per request id, so coroutines can
+    submit requests back to back and await their responses together.
+    """
+    
+    def __init__(self, proc: asyncio.subprocess.Process,
+                 reader: asyncio.StreamReader = None, writer: asyncio.StreamWriter = None):
+        super().__init__()
+        self.proc = proc
+        self.init_response = None
+        self._reader = reader or proc.stdout
+        self._writer = writer or proc.stdin
+        self._pending = {}
+        self._closed = False
+        self._reader_task = asyncio.ensure_future(self._read_loop())
+        self._stderr_task = asyncio.ensure_future(self._drain_stderr())
+        
+    def next_id(self) -> int:
+        """Return a fresh request id so responses can be matched to requests"""
+        self._request_id += 1
+        return self._request_id
+        
+    async def handshake(self) -> Dict[str, Any]:
+        """Run the default initialize/initialized handshake, returning the initialize response"""
+        self.init_response = await self._exchange(1, _HANDSHAKE)
+        return self.init_response
+        
+    async def initialize(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Re-initialize the session with the given params, sending initialized in the same write"""
+        request_id = self.next_id()
+        request = {"jsonrpc": "2.0", "method": "initialize", "params": params, "id": request_id}
+        return await self._exchange(request_id, self._frame(_dumps(request)) + self._frame(_INITIALIZED))
+        
+    async def request(self, method: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Send JSON-RPC request and await its response"""
+        request_id = self.next_id()
+        request = {"jsonrpc": "2.0", "method": method, "id": request_id}
+        if params is not None:
+            request["params"] = params
+        return await self._exchange(request_id, self._frame(_dumps(request)))
+        
+    async def get_tools(self) -> Dict[str, Any]:
+        """Return the tools/list response, cached until the server reports a change"""
+        if self._tools_cache is None:
+            response = await self.request("tools/list", {})
+            if "error" in response:
+                return response
+            self._tools_cache = response
+        return self._tools_cache
+        
+    async def notify(self, method: str, params: Dict[str, Any] = None):
+        """Send JSON-RPC notification (no response expected)"""
+        notification = {"jsonrpc": "2.0", "method": method}
+        if params is not None:
+            notification["params"] = params
+        await self._write(self._frame(_dumps(notification)))
+        
+    def stderr_text(self) -> str:
+        """Return the server's stderr output so far, for error messages"""
+        return self._stderr_buf.decode(errors="replace")
+        
+    async def close(self):
+        """Stop the reader tasks once the server process is gone"""
+        for task in (self._reader_task, self._stderr_task):
+            task.cancel()
+        await asyncio.gather(self._reader_task, self._stderr_task, return_exceptions=True)
+        if self._writer is not self.proc.stdin:
+            self._writer.close()
+        
+    async def _exchange(self, request_id: int, data: bytes) -> Dict[str, Any]:
+        """Write already-framed bytes and await the response with the given id"""
+        if self._closed:
+            return {"error": f"No response. stderr: {self.stderr_text()}"}
+        
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            if not await self._write(data):
+                return {"error": "Server stdin closed"}
+            return await asyncio.wait_for(future, RESPONSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            return {"error": f"No response. stderr: {self.stderr_text()}"}
+        finally:
+            self._pending.pop(request_id, None)
+            
+    async def _write(self, data: bytes) -> bool:
+        """Write already-framed bytes to the server's stdin, returning False if it has gone away"""
+        try:
+            self._writer.write(data)
+            await self._writer.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            return False
+        return True
+        
+    async def _read_loop(self):
+        """Read server output in large chunks and resolve the pending request futures"""
+        while True:
+            chunk = await self._reader.read(65536)
+            if not chunk:
+                break
+            self._rx_buf += chunk
+            
+            while True:
+                message = self._next_buffered_message()
+                if message is None:
+                    break
+                for response in (message if isinstance(message, list) else [message]):
+                    if not isinstance(response, dict):
+                        continue
+                    if "id" not in response:
+                        self._handle_notification(response)
+                        continue
+                    future = self._pending.get(response["id"])
+                    if future is not None and not future.done():
+                        future.set_result(response)
+        
+        # Server exited: fail whatever is still waiting
+        self._closed = True
+        for future in self._pending.values():
+            if not future.done():
+                future.set_result({"error": f"No response. stderr: {self.stderr_text()}"})
+                
+    async def _drain_stderr(self):
+        """Collect stderr as it arrives so the server never blocks on it"""
+        while True:
+            data = await self.proc.stderr.read(65536)
+            if not data:
+                break
+            self._stderr_buf += data
+
+@contextlib.contextmanager
+def shared_server(server_script: str):
+    """Start the MCP server once, complete the default handshake and yield its proxy"""
+    popen_kwargs = _popen_pipe_kwargs()
+    sock = server_sock = None
+    if _use_unix_socket():
+        sock, server_sock = _socket_pair()
+        stdio = {"stdin": server_sock, "stdout": server_sock}
+    else:
+        stdio = {"stdin": subprocess.PIPE, "stdout": subprocess.PIPE}
+    proc = subprocess.Popen(
+        [sys.executable, str(server_script)],
+        stderr=subprocess.PIPE,
+        **stdio,
+        **popen_kwargs
+    )
+    if server_sock is not None:
+        server_sock.close()
+    elif not popen_kwargs:
+        _enlarge_pipes(proc.stdin, proc.stdout)
+    try:
+        proxy = MCPServerProxy(proc, sock)
+        proxy.handshake()
+        yield proxy
+    finally:
+        proc.kill()
+        proc.wait()
+        for pipe in (proc.stdin, proc.stdout, proc.stderr, sock):
+            if pipe is not None:
+                pipe.close()
+
+@contextlib.asynccontextmanager
+async def async_shared_server(server_script: str):
+    """asyncio variant of shared_server yielding an AsyncMCPServerProxy"""
+    sock = server_sock = None
+    if _use_unix_socket():
+        sock, server_sock = _socket_pair()
+        stdio = {"stdin": server_sock, "stdout": server_sock}
+    else:
+        stdio = {"stdin": asyncio.subprocess.PIPE, "stdout": asyncio.subprocess.PIPE}
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, str(server_script),
+        stderr=asyncio.subprocess.PIPE,
+        **stdio,
+        **_popen_pipe_kwargs()
+    )
+    reader = writer = None
+    if server_sock is not None:
+        server_sock.close()
+        reader, writer = await asyncio.open_unix_connection(sock=sock)
+    proxy = AsyncMCPServerProxy(proc, reader, writer)
+    try:
+        await proxy.handshake()
+        yield proxy
+    finally:
+        if proc.returncode is None:
+            proc.kill()
+        await proc.wait()
+        await proxy.close()
@@ -4,8 +4,10 @@ ESP32 Debug Tools CLI - Unified Command Interface
 Uses Stevedore for automatic tool discovery and Click for CLI management
 """
 
+import contextlib
 import sys
 import os
+import json
 from pathlib import Path
 from typing import Dict, Any, Optional
 
@@ -132,8 +134,10 @@ registry = ESP32DebugToolsRegistry()
 @click.group(invoke_without_command=True)
 @click.option('--list', 'list_tools', is_flag=True, help='List all available tools')
 @click.option('--verbose', '-v', is_flag=True, help='Verbose output')
+@click.option('--selftest', is_flag=True, hidden=True,
+              help='Print tool list, help and info as one JSON document')
 @click.pass_context
-def cli(ctx, list_tools, verbose):
+def cli(ctx, list_tools, verbose, selftest):
     """
     ESP32-C6 Debugging Tools Suite - Unified CLI Interface
     
@@ -143,13 +147,35 @@ def cli(ctx, list_tools, verbose):
     ctx.obj['verbose'] = verbose
     
     if ctx.invoked_subcommand is None:
-        if list_tools:
+        if selftest:
+            show_selftest(ctx)
+        elif list_tools:
             show_available_tools()
         else:
             console.print("\n🔧 ESP32-C6 Debugging Tools Suite", style="bold blue")
             console.print("Use --help to see available commands or --list to see all tools")
             console.print("\n💡 Quick start: esp32-debug wizard")
 
+def show_selftest(ctx):
+    """Emit discovery, help and info in a single JSON blob for integration tests"""
+    # Plugins loaded on discovery and our own warnings may print; keep stdout
+    # for the JSON alone (the console resolves sys.stdout on each print)
+    with contextlib.redirect_stdout(sys.stderr):
+        tools = registry.discover_tools()
+        commands = registry.discover_commands()
+    
+    click.echo(json.dumps({
+        'list': sorted(set(tools) | set(commands)),
+        'help': ctx.get_help(),
+        'info': {
+            'tools': len(tools),
+            'commands': len(commands),
+            'namespaces': [registry.tools_namespace, registry.commands_namespace],
+            'python': sys.version.split()[0],
+            'tools_path': str(Path(__file__).parent)
+        }
+    }))
+
 def show_available_tools():
     """Display all discovered tools in a nice table"""
     tools = registry.discover_tools()
@@ -10,35 +10,30 @@ import sys
 import time
 import threading
 import queue
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 
-class OpenOCDScriptingAutomation:
-    """
-    Advanced OpenOCD scripting and automation for ESP32-C6
-    Based on ESP-IDF research document recommendations
-    """
-    
-    def __init__(self, config_file="tools/esp32c6_final.cfg"):
-        self.config_file = config_file
-        self.scripts_dir = Path("openocd_scripts")
-        self.scripts_dir.mkdir(exist_ok=True)
-        self.logs_dir = Path("openocd_logs")
-        self.logs_dir.mkdir(exist_ok=True)
-        
-    def create_automated_flash_script(self):
-        """Create automated flashing script using OpenOCD"""
-        print("\n⚡ === AUTOMATED FLASH SCRIPT ===")
-        
-        script_content = '''# ESP32-C6 Automated Flash Script
-# Based on ESP-IDF research document recommendations
+# Script templates are built and encoded once at import time
+_COMMON_CFG = '''# ESP32-C6 Common OpenOCD Preamble
+# Sourced by the automation, debug session and production test scripts
 
-# Configuration
 source [find interface/esp_usb_jtag.cfg]
 source [find target/esp32c6.cfg]
 
-# Set adapter speed
-adapter speed 5000
+# Adapter speed, applied before any config runs init. Wrapper scripts
+# set ::ADAPTER_SPEED from OPENOCD_SPEED ahead of -f; default 20000 kHz
+if {![info exists ::ADAPTER_SPEED]} {
+    set ::ADAPTER_SPEED 20000
+}
+adapter speed $::ADAPTER_SPEED
+'''.encode('utf-8')
+
+_AUTOMATION_CFG = '''# ESP32-C6 Automated Flash Script
+# Based on ESP-IDF research document recommendations
+
+# Shared interface/target setup
+source [file join [file dirname [info script]] esp32c6_common.cfg]
 
 # Initialize and connect
 init
@@ -128,20 +123,10 @@ proc inspect_cpu_state {} {
     echo "Inspecting CPU state..."
     reset halt
     
+    # A bare 'reg' dumps pc, sp and all GPRs in one batch
     echo "=== CPU Registers ==="
     reg
-    
-    echo "=== Program Counter ==="
-    reg pc
-    
-    echo "=== Stack Pointer ==="
-    reg sp
-    
-    echo "=== General Purpose Registers ==="
-    for {set i 0} {$i < 32} {incr i} {
-        set reg_name "x$i"
-        reg $reg_name
-    }
+    echo "=== GPRs shown above ==="
 }
 
 # Function for flash verification
@@ -170,26 +155,13 @@ echo ""
 echo "Usage examples:"
 echo "  openocd -f this_script.cfg -c \\"flash_complete_firmware; exit\\""
 echo "  openocd -f this_script.cfg -c \\"dump_memory_regions; exit\\""
-'''
-        
-        script_file = self.scripts_dir / "esp32c6_automation.cfg"
-        with open(script_file, 'w') as f:
-            f.write(script_content)
-        
-        print(f"✅ Automated flash script created: {script_file}")
-        return script_file
-    
-    def create_debug_session_script(self):
-        """Create debug session automation script"""
-        print("\n🐛 === DEBUG SESSION SCRIPT ===")
-        
-        script_content = '''# ESP32-C6 Debug Session Automation
-# Based on ESP-IDF research document recommendations
+'''.encode('utf-8')
 
-source [find interface/esp_usb_jtag.cfg]
-source [find target/esp32c6.cfg]
+_DEBUG_SESSION_CFG = '''# ESP32-C6 Debug Session Automation
+# Based on ESP-IDF research document recommendations
 
-adapter speed 5000
+# Shared interface/target setup
+source [file join [file dirname [info script]] esp32c6_common.cfg]
 
 # Debug session initialization
 proc debug_init {} {
@@ -263,28 +235,29 @@ proc start_monitoring {} {
 }
 
 # Performance profiling
-proc profile_function {func_name cycles} {
-    echo "Profiling function: $func_name for $cycles cycles"
+proc profile_function {func_name {timeout_ms 5000}} {
+    echo "Profiling function: $func_name"
     
     # Set breakpoint at function entry
     bp $func_name 2 hw
     
     # Resume and wait for hit
     resume
-    wait_halt 5000
+    wait_halt $timeout_ms
+    rbp $func_name
     
-    # Count cycles
-    reset_cycle_counter
-    
-    # Single step through function
-    for {set i 0} {$i < $cycles} {incr i} {
-        step
-        if {[reg pc] == 0} break
-    }
+    # Sample the hardware cycle counter at entry, then run to the return address
+    set start [lindex [reg mcycle] end]
+    set ret_addr [lindex [reg ra] end]
+    bp $ret_addr 2 hw
+    resume
+    wait_halt $timeout_ms
+    set end [lindex [reg mcycle] end]
+    rbp $ret_addr
     
     # Report results
     echo "Function profiling complete"
-    echo "Cycles counted: [get_cycle_count]"
+    echo "Cycles: [expr {$end - $start}]"
 }
 
 # Flash debugging
@@ -309,28 +282,20 @@ echo "  inspect_stack - Show stack contents"
 echo "  inspect_heap - Show heap status"
 echo "  set_memory_watchpoint <addr> <size> <type> - Set memory watchpoint"
 echo "  start_monitoring - Enable continuous monitoring"
-echo "  profile_function <name> <cycles> - Profile function execution"
+echo "  profile_function <name> ?timeout_ms? - Profile function execution"
 echo "  debug_flash_operations - Setup flash debugging"
-'''
-        
-        script_file = self.scripts_dir / "esp32c6_debug_session.cfg"
-        with open(script_file, 'w') as f:
-            f.write(script_content)
-        
-        print(f"✅ Debug session script created: {script_file}")
-        return script_file
-    
-    def create_production_test_script(self):
-        """Create production testing automation script"""
-        print("\n🏭 === PRODUCTION TEST SCRIPT ===")
-        
-        script_content = '''# ESP32-C6 Production Test Automation
+'''.encode('utf-8')
+
+_PRODUCTION_TEST_CFG = '''# ESP32-C6 Production Test Automation
 # Based on ESP-IDF research document recommendations
 
-source [find interface/esp_usb_jtag.cfg]
-source [find target/esp32c6.cfg]
+# Shared interface/target setup
+source [file join [file dirname [info script]] esp32c6_common.cfg]
 
-adapter speed 20000  # Higher speed for production
+# Fixed test parameters, set once at load time and shared by every test run
+set ::TEST_ADDR 0x3FC80000
+set ::TEST_PAT 0xDEADBEEF
+set ::FLASH_BANK 0
 
 # Production test suite
 proc production_test_suite {} {
@@ -395,18 +360,14 @@ proc test_cpu_connectivity {} {
 proc test_memory_integrity {} {
     echo "Testing memory integrity..."
     
-    # Test SRAM with pattern
-    set test_addr 0x3FC80000
-    set test_pattern 0xDEADBEEF
-    
-    # Write test pattern
-    mww $test_addr $test_pattern
+    # Write test pattern to SRAM
+    mww $::TEST_ADDR $::TEST_PAT
     
     # Read back and verify
-    set read_val [mrw $test_addr]
-    if {$read_val != $test_pattern} {
-        echo "Memory test failed at $test_addr"
-        echo "Expected: $test_pattern, Got: $read_val"
+    set read_val [mrw $::TEST_ADDR]
+    if {$read_val != $::TEST_PAT} {
+        echo "Memory test failed at $::TEST_ADDR"
+        echo "Expected: $::TEST_PAT, Got: $read_val"
         return 0
     }
     
@@ -417,13 +378,13 @@ proc test_flash_functionality {} {
     echo "Testing flash functionality..."
     
     # Probe flash
-    if {[catch {flash probe 0}]} {
+    if {[catch {flash probe $::FLASH_BANK}]} {
         echo "Flash probe failed"
         return 0
     }
     
     # Get flash info
-    flash info 0
+    flash info $::FLASH_BANK
     
     return 1
 }
@@ -438,6 +399,19 @@ proc test_efuse_integrity {} {
     return 1
 }
 
+# Block until the tested device is swapped out and the next one answers on JTAG.
+# jtag init is a no-op once the chain is up, so re-scan it with arp_init,
+# which fails while no device answers
+proc wait_for_next_device {} {
+    echo "Ready for next device - swap it in"
+    while {![catch {jtag arp_init}]} {
+        after 100
+    }
+    while {[catch {jtag arp_init}]} {
+        after 100
+    }
+}
+
 # Batch testing function
 proc batch_test {count} {
     echo "Running batch test on $count devices..."
@@ -456,9 +430,9 @@ proc batch_test {count} {
             echo "Device $i: FAIL"
         }
         
-        # Pause between devices
-        echo "Ready for next device... (press Enter)"
-        gets stdin
+        if {$i < $count} {
+            wait_for_next_device
+        }
     }
     
     echo "Batch test complete:"
@@ -471,28 +445,18 @@ echo "Production test automation loaded"
 echo "Available commands:"
 echo "  production_test_suite - Run complete test suite"
 echo "  batch_test <count> - Test multiple devices"
+echo "  wait_for_next_device - Wait for a device hot-swap"
 echo "  test_cpu_connectivity - Test CPU only"
 echo "  test_memory_integrity - Test memory only"
 echo "  test_flash_functionality - Test flash only"
-'''
-        
-        script_file = self.scripts_dir / "esp32c6_production_test.cfg"
-        with open(script_file, 'w') as f:
-            f.write(script_content)
-        
-        print(f"✅ Production test script created: {script_file}")
-        return script_file
-    
-    def create_convenience_wrapper_scripts(self):
-        """Create convenience wrapper scripts for common operations"""
-        print("\n🛠️  === CONVENIENCE WRAPPER SCRIPTS ===")
-        
-        # Flash automation wrapper
-        flash_wrapper = '''#!/bin/bash
+'''.encode('utf-8')
+
+_FLASH_WRAPPER_SH = '''#!/bin/bash
 # ESP32-C6 Flash Automation Wrapper
 # Usage: ./flash_firmware.sh [--verify]
 
 CONFIG_FILE="openocd_scripts/esp32c6_automation.cfg"
+ADAPTER_SPEED="${OPENOCD_SPEED:-20000}"
 VERIFY_FLAG=""
 
 if [ "$1" = "--verify" ]; then
@@ -500,7 +464,7 @@ if [ "$1" = "--verify" ]; then
 fi
 
 echo "🚀 Starting automated firmware flash..."
-openocd -f "$CONFIG_FILE" -c "flash_complete_firmware$VERIFY_FLAG; exit"
+openocd -c "set ADAPTER_SPEED $ADAPTER_SPEED" -f "$CONFIG_FILE" -c "flash_complete_firmware$VERIFY_FLAG; exit"
 
 if [ $? -eq 0 ]; then
     echo "✅ Firmware flash completed successfully"
@@ -508,19 +472,14 @@ else
     echo "❌ Firmware flash failed"
     exit 1
 fi
-'''
-        
-        flash_script = Path("flash_firmware.sh")
-        with open(flash_script, 'w') as f:
-            f.write(flash_wrapper)
-        flash_script.chmod(0o755)
-        
-        # Debug session wrapper
-        debug_wrapper = '''#!/bin/bash
+'''.encode('utf-8')
+
+_DEBUG_WRAPPER_SH = '''#!/bin/bash
 # ESP32-C6 Debug Session Wrapper
 # Usage: ./start_debug.sh [--breakpoints]
 
 CONFIG_FILE="openocd_scripts/esp32c6_debug_session.cfg"
+ADAPTER_SPEED="${OPENOCD_SPEED:-20000}"
 EXTRA_CMDS=""
 
 if [ "$1" = "--breakpoints" ]; then
@@ -532,23 +491,18 @@ echo "💡 OpenOCD will start telnet server on port 4444"
 echo "💡 GDB can connect to port 3333"
 echo "💡 Use Ctrl+C to stop"
 
-openocd -f "$CONFIG_FILE" -c "$EXTRA_CMDS"
-'''
-        
-        debug_script = Path("start_debug.sh")
-        with open(debug_script, 'w') as f:
-            f.write(debug_wrapper)
-        debug_script.chmod(0o755)
-        
-        # Memory dump wrapper
-        dump_wrapper = '''#!/bin/bash
+openocd -c "set ADAPTER_SPEED $ADAPTER_SPEED" -f "$CONFIG_FILE" -c "$EXTRA_CMDS"
+'''.encode('utf-8')
+
+_DUMP_WRAPPER_SH = '''#!/bin/bash
 # ESP32-C6 Memory Dump Wrapper
 # Usage: ./dump_memory.sh
 
 CONFIG_FILE="openocd_scripts/esp32c6_automation.cfg"
+ADAPTER_SPEED="${OPENOCD_SPEED:-20000}"
 
 echo "💾 Starting memory dump..."
-openocd -f "$CONFIG_FILE" -c "dump_memory_regions; exit"
+openocd -c "set ADAPTER_SPEED $ADAPTER_SPEED" -f "$CONFIG_FILE" -c "dump_memory_regions; exit"
 
 if [ $? -eq 0 ]; then
     echo "✅ Memory dump completed"
@@ -558,55 +512,82 @@ else
     echo "❌ Memory dump failed"
     exit 1
 fi
-'''
-        
-        dump_script = Path("dump_memory.sh")
-        with open(dump_script, 'w') as f:
-            f.write(dump_wrapper)
-        dump_script.chmod(0o755)
-        
-        print(f"✅ Wrapper scripts created:")
-        print(f"   📄 {flash_script} - Automated firmware flashing")
-        print(f"   📄 {debug_script} - Debug session startup")
-        print(f"   📄 {dump_script} - Memory dump utility")
-        
-        return [flash_script, debug_script, dump_script]
-    
-    def run_script_generation_suite(self):
-        """Generate complete OpenOCD scripting suite"""
-        print("🎯 OpenOCD Scripting Automation Suite")
-        print("=" * 45)
-        print("Based on ESP-IDF research document")
-        print()
-        
-        generated_files = []
-        
-        # Generate all scripts
-        generated_files.append(self.create_automated_flash_script())
-        generated_files.append(self.create_debug_session_script())
-        generated_files.append(self.create_production_test_script())
-        wrapper_scripts = self.create_convenience_wrapper_scripts()
-        generated_files.extend(wrapper_scripts)
-        
-        # Create documentation
-        doc_content = f'''# OpenOCD Scripting Suite Documentation
+'''.encode('utf-8')
+
+_BATCH_TEST_WRAPPER_SH = '''#!/bin/bash
+# ESP32-C6 Production Batch Test Wrapper
+# Usage: ./batch_test.sh <count>
+# Runs the production suite once per device, starting as soon as the next
+# device enumerates on USB - no keypress between devices.
+
+CONFIG_FILE="openocd_scripts/esp32c6_production_test.cfg"
+ADAPTER_SPEED="${OPENOCD_SPEED:-20000}"
+COUNT="${1:-1}"
+
+# Espressif built-in USB-JTAG/serial
+USB_VID="303a"
+USB_PID="1001"
+
+device_present() {
+    for dev in /sys/bus/usb/devices/*; do
+        if [ "$(cat "$dev/idVendor" 2>/dev/null)" = "$USB_VID" ] && [ "$(cat "$dev/idProduct" 2>/dev/null)" = "$USB_PID" ]; then
+            return 0
+        fi
+    done
+    return 1
+}
 
-Generated on: {datetime.now().isoformat()}
+PASS_COUNT=0
+FAIL_COUNT=0
+
+for i in $(seq 1 "$COUNT"); do
+    echo "🔌 Waiting for device $i of $COUNT..."
+    until device_present; do sleep 0.1; done
+    udevadm settle 2>/dev/null
+
+    if openocd -c "set ADAPTER_SPEED $ADAPTER_SPEED" -f "$CONFIG_FILE" -c "if {[production_test_suite]} {shutdown} else {shutdown error}"; then
+        PASS_COUNT=$((PASS_COUNT + 1))
+        echo "✅ Device $i: PASS"
+    else
+        FAIL_COUNT=$((FAIL_COUNT + 1))
+        echo "❌ Device $i: FAIL"
+    fi
+
+    if [ "$i" -lt "$COUNT" ]; then
+        echo "🔄 Swap in the next device"
+        while device_present; do sleep 0.1; done
+    fi
+done
+
+echo "Batch test complete:"
+echo "  Passed: $PASS_COUNT"
+echo "  Failed: $FAIL_COUNT"
+[ "$FAIL_COUNT" -eq 0 ]
+'''.encode('utf-8')
+
+# Generated README, kept as sections; only the header is formatted per run
+_README_HEADER = '''# OpenOCD Scripting Suite Documentation
+
+Generated on: {timestamp}
 Based on: ESP-IDF research document recommendations
+'''
 
-## Generated Scripts
+_README_SECTIONS = [
+    '''## Generated Scripts
 
 ### OpenOCD Configuration Files
-1. **esp32c6_automation.cfg** - Automated flashing and memory operations
-2. **esp32c6_debug_session.cfg** - Interactive debugging automation  
-3. **esp32c6_production_test.cfg** - Production testing automation
+1. **esp32c6_common.cfg** - Shared interface/target preamble and default adapter speed
+2. **esp32c6_automation.cfg** - Automated flashing and memory operations
+3. **esp32c6_debug_session.cfg** - Interactive debugging automation  
+4. **esp32c6_production_test.cfg** - Production testing automation
 
 ### Bash Wrapper Scripts
 1. **flash_firmware.sh** - One-command firmware flashing
 2. **start_debug.sh** - Debug session startup
 3. **dump_memory.sh** - Memory dump utility
-
-## Usage Examples
+4. **batch_test.sh** - Production batch test, one device per USB hot-swap
+''',
+    '''## Usage Examples
 
 ### Automated Flashing
 ```bash
@@ -646,11 +627,27 @@ openocd -f openocd_scripts/esp32c6_automation.cfg -c "dump_memory_regions; exit"
 # Single device test
 openocd -f openocd_scripts/esp32c6_production_test.cfg -c "production_test_suite; exit"
 
-# Batch testing
+# Batch testing - each device is tested as soon as it enumerates
+./batch_test.sh 10
+
+# Batch testing inside one OpenOCD session (waits for a JTAG hot-swap)
 openocd -f openocd_scripts/esp32c6_production_test.cfg -c "batch_test 10; exit"
 ```
 
-## Advanced OpenOCD Functions
+### JTAG Adapter Speed
+The wrapper scripts set `ADAPTER_SPEED` on the OpenOCD command line ahead of
+the configuration file, so the speed also covers the init/examine phase and
+can be changed without regenerating the configuration files:
+
+```bash
+# Default is 20000 kHz; lower it for long or noisy USB cables
+OPENOCD_SPEED=5000 ./flash_firmware.sh
+
+# The same for a manual OpenOCD run
+openocd -c "set ADAPTER_SPEED 5000" -f openocd_scripts/esp32c6_automation.cfg
+```
+''',
+    '''## Advanced OpenOCD Functions
 
 All scripts include advanced functions based on the ESP-IDF research document:
 
@@ -659,8 +656,8 @@ All scripts include advanced functions based on the ESP-IDF research document:
 - **Flash Operations**: program_esp with verification
 - **Debug Functions**: breakpoints, watchpoints, register inspection
 - **Automation**: batch operations, error recovery, logging
-
-## Integration with ESP-IDF
+''',
+    '''## Integration with ESP-IDF
 
 These scripts complement the standard ESP-IDF workflow:
 
@@ -673,39 +670,180 @@ idf.py build
 ./flash_firmware.sh --verify
 ./start_debug.sh --breakpoints
 ```
-
-## Troubleshooting
+''',
+    '''## Troubleshooting
 
 - Ensure ESP32-C6 device is connected via USB
 - Check that OpenOCD can detect the device: `openocd -f tools/esp32c6_final.cfg -c "init; targets; exit"`
 - Verify build artifacts exist before flashing
 - Use `--verify` flag to confirm flash operations
-
-## Safety Notes
+''',
+    '''## Safety Notes
 
 - Scripts include safety checks and verification
 - Production test scripts are designed for manufacturing environments  
 - Always backup firmware before performing flash operations
 - Use appropriate OpenOCD adapter speeds for your use case
-'''
+''',
+]
+
+class OpenOCDScriptingAutomation:
+    """
+    Advanced OpenOCD scripting and automation for ESP32-C6
+    Based on ESP-IDF research document recommendations
+    """
+    
+    def __init__(self, config_file="tools/esp32c6_final.cfg", scripts_dir="openocd_scripts"):
+        self.config_file = config_file
+        self.scripts_dir = Path(scripts_dir)
+        self.scripts_dir.mkdir(exist_ok=True)
+        # Output paths, built once and shared by the create_* methods
+        self._paths = {
+            'common': self.scripts_dir / "esp32c6_common.cfg",
+            'flash': self.scripts_dir / "esp32c6_automation.cfg",
+            'debug': self.scripts_dir / "esp32c6_debug_session.cfg",
+            'prod': self.scripts_dir / "esp32c6_production_test.cfg",
+            'readme': self.scripts_dir / "README.md",
+            'flash_wrapper': Path("flash_firmware.sh"),
+            'debug_wrapper': Path("start_debug.sh"),
+            'dump_wrapper': Path("dump_memory.sh"),
+            'batch_wrapper': Path("batch_test.sh"),
+        }
+        self.logs_dir = Path("openocd_logs")
+        self.logs_dir.mkdir(exist_ok=True)
+        
+    def _write_executable(self, path, content):
+        """Write shell script bytes and mark the file executable in one open/write"""
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o755)
+        try:
+            # The mode above only applies on creation; fix up existing files too
+            os.fchmod(fd, 0o755)
+            os.write(fd, content)
+        finally:
+            os.close(fd)
+        
+    def create_common_preamble(self):
+        """Create the interface/target preamble shared by all generated configs"""
+        print("\n📎 === COMMON PREAMBLE ===")
+        
+        script_file = self._paths['common']
+        script_file.write_bytes(_COMMON_CFG)
+        
+        print(f"✅ Common preamble created: {script_file}")
+        return script_file
+    
+    def create_automated_flash_script(self):
+        """Create automated flashing script using OpenOCD"""
+        print("\n⚡ === AUTOMATED FLASH SCRIPT ===")
         
-        doc_file = self.scripts_dir / "README.md"
-        with open(doc_file, 'w') as f:
-            f.write(doc_content)
+        script_file = self._paths['flash']
+        script_file.write_bytes(_AUTOMATION_CFG)
         
-        generated_files.append(doc_file)
+        print(f"✅ Automated flash script created: {script_file}")
+        return script_file
+    
+    def create_debug_session_script(self):
+        """Create debug session automation script"""
+        print("\n🐛 === DEBUG SESSION SCRIPT ===")
+        
+        script_file = self._paths['debug']
+        script_file.write_bytes(_DEBUG_SESSION_CFG)
+        
+        print(f"✅ Debug session script created: {script_file}")
+        return script_file
+    
+    def create_production_test_script(self):
+        """Create production testing automation script"""
+        print("\n🏭 === PRODUCTION TEST SCRIPT ===")
+        
+        script_file = self._paths['prod']
+        script_file.write_bytes(_PRODUCTION_TEST_CFG)
+        
+        print(f"✅ Production test script created: {script_file}")
+        return script_file
+    
+    def create_convenience_wrapper_scripts(self):
+        """Create convenience wrapper scripts for common operations"""
+        print("\n🛠️  === CONVENIENCE WRAPPER SCRIPTS ===")
+        
+        flash_script = self._paths['flash_wrapper']
+        self._write_executable(flash_script, _FLASH_WRAPPER_SH)
+        
+        debug_script = self._paths['debug_wrapper']
+        self._write_executable(debug_script, _DEBUG_WRAPPER_SH)
+        
+        dump_script = self._paths['dump_wrapper']
+        self._write_executable(dump_script, _DUMP_WRAPPER_SH)
+        
+        batch_script = self._paths['batch_wrapper']
+        self._write_executable(batch_script, _BATCH_TEST_WRAPPER_SH)
+        
+        print(f"✅ Wrapper scripts created:")
+        print(f"   📄 {flash_script} - Automated firmware flashing")
+        print(f"   📄 {debug_script} - Debug session startup")
+        print(f"   📄 {dump_script} - Memory dump utility")
+        print(f"   📄 {batch_script} - Production batch test")
+        
+        return [flash_script, debug_script, dump_script, batch_script]
+    
+    def create_documentation(self):
+        """Create the README describing the generated scripts"""
+        header = _README_HEADER.format(timestamp=datetime.now().isoformat())
+        doc_file = self._paths['readme']
+        doc_file.write_text("\n".join([header, *_README_SECTIONS]), encoding='utf-8')
+        return doc_file
+    
+    def run_script_generation_suite(self, include_readme=True):
+        """Generate complete OpenOCD scripting suite"""
+        print("🎯 OpenOCD Scripting Automation Suite")
+        print("=" * 45)
+        print("Based on ESP-IDF research document")
+        print()
+        
+        # The role-specific configs source the common preamble
+        generated_files = [self.create_common_preamble()]
+        
+        # Generate all scripts - each writes its own files, so run them concurrently
+        generators = (
+            self.create_automated_flash_script,
+            self.create_debug_session_script,
+            self.create_production_test_script,
+            self.create_convenience_wrapper_scripts,
+        )
+        with ThreadPoolExecutor(max_workers=len(generators)) as executor:
+            futures = [executor.submit(generator) for generator in generators]
+            for future in futures:
+                result = future.result()
+                if isinstance(result, list):
+                    generated_files.extend(result)
+                else:
+                    generated_files.append(result)
+        
+        # Create documentation
+        if include_readme:
+            doc_file = self.create_documentation()
+            generated_files.append(doc_file)
         
         # Summary
         print("\n📋 SCRIPT GENERATION COMPLETE")
         print("=" * 35)
         print(f"✅ Generated {len(generated_files)} files:")
         
+        # One directory scan per output location instead of exists() + stat() per file
+        file_sizes = {}
+        for directory in {file_path.parent for file_path in generated_files}:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        file_sizes[directory / entry.name] = entry.stat().st_size
+        
         for i, file_path in enumerate(generated_files, 1):
-            file_size = file_path.stat().st_size if file_path.exists() else 0
+            file_size = file_sizes.get(file_path, 0)
             print(f"   {i}. {file_path.name} ({file_size} bytes)")
         
         print(f"\n📁 Scripts directory: {self.scripts_dir}")
-        print(f"📚 Documentation: {doc_file}")
+        if include_readme:
+            print(f"📚 Documentation: {doc_file}")
         
         print("\n🎉 OpenOCD scripting automation suite complete!")
         print("📖 All scripts based on ESP-IDF research document")
@@ -719,15 +857,13 @@ def main():
     parser = argparse.ArgumentParser(description='OpenOCD Scripting Automation Suite')
     parser.add_argument('--config', default='tools/esp32c6_final.cfg', help='OpenOCD config file')
     parser.add_argument('--scripts-dir', default='openocd_scripts', help='Output directory for scripts')
+    parser.add_argument('--no-readme', action='store_true', help='Skip generating the README')
     
     args = parser.parse_args()
     
-    automation = OpenOCDScriptingAutomation(args.config)
-    if args.scripts_dir != 'openocd_scripts':
-        automation.scripts_dir = Path(args.scripts_dir)
-        automation.scripts_dir.mkdir(exist_ok=True)
+    automation = OpenOCDScriptingAutomation(args.config, args.scripts_dir)
     
-    automation.run_script_generation_suite()
+    automation.run_script_generation_suite(include_readme=not args.no_readme)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
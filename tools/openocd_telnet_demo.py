@@ -4,41 +4,157 @@ OpenOCD Telnet Interface Demo
 Implementation of research document recommendations for advanced OpenOCD usage
 """
 
-import telnetlib
-import time
+import asyncio
+import collections
+import itertools
+import re
+import signal
+import socket
 import subprocess
 import threading
 import sys
 import os
+import tempfile
+import time
 from pathlib import Path
 
+# State for an OpenOCD server kept alive across runs with --persistent
+PERSISTENT_PID_FILE = Path(tempfile.gettempdir()) / "openocd-esp32c6.pid"
+PERSISTENT_LOG_FILE = Path(tempfile.gettempdir()) / "openocd-esp32c6.log"
+
+# Telnet option negotiation (IAC WILL/WONT/DO/DONT <opt>) and bare IAC commands
+_TELNET_IAC_RE = re.compile(rb"\xff[\xfb-\xfe].|\xff[\xf0-\xfa]", re.DOTALL)
+
+class _SpawnedProcess:
+    """Minimal Popen-style handle for a process started with os.posix_spawnp"""
+    
+    def __init__(self, pid, stderr=None):
+        self.pid = pid
+        self.stderr = stderr
+        self.returncode = None
+    
+    def poll(self):
+        if self.returncode is None:
+            try:
+                pid, status = os.waitpid(self.pid, os.WNOHANG)
+            except ChildProcessError:
+                # Reaped elsewhere; the exit status is no longer available
+                self.returncode = -1
+                return self.returncode
+            if pid:
+                if os.WIFEXITED(status):
+                    self.returncode = os.WEXITSTATUS(status)
+                else:
+                    self.returncode = -os.WTERMSIG(status)
+        return self.returncode
+    
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.poll() is None:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise subprocess.TimeoutExpired(self.pid, timeout)
+            time.sleep(0.01)
+        return self.returncode
+    
+    def send_signal(self, sig):
+        if self.poll() is None:
+            os.kill(self.pid, sig)
+    
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+    
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+def _spawn_process(command, stderr_path=None, new_session=False):
+    """Start command with stdout discarded and stderr piped (or sent to stderr_path)
+
+    Uses os.posix_spawnp where available, which avoids fork()ing the
+    interpreter; other platforms fall back to subprocess.Popen.
+    """
+    if not hasattr(os, 'posix_spawnp'):
+        if stderr_path:
+            with open(stderr_path, 'w') as log:
+                return subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=log,
+                                        start_new_session=new_session)
+        return subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                bufsize=1, text=True, start_new_session=new_session)
+    
+    file_actions = [(os.POSIX_SPAWN_OPEN, 1, os.devnull, os.O_WRONLY, 0)]
+    read_fd = write_fd = None
+    if stderr_path:
+        file_actions.append((os.POSIX_SPAWN_OPEN, 2, str(stderr_path),
+                             os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644))
+    else:
+        # Both pipe ends are close-on-exec; only the dup'd fd 2 reaches the child
+        read_fd, write_fd = os.pipe()
+        file_actions.append((os.POSIX_SPAWN_DUP2, write_fd, 2))
+    
+    try:
+        pid = os.posix_spawnp(command[0], command, os.environ,
+                              file_actions=file_actions, setsid=new_session)
+    except OSError:
+        if read_fd is not None:
+            os.close(read_fd)
+        raise
+    finally:
+        if write_fd is not None:
+            os.close(write_fd)
+    
+    stderr = None
+    if read_fd is not None:
+        stderr = open(read_fd, 'r', buffering=1, errors='replace')
+    return _SpawnedProcess(pid, stderr)
+
 class OpenOCDTelnetDemo:
     """
     Advanced OpenOCD telnet interface for ESP32-C6 debugging
     Based on ESP-IDF research document recommendations
     """
     
-    def __init__(self, host='localhost', port=4444):
+    def __init__(self, host='localhost', port=4444, persistent=False):
         self.host = host
         self.port = port
-        self.telnet = None
+        self.persistent = persistent
+        self.reader = None
+        self.writer = None
         self.openocd_process = None
+        # Outstanding requests in submission order: (sentinel bytes, future)
+        self._pending = collections.deque()
+        self._buffer = bytearray()
+        self._tags = itertools.count()
+        self._reader_task = None
         
-    def start_openocd(self, config_file="tools/esp32c6_final.cfg"):
+    def start_openocd(self, config_file="tools/esp32c6_final.cfg", timeout=10):
         """Start OpenOCD server with ESP32-C6 configuration"""
         try:
             print(f"🚀 Starting OpenOCD with config: {config_file}")
-            self.openocd_process = subprocess.Popen(
-                ['openocd', '-f', config_file],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
+            command = ['openocd']
+            if self.host in ('localhost', '127.0.0.1'):
+                # Keep the debug ports off external interfaces
+                command += ['-c', 'bindto 127.0.0.1']
+            command += ['-f', config_file, '-c', f'telnet_port {self.port}']
+            
+            if self.persistent:
+                # The server outlives this process, so log to a file rather than a pipe
+                self.openocd_process = _spawn_process(
+                    command, stderr_path=PERSISTENT_LOG_FILE, new_session=True
+                )
+                watcher = self._watch_openocd_log
+            else:
+                self.openocd_process = _spawn_process(command)
+                watcher = self._watch_openocd_output
             
-            # Give OpenOCD time to start
-            time.sleep(3)
+            # Wait for the telnet banner instead of a fixed delay
+            ready = threading.Event()
+            threading.Thread(target=watcher, args=(ready,), daemon=True).start()
+            ready.wait(timeout)
             
-            if self.openocd_process.poll() is None:
+            if ready.is_set() and self.openocd_process.poll() is None:
+                if self.persistent:
+                    PERSISTENT_PID_FILE.write_text(str(self.openocd_process.pid))
+                    print(f"📌 Persistent OpenOCD PID {self.openocd_process.pid} "
+                          f"recorded in {PERSISTENT_PID_FILE}")
                 print("✅ OpenOCD started successfully")
                 return True
             else:
@@ -49,40 +165,126 @@ class OpenOCDTelnetDemo:
             print(f"❌ Error starting OpenOCD: {e}")
             return False
     
-    def connect_telnet(self):
+    def _watch_openocd_output(self, ready):
+        """Drain OpenOCD's log output and flag readiness once telnet is listening"""
+        for line in self.openocd_process.stderr:
+            if "for telnet" in line:
+                ready.set()
+        # Process exited - unblock any waiter so it can report the failure
+        self.openocd_process.wait()
+        ready.set()
+    
+    def _watch_openocd_log(self, ready):
+        """Follow the persistent server's log file until telnet is listening"""
+        with open(PERSISTENT_LOG_FILE) as log:
+            while not ready.is_set():
+                line = log.readline()
+                if "for telnet" in line:
+                    ready.set()
+                elif not line:
+                    if self.openocd_process.poll() is not None:
+                        ready.set()
+                    time.sleep(0.05)
+    
+    @staticmethod
+    def persistent_server_pid():
+        """Return the PID of a live persistent OpenOCD server, or None"""
+        try:
+            pid = int(PERSISTENT_PID_FILE.read_text())
+            os.kill(pid, 0)
+            return pid
+        except (OSError, ValueError):
+            # Missing, unreadable or stale PID file
+            PERSISTENT_PID_FILE.unlink(missing_ok=True)
+            return None
+    
+    async def connect_telnet(self, timeout=10):
         """Connect to OpenOCD telnet interface"""
         try:
-            print(f"🔗 Connecting to OpenOCD telnet at {self.host}:{self.port}")
-            self.telnet = telnetlib.Telnet(self.host, self.port, timeout=10)
+            if self.host.startswith('unix:'):
+                # Unix domain socket bridge (e.g. socat UNIX-LISTEN:... TCP:127.0.0.1:4444)
+                path = self.host[len('unix:'):]
+                print(f"🔗 Connecting to OpenOCD telnet at {path}")
+                connection = asyncio.open_unix_connection(path)
+            else:
+                print(f"🔗 Connecting to OpenOCD telnet at {self.host}:{self.port}")
+                connection = asyncio.open_connection(self.host, self.port)
+            self.reader, self.writer = await asyncio.wait_for(connection, timeout)
+            sock = self.writer.get_extra_info('socket')
+            if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             
             # Wait for OpenOCD prompt
-            response = self.telnet.read_until(b"> ", timeout=5)
+            await asyncio.wait_for(self.reader.readuntil(b"> "), 5)
+            # Keep the prompt so the echo of the first command is recognised as input
+            self._buffer = bytearray(b"> ")
+            self._reader_task = asyncio.ensure_future(self._read_responses())
             print("✅ Connected to OpenOCD telnet interface")
             return True
             
         except Exception as e:
             print(f"❌ Failed to connect to telnet: {e}")
+            self.writer = None
             return False
     
-    def send_command(self, command):
+    async def _read_responses(self):
+        """Single reader: hand each response to the request whose sentinel it ends with"""
+        try:
+            while True:
+                data = await self.reader.read(4096)
+                if not data:
+                    break
+                self._buffer += data
+                
+                while self._pending:
+                    sentinel, future = self._pending[0]
+                    end = self._buffer.find(sentinel)
+                    if end < 0:
+                        break
+                    raw = bytes(self._buffer[:end])
+                    del self._buffer[:end + len(sentinel)]
+                    self._pending.popleft()
+                    if not future.done():
+                        future.set_result(self._clean_response(raw))
+        finally:
+            for _, future in self._pending:
+                if not future.done():
+                    future.set_exception(ConnectionError("OpenOCD telnet connection closed"))
+            self._pending.clear()
+    
+    @staticmethod
+    def _clean_response(raw):
+        """Strip telnet negotiation, prompts and echoed input from a raw response"""
+        text = _TELNET_IAC_RE.sub(b"", raw).decode('utf-8', errors='ignore').replace('\r', '')
+        # Prompt lines ("> " followed by the echoed command) carry no output
+        lines = [line for line in text.split('\n') if not line.startswith('>')]
+        return '\n'.join(lines).strip()
+    
+    def _submit(self, commands):
+        """Queue commands followed by a sentinel echo and return a future for the output
+
+        The sentinel is echoed upper-cased so the telnet echo of the input
+        line cannot match it. Requests may be submitted back to back; the
+        reader resolves them in order as their sentinels arrive.
+        """
+        tag = f"__tag_{next(self._tags)}__"
+        payload = "".join(f"{command}\n" for command in commands)
+        payload += f"echo [string toupper {tag}]\n"
+        
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((tag.upper().encode(), future))
+        self.writer.write(payload.encode())
+        return future
+    
+    async def send_command(self, command, timeout=10):
         """Send command to OpenOCD and return response"""
-        if not self.telnet:
+        if not self.writer:
             print("❌ Not connected to telnet")
             return None
             
         try:
             print(f"📤 Sending command: {command}")
-            self.telnet.write(f"{command}\n".encode())
-            
-            # Read response until prompt
-            response = self.telnet.read_until(b"> ", timeout=10)
-            response_str = response.decode('utf-8', errors='ignore').strip()
-            
-            # Remove the command echo and prompt
-            lines = response_str.split('\n')
-            if len(lines) > 1:
-                response_str = '\n'.join(lines[1:-1])  # Remove first (command) and last (prompt) lines
-            
+            response_str = await asyncio.wait_for(self._submit([command]), timeout)
             print(f"📥 Response: {response_str}")
             return response_str
             
@@ -90,7 +292,23 @@ class OpenOCDTelnetDemo:
             print(f"❌ Error sending command: {e}")
             return None
     
-    def demonstrate_target_control(self):
+    async def send_batch(self, commands, timeout=10):
+        """Send several commands in a single write and return the combined response"""
+        if not self.writer:
+            print("❌ Not connected to telnet")
+            return None
+
+        try:
+            print(f"📤 Sending batch of {len(commands)} commands")
+            response_str = await asyncio.wait_for(self._submit(commands), timeout)
+            print(f"📥 Response: {response_str}")
+            return response_str
+
+        except Exception as e:
+            print(f"❌ Error sending batch: {e}")
+            return None
+
+    async def demonstrate_target_control(self):
         """Demonstrate target control commands from research document"""
         print("\n🎯 === TARGET CONTROL DEMONSTRATION ===")
         print("Based on ESP-IDF OpenOCD research document")
@@ -104,32 +322,32 @@ class OpenOCDTelnetDemo:
         ]
         
         for cmd, description in commands:
-            print(f"\n🔸 {description}")
-            response = self.send_command(cmd)
-            if response:
-                # Truncate long responses for readability
-                if len(response) > 200:
-                    print(f"   (Response truncated: {len(response)} characters)")
-                time.sleep(1)  # Brief pause between commands
-    
-    def demonstrate_memory_access(self):
+            print(f"🔸 {description}")
+        response = await self.send_batch([cmd for cmd, _ in commands])
+        if response and len(response) > 200:
+            # Truncate long responses for readability
+            print(f"   (Response truncated: {len(response)} characters)")
+    
+    async def demonstrate_memory_access(self):
         """Demonstrate memory access commands from research document"""
         print("\n🧠 === MEMORY ACCESS DEMONSTRATION ===")
         
-        # ESP32-C6 memory addresses
+        # ESP32-C6 memory addresses: (region, address, access width, count, description)
         memory_demos = [
-            ("mdw 0x40000000 4", "Read 4 words from IROM base"),
-            ("mdw 0x600fe000 4", "Read 4 words from RTC memory"), 
-            ("mdw 0x40800000 4", "Read 4 words from DROM base"),
-            ("mdb 0x40000000 16", "Read 16 bytes from IROM (byte access)")
+            ("IROM", "0x40000000", 32, 4, "Read 4 words from IROM base"),
+            ("RTC", "0x600fe000", 32, 4, "Read 4 words from RTC memory"), 
+            ("DROM", "0x40800000", 32, 4, "Read 4 words from DROM base"),
+            ("IROM bytes", "0x40000000", 8, 16, "Read 16 bytes from IROM (byte access)")
         ]
         
-        for cmd, description in memory_demos:
-            print(f"\n🔸 {description}")
-            response = self.send_command(cmd)
-            time.sleep(0.5)
+        # One Tcl line with bulk read_memory calls instead of a round-trip per mdw/mdb
+        reads = []
+        for region, address, width, count, description in memory_demos:
+            print(f"🔸 {description}")
+            reads.append(f'echo "{region} @ {address}: [read_memory {address} {width} {count}]"')
+        await self.send_command("; ".join(reads))
     
-    def demonstrate_flash_operations(self):
+    async def demonstrate_flash_operations(self):
         """Demonstrate flash operations from research document"""
         print("\n💾 === FLASH OPERATIONS DEMONSTRATION ===")
         
@@ -140,11 +358,10 @@ class OpenOCDTelnetDemo:
         ]
         
         for cmd, description in flash_commands:
-            print(f"\n🔸 {description}")
-            response = self.send_command(cmd)
-            time.sleep(0.5)
+            print(f"🔸 {description}")
+        await self.send_batch([cmd for cmd, _ in flash_commands])
     
-    def demonstrate_advanced_scripting(self):
+    async def demonstrate_advanced_scripting(self):
         """Demonstrate advanced OpenOCD scripting capabilities"""
         print("\n🔧 === ADVANCED SCRIPTING DEMONSTRATION ===")
         
@@ -157,17 +374,15 @@ class OpenOCDTelnetDemo:
             "echo 'Program counter displayed'",
             "resume",
             "echo 'Target resumed'",
-            "sleep 100",
+            "poll",  # report the running state instead of pausing a fixed time
             "halt", 
             "echo 'Advanced demo complete'"
         ]
         
         print("🔸 Executing multi-command script")
-        for cmd in script_commands:
-            response = self.send_command(cmd)
-            time.sleep(0.3)
+        await self.send_batch(script_commands)
     
-    def run_complete_demo(self):
+    async def run_complete_demo(self, config_file="tools/esp32c6_final.cfg"):
         """Run complete OpenOCD telnet demonstration"""
         print("🎯 ESP32-C6 OpenOCD Telnet Interface Demo")
         print("=========================================")
@@ -175,10 +390,14 @@ class OpenOCDTelnetDemo:
         print()
         
         # Start OpenOCD if not already running
-        if not self.connect_telnet():
-            if self.start_openocd():
-                time.sleep(2)
-                if not self.connect_telnet():
+        if not await self.connect_telnet():
+            pid = self.persistent_server_pid() if self.persistent else None
+            if pid:
+                # Never spawn a second server fighting over the JTAG adapter
+                print(f"❌ Persistent OpenOCD (PID {pid}) is running but not accepting connections")
+                return False
+            if self.start_openocd(config_file):
+                if not await self.connect_telnet():
                     print("❌ Failed to establish telnet connection")
                     return False
             else:
@@ -187,10 +406,10 @@ class OpenOCDTelnetDemo:
         
         try:
             # Run demonstrations
-            self.demonstrate_target_control()
-            self.demonstrate_memory_access()
-            self.demonstrate_flash_operations()
-            self.demonstrate_advanced_scripting()
+            await self.demonstrate_target_control()
+            await self.demonstrate_memory_access()
+            await self.demonstrate_flash_operations()
+            await self.demonstrate_advanced_scripting()
             
             print("\n🎉 OpenOCD telnet demonstration complete!")
             print("📚 All commands based on ESP-IDF research document")
@@ -201,18 +420,24 @@ class OpenOCDTelnetDemo:
             return False
         
         finally:
-            self.cleanup()
+            await self.cleanup()
     
-    def cleanup(self):
+    async def cleanup(self):
         """Clean up connections and processes"""
-        if self.telnet:
+        if self._reader_task:
+            self._reader_task.cancel()
+        
+        if self.writer:
             try:
-                self.telnet.close()
+                self.writer.close()
+                await self.writer.wait_closed()
                 print("🔌 Telnet connection closed")
             except:
                 pass
         
-        if self.openocd_process and self.openocd_process.poll() is None:
+        if self.persistent and self.openocd_process:
+            print(f"📌 OpenOCD left running for the next session (PID {self.openocd_process.pid})")
+        elif self.openocd_process and self.openocd_process.poll() is None:
             try:
                 self.openocd_process.terminate()
                 self.openocd_process.wait(timeout=5)
@@ -220,32 +445,39 @@ class OpenOCDTelnetDemo:
             except:
                 self.openocd_process.kill()
 
+async def run_connect_only(demo):
+    """Run the demos against an already running OpenOCD instance"""
+    print("🔗 Connecting to existing OpenOCD instance...")
+    if await demo.connect_telnet():
+        await demo.demonstrate_target_control()
+        await demo.demonstrate_memory_access()
+        await demo.demonstrate_flash_operations()
+        await demo.cleanup()
+    else:
+        print("❌ Failed to connect to existing OpenOCD instance")
+        print("💡 Start OpenOCD manually: openocd -f tools/esp32c6_final.cfg")
+
 def main():
     """Main demo function"""
     import argparse
     
     parser = argparse.ArgumentParser(description='OpenOCD Telnet Interface Demo')
-    parser.add_argument('--host', default='localhost', help='OpenOCD host')
+    parser.add_argument('--host', default='localhost',
+                        help='OpenOCD host, or unix:<path> for a Unix socket bridge')
     parser.add_argument('--port', type=int, default=4444, help='OpenOCD telnet port')
     parser.add_argument('--config', default='tools/esp32c6_final.cfg', help='OpenOCD config file')
     parser.add_argument('--connect-only', action='store_true', help='Connect to existing OpenOCD instance')
+    parser.add_argument('--persistent', action='store_true',
+                        help='Keep the OpenOCD server running and reuse it on later runs')
     
     args = parser.parse_args()
     
-    demo = OpenOCDTelnetDemo(args.host, args.port)
+    demo = OpenOCDTelnetDemo(args.host, args.port, persistent=args.persistent)
     
     if args.connect_only:
-        print("🔗 Connecting to existing OpenOCD instance...")
-        if demo.connect_telnet():
-            demo.demonstrate_target_control()
-            demo.demonstrate_memory_access()
-            demo.demonstrate_flash_operations()
-            demo.cleanup()
-        else:
-            print("❌ Failed to connect to existing OpenOCD instance")
-            print("💡 Start OpenOCD manually: openocd -f tools/esp32c6_final.cfg")
+        asyncio.run(run_connect_only(demo))
     else:
-        demo.run_complete_demo()
+        asyncio.run(demo.run_complete_demo(args.config))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
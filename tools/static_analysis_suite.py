@@ -4,14 +4,24 @@ ESP32-C6 Static Analysis Integration Suite
 Implementation of research document recommendations for code quality analysis
 """
 
+import collections
+import hashlib
+import importlib.util
 import subprocess
 import os
 import sys
 import json
+import re
+import shutil
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 
+# Compiler diagnostics, matched once per line while scanning build output
+WARN_RE = re.compile(r'(warning|error):')
+ANALYZER_RE = re.compile(r'(analyzer|static)', re.I)
+
 class ESP32StaticAnalyzer:
     """
     Comprehensive static analysis for ESP32-C6 VESC Express
@@ -20,9 +30,14 @@ class ESP32StaticAnalyzer:
     
     def __init__(self, project_path=None):
         self.project_path = project_path or os.getcwd()
-        self.build_path = Path(self.project_path) / 'build'
-        self.reports_path = Path(self.project_path) / 'analysis_reports'
+        self.project_dir = Path(self.project_path)
+        # Separate build trees so the clang and GCC analyzer passes can run side by side
+        self.build_path = self.project_dir / 'build_clang'
+        self.analyzer_build_path = self.project_dir / 'build_analyzer'
+        self.reports_path = self.project_dir / 'analysis_reports'
         self.reports_path.mkdir(exist_ok=True)
+        # Shared by every report from this run so they can be correlated
+        self.run_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
     def setup_environment(self):
         """Ensure ESP-IDF environment is loaded"""
@@ -31,6 +46,25 @@ class ESP32StaticAnalyzer:
             print(f"❌ ESP-IDF not found at {esp_idf_path}")
             return False
             
+        # Reuse the environment resolved by a previous run of this export.sh
+        export_script = Path(esp_idf_path) / 'export.sh'
+        try:
+            cache_key = hashlib.sha256(
+                f"{esp_idf_path}{export_script.stat().st_mtime_ns}".encode()
+            ).hexdigest()[:16]
+        except OSError:
+            cache_key = None
+        cache_file = Path.home() / '.cache' / f'esp32_analyzer_env_{cache_key}.json'
+        
+        if cache_key and cache_file.exists():
+            try:
+                os.environ.update(json.loads(cache_file.read_text()))
+                print("✅ ESP-IDF environment loaded (cached)")
+                self._configure_ccache()
+                return True
+            except (OSError, ValueError):
+                pass
+            
         # Source ESP-IDF environment
         try:
             result = subprocess.run(
@@ -39,82 +73,119 @@ class ESP32StaticAnalyzer:
             )
             
             # Update environment with ESP-IDF variables
+            idf_env = {}
             for line in result.stdout.split('\n'):
                 if '=' in line and ('IDF_' in line or 'ESP_' in line or 'PATH=' in line):
                     key, value = line.split('=', 1)
-                    os.environ[key] = value
+                    idf_env[key] = value
+            os.environ.update(idf_env)
+            
+            if cache_key and result.returncode == 0 and idf_env:
+                try:
+                    cache_file.parent.mkdir(parents=True, exist_ok=True)
+                    cache_file.write_text(json.dumps(idf_env))
+                except OSError:
+                    pass
                     
             print("✅ ESP-IDF environment loaded")
+            self._configure_ccache()
             return True
             
         except Exception as e:
             print(f"❌ Failed to load ESP-IDF environment: {e}")
             return False
     
-    def run_clang_tidy_analysis(self):
+    def _configure_ccache(self):
+        """Give ccache room for the -fanalyzer objects of a full firmware build"""
+        if shutil.which('ccache'):
+            subprocess.run(['ccache', '--max-size=5G'], capture_output=True, check=False)
+    
+    def run_clang_tidy_analysis(self, timestamp=None):
         """Run clang-tidy static analysis as per research document"""
         print("\n🔍 === CLANG-TIDY STATIC ANALYSIS ===")
         print("Based on ESP-IDF research document recommendations")
         
         try:
-            # Ensure clang toolchain is available
-            print("📋 Setting up clang toolchain...")
-            subprocess.run(['idf_tools.py', 'install', 'esp-clang'], check=True)
+            # Ensure clang toolchain is available, skipping the installer when it already is
+            idf_tools_path = Path(os.environ.get('IDF_TOOLS_PATH', Path.home() / '.espressif'))
+            if shutil.which('clang-tidy') is None or not (idf_tools_path / 'tools' / 'esp-clang').exists():
+                print("📋 Setting up clang toolchain...")
+                subprocess.run(['idf_tools.py', 'install', 'esp-clang'], check=True)
             
-            # Set clang environment
-            os.environ['IDF_TOOLCHAIN'] = 'clang'
+            # Select clang for these subprocesses only; the GCC pass may be running concurrently
+            clang_env = dict(os.environ, IDF_TOOLCHAIN='clang')
             
             print("🔨 Configuring project with clang...")
-            result = subprocess.run(
-                ['idf.py', 'reconfigure'],
-                cwd=self.project_path,
-                capture_output=True,
-                text=True
+            returncode, output_tail = self._run_streaming(
+                ['idf.py', '-B', str(self.build_path), 'reconfigure'], env=clang_env
             )
             
-            if result.returncode != 0:
-                print(f"⚠️  Reconfigure warning: {result.stderr}")
+            if returncode != 0:
+                print(f"⚠️  Reconfigure warning: {output_tail}")
             
-            print("🔍 Running clang-tidy analysis...")
-            result = subprocess.run(
-                ['idf.py', 'clang-check'],
-                cwd=self.project_path,
-                capture_output=True,
-                text=True
-            )
+            warnings_file = self.project_dir / 'warnings.txt'
+            run_clang_tidy = self._find_run_clang_tidy()
+            compile_commands = self.build_path / 'compile_commands.json'
+            
+            if run_clang_tidy and compile_commands.exists():
+                # One clang-tidy process per core instead of idf.py's serial run
+                jobs = os.cpu_count() or 1
+                print(f"🔍 Running clang-tidy analysis ({jobs} parallel jobs)...")
+                # Skip generated sources in every build tree, including our own
+                build_dirs = '|'.join(re.escape(d) for d in
+                                      ('build', self.build_path.name, self.analyzer_build_path.name))
+                project_files = f"^{re.escape(str(self.project_dir.resolve()))}/(?!(?:{build_dirs})/)"
+                with open(warnings_file, 'w') as output:
+                    subprocess.run(
+                        [run_clang_tidy, '-j', str(jobs), '-p', str(self.build_path),
+                         '-quiet', project_files],
+                        cwd=self.project_path,
+                        env=clang_env,
+                        stdout=output,
+                        stderr=subprocess.STDOUT
+                    )
+                output_tail = ''
+            else:
+                print("🔍 Running clang-tidy analysis...")
+                _, output_tail = self._run_streaming(
+                    ['idf.py', '-B', str(self.build_path), 'clang-check'], env=clang_env
+                )
             
             # Check for warnings.txt file
-            warnings_file = Path(self.project_path) / 'warnings.txt'
             if warnings_file.exists():
                 print(f"✅ Clang-tidy analysis complete")
                 print(f"📄 Report saved to: {warnings_file}")
                 
                 # Copy to reports directory with timestamp
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                timestamp = timestamp or self.run_timestamp
                 report_copy = self.reports_path / f'clang_tidy_{timestamp}.txt'
-                subprocess.run(['cp', str(warnings_file), str(report_copy)])
                 
-                # Show summary
-                with open(warnings_file, 'r') as f:
-                    content = f.read()
-                    lines = content.split('\n')
-                    warning_count = len([l for l in lines if 'warning:' in l])
-                    error_count = len([l for l in lines if 'error:' in l])
+                # Copy and summarize in one streaming pass
+                counts = collections.Counter()
+                warning_lines = []
+                with open(warnings_file, 'r') as f, open(report_copy, 'w') as copy:
+                    for line in f:
+                        copy.write(line)
+                        m = WARN_RE.search(line)
+                        if m:
+                            counts[m.group(1)] += 1
+                            if m.group(1) == 'warning' and len(warning_lines) < 3:
+                                warning_lines.append(line.rstrip('\n'))
+                warning_count = counts['warning']
+                error_count = counts['error']
                     
                 print(f"📊 Analysis Summary: {warning_count} warnings, {error_count} errors")
                 
                 # Show first few warnings
                 if warning_count > 0:
                     print("\n🔸 Sample warnings:")
-                    warning_lines = [l for l in lines if 'warning:' in l][:3]
                     for warning in warning_lines:
                         print(f"   {warning}")
                         
                 return True
             else:
                 print("⚠️  No warnings.txt generated - clang-tidy may have failed")
-                print(f"Output: {result.stdout}")
-                print(f"Errors: {result.stderr}")
+                print(f"Output: {output_tail}")
                 return False
                 
         except subprocess.CalledProcessError as e:
@@ -124,39 +195,66 @@ class ESP32StaticAnalyzer:
             print(f"❌ Unexpected error: {e}")
             return False
     
-    def generate_html_report(self):
+    def _run_streaming(self, cmd, log_file=None, on_line=None, tail_lines=20, env=None):
+        """Run cmd in the project with stderr folded into stdout, consuming output line by line
+
+        Output is never buffered whole: each line is optionally written to
+        log_file and passed to on_line. Returns (returncode, tail) where tail
+        holds the last few lines for error messages.
+        """
+        tail = collections.deque(maxlen=tail_lines)
+        with subprocess.Popen(
+            cmd,
+            cwd=self.project_path,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            errors='replace',
+            bufsize=1
+        ) as proc:
+            for line in proc.stdout:
+                if log_file:
+                    log_file.write(line)
+                if on_line:
+                    on_line(line)
+                tail.append(line)
+        return proc.returncode, ''.join(tail)
+    
+    def _find_run_clang_tidy(self):
+        """Locate LLVM's run-clang-tidy driver, or None if unavailable"""
+        for name in ('run-clang-tidy', 'run-clang-tidy.py'):
+            path = shutil.which(name)
+            if path:
+                return path
+        return None
+    
+    def generate_html_report(self, timestamp=None):
         """Generate HTML report as per research document"""
         print("\n📊 === GENERATING HTML REPORT ===")
         
         try:
             # Install codereport if not available
-            result = subprocess.run(
-                [sys.executable, '-m', 'pip', 'show', 'codereport'],
-                capture_output=True
-            )
-            
-            if result.returncode != 0:
+            if importlib.util.find_spec('codereport') is None:
                 print("📦 Installing codereport...")
                 subprocess.run([
                     sys.executable, '-m', 'pip', 'install', 'codereport'
                 ], check=True)
             
             print("🔨 Generating HTML report...")
-            result = subprocess.run(
-                ['idf.py', 'clang-html-report'],
-                cwd=self.project_path,
-                capture_output=True,
-                text=True
+            self._run_streaming(
+                ['idf.py', '-B', str(self.build_path), 'clang-html-report'],
+                env=dict(os.environ, IDF_TOOLCHAIN='clang')
             )
             
-            html_report_dir = Path(self.project_path) / 'html_report'
+            html_report_dir = self.project_dir / 'html_report'
             if html_report_dir.exists():
                 print(f"✅ HTML report generated in: {html_report_dir}")
                 
                 # Copy to timestamped reports directory
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                timestamp = timestamp or self.run_timestamp
                 report_dir = self.reports_path / f'html_report_{timestamp}'
-                subprocess.run(['cp', '-r', str(html_report_dir), str(report_dir)])
+                shutil.copytree(html_report_dir, report_dir, dirs_exist_ok=True)
                 
                 print(f"📁 Report archived to: {report_dir}")
                 print(f"🌐 Open: {report_dir}/index.html")
@@ -169,7 +267,7 @@ class ESP32StaticAnalyzer:
             print(f"❌ HTML report generation failed: {e}")
             return False
     
-    def run_gcc_static_analyzer(self):
+    def run_gcc_static_analyzer(self, timestamp=None):
         """Run GCC static analyzer as per research document"""
         print("\n🔍 === GCC STATIC ANALYZER ===")
         
@@ -183,49 +281,57 @@ CONFIG_COMPILER_STATIC_ANALYZER=y
 CONFIG_COMPILER_STATIC_ANALYZER_MODE_LOG=y
 """
             
-            config_file = Path(self.project_path) / 'sdkconfig'
-            backup_file = Path(self.project_path) / 'sdkconfig.backup'
+            # Work on a private copy of sdkconfig so the project config (and a
+            # concurrent clang pass reading it) is never touched
+            config_file = self.project_dir / 'sdkconfig'
+            analyzer_config = self.analyzer_build_path / 'sdkconfig.analyzer'
+            self.analyzer_build_path.mkdir(exist_ok=True)
             
-            # Backup current config
-            if config_file.exists():
-                subprocess.run(['cp', str(config_file), str(backup_file)])
+            # Add static analyzer config, rewriting only on change so the
+            # persistent build_analyzer tree builds incrementally
+            try:
+                base_config = config_file.read_text()
+            except FileNotFoundError:
+                base_config = ""
+            try:
+                current_config = analyzer_config.read_text()
+            except FileNotFoundError:
+                current_config = None
+            if current_config != base_config + config_change:
+                analyzer_config.write_text(base_config + config_change)
             
-            # Add static analyzer config
-            with open(config_file, 'a') as f:
-                f.write(config_change)
+            # Let ESP-IDF wrap the compiler with ccache so unchanged objects are reused
+            # -fanalyzer is CPU bound per translation unit, so use every core
+            jobs = os.cpu_count() or 1
+            analyzer_env = dict(os.environ, IDF_CCACHE_ENABLE='1', MAKEFLAGS=f'-j{jobs}')
                 
-            print("🔨 Building with GCC static analyzer...")
-            result = subprocess.run(
-                ['idf.py', 'build'],
-                cwd=self.project_path,
-                capture_output=True,
-                text=True
-            )
-            
-            # Look for analyzer output in build log
+            # Save analyzer report, streaming the build log into it
+            timestamp = timestamp or self.run_timestamp
+            analyzer_report = self.reports_path / f'gcc_analyzer_{timestamp}.txt'
             analyzer_warnings = []
-            if result.stdout:
-                lines = result.stdout.split('\n')
-                for line in lines:
-                    if 'warning:' in line and ('analyzer' in line.lower() or 'static' in line.lower()):
-                        analyzer_warnings.append(line)
             
-            if result.stderr:
-                lines = result.stderr.split('\n')
-                for line in lines:
-                    if 'warning:' in line and ('analyzer' in line.lower() or 'static' in line.lower()):
-                        analyzer_warnings.append(line)
-            
-            # Save analyzer report
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            analyzer_report = self.reports_path / f'gcc_analyzer_{timestamp}.txt'
+            def collect_analyzer_warning(line):
+                m = WARN_RE.search(line)
+                if m and m.group(1) == 'warning' and ANALYZER_RE.search(line):
+                    analyzer_warnings.append(line.rstrip('\n'))
             
+            print("🔨 Building with GCC static analyzer...")
             with open(analyzer_report, 'w') as f:
                 f.write("GCC Static Analyzer Report\n")
                 f.write("=" * 30 + "\n\n")
                 f.write(f"Generated: {datetime.now().isoformat()}\n")
                 f.write(f"Project: {self.project_path}\n\n")
                 
+                f.write("Full Build Output:\n")
+                f.write("-" * 20 + "\n")
+                self._run_streaming(
+                    ['idf.py', '-B', str(self.analyzer_build_path),
+                     '-D', f'SDKCONFIG={analyzer_config}', '-j', str(jobs), 'build'],
+                    log_file=f, on_line=collect_analyzer_warning, env=analyzer_env
+                )
+                
+                # Warnings are only known once the build finishes, so they follow the log
+                f.write("\n")
                 if analyzer_warnings:
                     f.write("Analyzer Warnings:\n")
                     f.write("-" * 20 + "\n")
@@ -233,21 +339,10 @@ CONFIG_COMPILER_STATIC_ANALYZER_MODE_LOG=y
                         f.write(f"{warning}\n")
                 else:
                     f.write("No analyzer warnings found.\n")
-                
-                f.write("\nFull Build Output:\n")
-                f.write("-" * 20 + "\n")
-                f.write(result.stdout)
-                if result.stderr:
-                    f.write("\nBuild Errors:\n")
-                    f.write(result.stderr)
             
             print(f"✅ GCC analyzer report saved: {analyzer_report}")
             print(f"📊 Found {len(analyzer_warnings)} analyzer warnings")
             
-            # Restore original config
-            if backup_file.exists():
-                subprocess.run(['mv', str(backup_file), str(config_file)])
-            
             return True
             
         except Exception as e:
@@ -270,13 +365,17 @@ CONFIG_COMPILER_STATIC_ANALYZER_MODE_LOG=y
             'gcc_analyzer': False
         }
         
-        # Run all analysis tools
-        results['clang_tidy'] = self.run_clang_tidy_analysis()
-        
-        if results['clang_tidy']:
-            results['html_report'] = self.generate_html_report()
-        
-        results['gcc_analyzer'] = self.run_gcc_static_analyzer()
+        # Run all analysis tools - the GCC analyzer build is independent of the
+        # clang pass, so it runs alongside clang-tidy and the HTML report
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            gcc_future = executor.submit(self.run_gcc_static_analyzer)
+            
+            results['clang_tidy'] = self.run_clang_tidy_analysis()
+            
+            if results['clang_tidy']:
+                results['html_report'] = self.generate_html_report()
+            
+            results['gcc_analyzer'] = gcc_future.result()
         
         # Summary
         print("\n📋 ANALYSIS SUMMARY")
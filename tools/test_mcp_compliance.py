@@ -4,72 +4,63 @@ MCP Compliance Test Suite
 Tests ESP32 Debug Tools MCP Server against Model Context Protocol specification
 """
 
-import json
-import subprocess
 import sys
-import time
 from typing import Dict, Any, List
-from pathlib import Path
+
+from _mcp_test_server_fixture import shared_server, SERVER_SCRIPT, SERVER_SCRIPT_PATH
+
+# JSON-RPC error code for an unknown method
+METHOD_NOT_FOUND = -32601
 
 class MCPComplianceTest:
     """Test suite for MCP specification compliance"""
     
-    def __init__(self, server_script: str):
-        self.server_script = server_script
+    # Methods a server may leave unimplemented, probed together in one batch
+    OPTIONAL_METHODS = ["resources/list", "prompts/list", "ping"]
+    
+    # Parameterless requests answered up front in one batch
+    PREFETCH_METHODS = ["tools/list"] + OPTIONAL_METHODS + ["invalid/method"]
+    
+    def __init__(self, server):
+        self.server = server
+        self.init_response = server.init_response
+        self._prefetched = {}
         self.test_results = []
         
-    def send_jsonrpc_request(self, method: str, params: Dict[str, Any] = None, request_id: int = 1) -> Dict[str, Any]:
-        """Send JSON-RPC request to MCP server"""
-        request = {
-            "jsonrpc": "2.0",
-            "method": method,
-            "id": request_id
-        }
-        
-        if params:
-            request["params"] = params
-            
-        try:
-            # Start server process
-            proc = subprocess.Popen(
-                [sys.executable, self.server_script],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            # Send request
-            request_str = json.dumps(request)
-            stdout, stderr = proc.communicate(input=request_str, timeout=10)
+    def send_jsonrpc_request(self, method: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Send JSON-RPC request to the shared MCP server"""
+        # Fixed probes were already answered by the suite's opening batch
+        if params is None and method in self._prefetched:
+            return self._prefetched[method]
             
-            # Parse response
-            if stdout.strip():
-                return json.loads(stdout.strip())
-            else:
-                return {"error": f"No response. stderr: {stderr}"}
-                
-        except subprocess.TimeoutExpired:
-            proc.kill()
-            return {"error": "Request timeout"}
-        except Exception as e:
-            return {"error": str(e)}
+        return self.server.request(method, params)
+    
+    def prefetch_responses(self):
+        """Send every fixed probe request in a single batch"""
+        self._prefetched = self.send_batch_requests(self.PREFETCH_METHODS)
+    
+    def send_batch_requests(self, methods: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Send parameterless requests in one batch and return the responses by method"""
+        probe_ids = {method: self.server.next_id() for method in methods}
+        responses = self.server.send_batch([
+            {"jsonrpc": "2.0", "method": method, "id": request_id}
+            for method, request_id in probe_ids.items()
+        ])
+        
+        missing = {"error": "No response"}
+        if len(responses) < len(probe_ids):
+            missing = {"error": f"No response. stderr: {self.server.stderr_text()}"}
+        return {
+            method: responses.get(request_id, missing)
+            for method, request_id in probe_ids.items()
+        }
     
     def test_initialize_sequence(self) -> bool:
         """Test MCP initialization sequence"""
         print("🔍 Testing MCP initialization sequence...")
         
-        # Test 1: Initialize request
-        init_params = {
-            "protocolVersion": "2024-11-05",
-            "capabilities": {},
-            "clientInfo": {
-                "name": "test-client",
-                "version": "1.0.0"
-            }
-        }
-        
-        response = self.send_jsonrpc_request("initialize", init_params)
+        # The handshake itself ran once when the shared server started
+        response = self.init_response or {"error": "Initialize was not sent"}
         
         if "error" in response:
             print(f"❌ Initialize failed: {response['error']}")
@@ -95,179 +86,71 @@ class MCPComplianceTest:
         """Test tools/list method after proper initialization"""
         print("🔍 Testing tools/list method with proper MCP initialization...")
         
-        # Start a persistent connection for proper MCP flow
-        try:
-            proc = subprocess.Popen(
-                [sys.executable, self.server_script],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=0  # Unbuffered
-            )
-            
-            # Send initialize
-            init_request = {
-                "jsonrpc": "2.0",
-                "method": "initialize",
-                "params": {
-                    "protocolVersion": "2024-11-05",
-                    "capabilities": {},
-                    "clientInfo": {
-                        "name": "test-client",
-                        "version": "1.0.0"
-                    }
-                },
-                "id": 1
-            }
-            proc.stdin.write(json.dumps(init_request) + "\n")
-            proc.stdin.flush()
-            
-            # Read initialize response (skip any startup messages)
-            init_response = None
-            for _ in range(5):  # Try up to 5 lines
-                line = proc.stdout.readline()
-                if line and line.strip().startswith('{"jsonrpc"'):
-                    init_response = line.strip()
-                    break
-            
-            if not init_response:
-                print("❌ No initialize response found")
-                proc.kill()
-                return False
-            
-            init_result = json.loads(init_response)
-            if "error" in init_result:
-                print(f"❌ Initialize failed: {init_result['error']}")
-                proc.kill()
-                return False
-            
-            # Send initialized notification
-            initialized_notification = {
-                "jsonrpc": "2.0",
-                "method": "notifications/initialized"
-            }
-            proc.stdin.write(json.dumps(initialized_notification) + "\n")
-            proc.stdin.flush()
-            
-            # Now send tools/list
-            tools_request = {
-                "jsonrpc": "2.0",
-                "method": "tools/list",
-                "id": 2
-            }
-            proc.stdin.write(json.dumps(tools_request) + "\n")
-            proc.stdin.flush()
-            
-            # Read tools/list response
-            tools_response = None
-            for _ in range(3):  # Try up to 3 lines
-                line = proc.stdout.readline()
-                if line and line.strip().startswith('{"jsonrpc"'):
-                    tools_response = line.strip()
-                    break
-                    
-            proc.kill()
-            
-            if not tools_response:
-                print("❌ No tools/list response found")
-                return False
-                
-            tools_result = json.loads(tools_response)
-            
-            if "error" in tools_result:
-                print(f"❌ tools/list failed: {tools_result['error']}")
-                return False
-                
-            if "result" not in tools_result:
-                print("❌ tools/list response missing result")
-                return False
-                
-            result = tools_result["result"]
-            
-            # Check tools structure
-            if "tools" not in result:
-                print("❌ tools/list response missing tools array")
-                return False
-                
-            tools = result["tools"]
-            if not isinstance(tools, list):
-                print("❌ tools must be an array")
-                return False
-                
-            # Validate each tool
-            for tool in tools:
-                required_tool_fields = ["name", "description", "inputSchema"]
-                for field in required_tool_fields:
-                    if field not in tool:
-                        print(f"❌ Tool '{tool.get('name', 'unknown')}' missing {field}")
-                        return False
-            
-            print(f"✅ tools/list passed - {len(tools)} tools discovered")
-            return True
+        tools_result = self.send_jsonrpc_request("tools/list")
+        
+        if "error" in tools_result:
+            print(f"❌ tools/list failed: {tools_result['error']}")
+            return False
             
-        except Exception as e:
-            if 'proc' in locals():
-                proc.kill()
-            print(f"❌ tools/list test error: {e}")
+        if "result" not in tools_result:
+            print("❌ tools/list response missing result")
             return False
-    
-    def test_resources_list(self) -> bool:
-        """Test resources/list method"""
-        print("🔍 Testing resources/list method...")
-        
-        response = self.send_jsonrpc_request("resources/list")
+            
+        result = tools_result["result"]
         
-        if "error" in response:
-            # Resources are optional, so error is acceptable
-            print("ℹ️  resources/list not implemented (optional)")
-            return True
+        # Check tools structure
+        if "tools" not in result:
+            print("❌ tools/list response missing tools array")
+            return False
             
-        if "result" in response:
-            result = response["result"]
-            if "resources" in result:
-                print(f"✅ resources/list passed - {len(result['resources'])} resources")
-            else:
-                print("ℹ️  resources/list returned empty")
-            return True
+        tools = result["tools"]
+        if not isinstance(tools, list):
+            print("❌ tools must be an array")
+            return False
             
+        # Validate each tool
+        for tool in tools:
+            required_tool_fields = ["name", "description", "inputSchema"]
+            for field in required_tool_fields:
+                if field not in tool:
+                    print(f"❌ Tool '{tool.get('name', 'unknown')}' missing {field}")
+                    return False
+        
+        print(f"✅ tools/list passed - {len(tools)} tools discovered")
         return True
     
-    def test_prompts_list(self) -> bool:
-        """Test prompts/list method"""
-        print("🔍 Testing prompts/list method...")
+    def test_optional_methods(self) -> bool:
+        """Test the optional resources/list, prompts/list and ping methods in one batch"""
+        print("🔍 Testing optional methods (resources/list, prompts/list, ping)...")
         
-        response = self.send_jsonrpc_request("prompts/list")
+        if all(method in self._prefetched for method in self.OPTIONAL_METHODS):
+            responses = self._prefetched
+        else:
+            responses = self.send_batch_requests(self.OPTIONAL_METHODS)
         
-        if "error" in response:
-            # Prompts are optional, so error is acceptable
-            print("ℹ️  prompts/list not implemented (optional)")
-            return True
+        for method in self.OPTIONAL_METHODS:
+            response = responses[method]
             
-        if "result" in response:
-            result = response["result"]
-            if "prompts" in result:
-                print(f"✅ prompts/list passed - {len(result['prompts'])} prompts")
+            if "error" in response:
+                error = response["error"]
+                code = error.get("code") if isinstance(error, dict) else None
+                # All three are optional, so an error is acceptable
+                if code == METHOD_NOT_FOUND:
+                    print(f"ℹ️  {method} not implemented (optional)")
+                else:
+                    print(f"ℹ️  {method} returned error (optional): {error}")
+                continue
+                
+            result = response.get("result", {})
+            if method == "ping":
+                print("✅ ping method passed")
             else:
-                print("ℹ️  prompts/list returned empty")
-            return True
-            
-        return True
-    
-    def test_ping(self) -> bool:
-        """Test ping utility method"""
-        print("🔍 Testing ping method...")
-        
-        response = self.send_jsonrpc_request("ping")
+                key = method.split("/")[0]
+                if key in result:
+                    print(f"✅ {method} passed - {len(result[key])} {key}")
+                else:
+                    print(f"ℹ️  {method} returned empty")
         
-        if "error" in response:
-            print("ℹ️  ping not implemented (optional)")
-            return True
-            
-        if "result" in response:
-            print("✅ ping method passed")
-            return True
-            
         return True
     
     def test_error_handling(self) -> bool:
@@ -322,9 +205,7 @@ class MCPComplianceTest:
             ("JSON-RPC 2.0 Compliance", self.test_json_rpc_compliance),
             ("Initialize Sequence", self.test_initialize_sequence),
             ("Tools List", self.test_tools_list),
-            ("Resources List", self.test_resources_list),
-            ("Prompts List", self.test_prompts_list),
-            ("Ping Method", self.test_ping),
+            ("Optional Methods", self.test_optional_methods),
             ("Error Handling", self.test_error_handling),
         ]
         
@@ -332,6 +213,9 @@ class MCPComplianceTest:
         passed = 0
         total = len(tests)
         
+        # One server session and one batch of probes serve every test
+        self.prefetch_responses()
+        
         for test_name, test_func in tests:
             print(f"\n📋 Running: {test_name}")
             try:
@@ -357,14 +241,13 @@ class MCPComplianceTest:
 
 def main():
     """Run MCP compliance tests"""
-    server_script = Path(__file__).parent / "esp32_debug_mcp_server.py"
-    
-    if not server_script.exists():
-        print(f"❌ MCP server script not found: {server_script}")
+    if SERVER_SCRIPT is None:
+        print(f"❌ MCP server script not found: {SERVER_SCRIPT_PATH}")
         sys.exit(1)
     
-    tester = MCPComplianceTest(str(server_script))
-    results = tester.run_compliance_tests()
+    with shared_server(SERVER_SCRIPT) as server:
+        tester = MCPComplianceTest(server)
+        results = tester.run_compliance_tests()
     
     # Exit with error code if tests failed
     if not all(results.values()):
@@ -4,12 +4,89 @@ ESP32 Tool Usage Analytics
 Track tool usage patterns and provide intelligent recommendations
 """
 
+import functools
 import json
 import os
+import sqlite3
 import time
 from pathlib import Path
-from datetime import datetime, timedelta
-from collections import defaultdict, Counter
+from datetime import datetime
+
+# Espressif USB-JTAG/serial vendor and product id
+ESP32_USB_ID = ("303a", "1001")
+
+# Analysis tools suggested when they have not been used yet, in suggestion order
+ANALYSIS_TOOLS = (
+    "comprehensive_troubleshooting.py",
+    "esptool_advanced_suite.py",
+    "static_analysis_suite.py",
+    "openocd_telnet_demo.py",
+    "esp32c6_memory_debug.py"
+)
+
+# Icons shown next to each recommendation priority
+PRIORITY_ICONS = {"high": "🚨", "medium": "⚠️", "low": "💡"}
+
+# Shared instance used by the convenience functions
+_INSTANCE = None
+
+def _ttl_cache(seconds):
+    """Cache a probe's result for the given number of seconds"""
+    def decorator(func):
+        cache = {}
+        
+        @functools.wraps(func)
+        def wrapper(*args):
+            now = time.monotonic()
+            hit = cache.get(args)
+            if hit is not None and hit[0] > now:
+                return hit[1]
+            value = func(*args)
+            cache[args] = (now + seconds, value)
+            return value
+        return wrapper
+    return decorator
+
+def _event_time(cmd):
+    """Return an event's Unix timestamp, parsing the ISO string for older records"""
+    ts = cmd.get("ts")
+    if ts is None:
+        ts = datetime.fromisoformat(cmd["timestamp"]).timestamp()
+    return ts
+
+def _legacy_counter_events(snapshot):
+    """Synthesize the events a JSON snapshot counted in tool_usage but no longer kept in command_history
+    
+    The old tracker capped its history at 100 commands while the per-tool
+    counters covered every use, so the difference is imported as events
+    stamped at the tool's first use, without a duration.
+    """
+    history = snapshot.get("command_history", [])
+    events = []
+    for tool, usage in snapshot.get("tool_usage", {}).items():
+        # Early snapshots stored a bare count per tool
+        if not isinstance(usage, dict):
+            usage = {"count": usage}
+        kept = [cmd for cmd in history if cmd["tool"] == tool]
+        missing = usage.get("count", 0) - len(kept)
+        if missing <= 0:
+            continue
+        
+        # Split the dropped uses by the counters' success/failure totals
+        kept_successes = sum(1 for cmd in kept if cmd["success"])
+        successes = usage.get("success_count", kept_successes + missing) - kept_successes
+        successes = min(max(successes, 0), missing)
+        
+        first_used = usage.get("first_used")
+        if first_used:
+            ts = datetime.fromisoformat(first_used).timestamp()
+        elif kept:
+            ts = min(_event_time(cmd) for cmd in kept)
+        else:
+            ts = time.time()
+        events.extend({"tool": tool, "ts": ts, "success": index < successes, "duration": None}
+                      for index in range(missing))
+    return events
 
 class ESP32ToolAnalytics:
     """
@@ -17,105 +94,120 @@ class ESP32ToolAnalytics:
     Provides intelligent recommendations based on usage history
     """
     
-    def __init__(self, analytics_file=".vesc_analytics.json"):
+    def __init__(self, analytics_file=".vesc_analytics.db"):
         self.analytics_file = Path(analytics_file)
-        self.data = self.load_analytics()
+        self.conn = sqlite3.connect(str(self.analytics_file))
+        self._init_schema()
         
-    def load_analytics(self):
-        """Load existing analytics data"""
-        if self.analytics_file.exists():
-            try:
-                with open(self.analytics_file, 'r') as f:
-                    return json.load(f)
-            except Exception:
-                pass
+    def _init_schema(self):
+        """Create the events table and its timestamp index on first use"""
+        # WAL lets several tracked commands write while a dashboard reads
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                "tool TEXT NOT NULL, ts_ns INTEGER NOT NULL, success INTEGER NOT NULL, duration REAL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS ix_events_ts ON events(ts_ns)")
         
-        return {
-            "tool_usage": {},
-            "command_history": [],
-            "session_data": {},
-            "recommendations": {},
-            "first_use": datetime.now().isoformat(),
-            "last_updated": datetime.now().isoformat()
-        }
+        if self.conn.execute("SELECT 1 FROM events LIMIT 1").fetchone() is None:
+            self._import_legacy_analytics()
     
-    def save_analytics(self):
-        """Save analytics data to file"""
-        self.data["last_updated"] = datetime.now().isoformat()
+    def _import_legacy_analytics(self):
+        """Import the usage recorded by the JSON-based tracker, if there is one"""
+        legacy_file = self.analytics_file.with_suffix(".json")
+        legacy_log = self.analytics_file.with_suffix(".events.jsonl")
+        events = []
         try:
-            with open(self.analytics_file, 'w') as f:
-                json.dump(self.data, f, indent=2)
+            try:
+                with open(legacy_file, 'rb') as f:
+                    snapshot = json.loads(f.read())
+                events.extend(_legacy_counter_events(snapshot))
+                events.extend(snapshot.get("command_history", []))
+            except FileNotFoundError:
+                pass
+            try:
+                with open(legacy_log, 'rb') as f:
+                    events.extend(json.loads(line) for line in f if line.strip())
+            except FileNotFoundError:
+                pass
         except Exception as e:
-            print(f"Warning: Could not save analytics: {e}")
+            print(f"Warning: Could not import legacy analytics: {e}")
+            return
+        
+        if not events:
+            return
+        
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO events VALUES (?, ?, ?, ?)",
+                ((cmd["tool"], int(_event_time(cmd) * 1e9), int(bool(cmd["success"])), cmd.get("duration"))
+                 for cmd in events)
+            )
+    
+    def close(self):
+        """Close the database connection"""
+        self.conn.close()
     
     def record_tool_usage(self, tool_name, success=True, duration=None):
         """Record tool usage event"""
-        timestamp = datetime.now().isoformat()
-        
-        # Update tool usage counts
-        if tool_name not in self.data["tool_usage"]:
-            self.data["tool_usage"][tool_name] = {
-                "count": 0,
-                "success_count": 0,
-                "failure_count": 0,
-                "total_duration": 0,
-                "first_used": timestamp,
-                "last_used": timestamp
-            }
-        
-        tool_data = self.data["tool_usage"][tool_name]
-        tool_data["count"] += 1
-        tool_data["last_used"] = timestamp
-        
-        if success:
-            tool_data["success_count"] += 1
-        else:
-            tool_data["failure_count"] += 1
-        
-        if duration:
-            tool_data["total_duration"] += duration
-        
-        # Add to command history
-        self.data["command_history"].append({
-            "tool": tool_name,
-            "timestamp": timestamp,
-            "success": success,
-            "duration": duration
-        })
-        
-        # Keep only last 100 commands
-        if len(self.data["command_history"]) > 100:
-            self.data["command_history"] = self.data["command_history"][-100:]
-        
-        self.save_analytics()
+        try:
+            with self.conn:
+                self.conn.execute(
+                    "INSERT INTO events VALUES (?, ?, ?, ?)",
+                    (tool_name, time.time_ns(), int(bool(success)), duration)
+                )
+        except sqlite3.Error as e:
+            print(f"Warning: Could not save analytics: {e}")
+    
+    def record_many(self, events):
+        """Record several (tool_name, success, duration) events in one transaction"""
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT INTO events VALUES (?, ?, ?, ?)",
+                    ((tool_name, time.time_ns(), int(bool(success)), duration)
+                     for tool_name, success, duration in events)
+                )
+        except sqlite3.Error as e:
+            print(f"Warning: Could not save analytics: {e}")
     
     def get_usage_stats(self):
         """Get comprehensive usage statistics"""
+        total, successes, unique_tools = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(success), 0), COUNT(DISTINCT tool) FROM events"
+        ).fetchone()
+        
         stats = {
-            "total_commands": len(self.data["command_history"]),
-            "unique_tools": len(self.data["tool_usage"]),
+            "total_commands": total,
+            "unique_tools": unique_tools,
             "most_used_tools": [],
             "recent_activity": [],
             "success_rate": 0,
+            "recent_failures": 0,
             "session_info": {}
         }
         
-        # Most used tools
-        tool_counts = [(tool, data["count"]) for tool, data in self.data["tool_usage"].items()]
-        stats["most_used_tools"] = sorted(tool_counts, key=lambda x: x[1], reverse=True)[:5]
+        # Most used tools; ties go to the tool used first
+        stats["most_used_tools"] = self.conn.execute(
+            "SELECT tool, COUNT(*) FROM events GROUP BY tool ORDER BY 2 DESC, MIN(rowid) LIMIT 5"
+        ).fetchall()
         
-        # Recent activity (last 24 hours)
-        cutoff = datetime.now() - timedelta(hours=24)
-        recent_commands = [
-            cmd for cmd in self.data["command_history"]
-            if datetime.fromisoformat(cmd["timestamp"]) > cutoff
-        ]
-        stats["recent_activity"] = recent_commands[-10:]  # Last 10 commands
+        # Recent activity (last 24 hours), served by the timestamp index
+        cutoff_ns = time.time_ns() - 24 * 3600 * 10**9
+        rows = self.conn.execute(
+            "SELECT tool, ts_ns, success, duration FROM events WHERE ts_ns > ? ORDER BY ts_ns DESC LIMIT 10",
+            (cutoff_ns,)
+        ).fetchall()
+        stats["recent_activity"] = [
+            {"tool": tool, "ts_ns": ts_ns, "success": bool(success), "duration": duration}
+            for tool, ts_ns, success, duration in reversed(rows)
+        ]  # Last 10 commands
+        stats["recent_failures"] = sum(1 for row in rows if not row[2])
         
         # Success rate
-        if self.data["command_history"]:
-            successes = sum(1 for cmd in self.data["command_history"] if cmd["success"])
-            stats["success_rate"] = (successes / len(self.data["command_history"])) * 100
+        if total:
+            stats["success_rate"] = (successes / total) * 100
         
         return stats
     
@@ -123,11 +215,6 @@ class ESP32ToolAnalytics:
         """Generate intelligent tool recommendations based on usage patterns"""
         recommendations = []
         
-        # Analyze current project state
-        has_device = self._check_device_connected()
-        has_build = self._check_build_exists()
-        has_environment = self._check_environment_ready()
-        
         # Analyze usage patterns
         stats = self.get_usage_stats()
         
@@ -135,15 +222,16 @@ class ESP32ToolAnalytics:
         now = datetime.now()
         hour = now.hour
         
+        # Project state is probed only here, and the build check only when a device is present
         if 9 <= hour <= 17:  # Work hours
-            if not has_device:
+            if not self._check_device_connected():
                 recommendations.append({
                     "tool": "./vesc troubleshoot",
                     "reason": "Device connection issues during work hours",
                     "priority": "high",
                     "category": "troubleshooting"
                 })
-            elif not has_build:
+            elif not self._check_build_exists():
                 recommendations.append({
                     "tool": "./vesc build",
                     "reason": "No build detected - start development",
@@ -163,12 +251,7 @@ class ESP32ToolAnalytics:
                 })
         
         # Error pattern recommendations
-        recent_failures = [
-            cmd for cmd in stats["recent_activity"]
-            if not cmd["success"]
-        ]
-        
-        if len(recent_failures) >= 2:
+        if stats["recent_failures"] >= 2:
             recommendations.append({
                 "tool": "./vesc check",
                 "reason": "Multiple recent failures detected",
@@ -177,22 +260,12 @@ class ESP32ToolAnalytics:
             })
         
         # Unused tool recommendations
-        all_tools = [
-            "comprehensive_troubleshooting.py",
-            "esptool_advanced_suite.py", 
-            "static_analysis_suite.py",
-            "openocd_telnet_demo.py",
-            "esp32c6_memory_debug.py"
-        ]
-        
-        unused_tools = [
-            tool for tool in all_tools
-            if tool not in [used_tool for used_tool, _ in stats["most_used_tools"]]
-        ]
+        used_tools = {used_tool for used_tool, _ in stats["most_used_tools"]}
+        unused_tool = next((tool for tool in ANALYSIS_TOOLS if tool not in used_tools), None)
         
-        if unused_tools:
+        if unused_tool:
             recommendations.append({
-                "tool": f"python tools/{unused_tools[0]}",
+                "tool": f"python tools/{unused_tool}",
                 "reason": "Explore unused analysis capabilities",
                 "priority": "low",
                 "category": "exploration"
@@ -200,19 +273,35 @@ class ESP32ToolAnalytics:
         
         return recommendations
     
+    @_ttl_cache(5)
     def _check_device_connected(self):
         """Check if ESP32 device is connected"""
+        # On Linux read the USB ids straight from sysfs instead of running lsusb
+        usb_devices = Path("/sys/bus/usb/devices")
+        if usb_devices.is_dir():
+            vendor_id, product_id = ESP32_USB_ID
+            for vendor_file in usb_devices.glob("*/idVendor"):
+                try:
+                    if (vendor_file.read_text().strip() == vendor_id and
+                            (vendor_file.parent / "idProduct").read_text().strip() == product_id):
+                        return True
+                except OSError:
+                    continue
+            return False
+        
         try:
             import subprocess
             result = subprocess.run(['lsusb'], capture_output=True, text=True)
-            return '303a:1001' in result.stdout
+            return ':'.join(ESP32_USB_ID) in result.stdout
         except:
             return False
     
+    @_ttl_cache(5)
     def _check_build_exists(self):
         """Check if build directory exists"""
         return Path("build").exists()
     
+    @_ttl_cache(5)
     def _check_environment_ready(self):
         """Check if ESP-IDF environment is ready"""
         return os.environ.get('IDF_PATH') is not None
@@ -222,7 +311,7 @@ class ESP32ToolAnalytics:
         stats = self.get_usage_stats()
         recommendations = self.get_intelligent_recommendations()
         
-        report = f"""
+        parts = [f"""
 ESP32 Tool Usage Analytics Report
 Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 =====================================
@@ -234,33 +323,34 @@ Unique Tools Used: {stats['unique_tools']}
 Overall Success Rate: {stats['success_rate']:.1f}%
 
 🔥 MOST USED TOOLS
-------------------"""
+------------------"""]
         
         for tool, count in stats["most_used_tools"]:
-            report += f"\n{count:3d}x {tool}"
+            parts.append(f"\n{count:3d}x {tool}")
         
-        report += f"""
+        parts.append("""
 
 🕒 RECENT ACTIVITY (Last 10 commands)
-------------------------------------"""
+------------------------------------""")
         
+        success_icon, failure_icon = "✅", "❌"
         for cmd in stats["recent_activity"]:
-            status = "✅" if cmd["success"] else "❌"
-            timestamp = datetime.fromisoformat(cmd["timestamp"]).strftime('%H:%M')
-            report += f"\n{status} {timestamp} {cmd['tool']}"
+            status = success_icon if cmd["success"] else failure_icon
+            timestamp = datetime.fromtimestamp(cmd["ts_ns"] / 1e9).strftime('%H:%M')
+            parts.append(f"\n{status} {timestamp} {cmd['tool']}")
         
-        report += f"""
+        parts.append("""
 
 💡 INTELLIGENT RECOMMENDATIONS
-------------------------------"""
+------------------------------""")
         
         for rec in recommendations:
-            priority_icon = {"high": "🚨", "medium": "⚠️", "low": "💡"}[rec["priority"]]
-            report += f"\n{priority_icon} {rec['tool']}"
-            report += f"\n   Reason: {rec['reason']}"
-            report += f"\n   Category: {rec['category']}\n"
+            priority_icon = PRIORITY_ICONS[rec["priority"]]
+            parts.append(f"\n{priority_icon} {rec['tool']}"
+                         f"\n   Reason: {rec['reason']}"
+                         f"\n   Category: {rec['category']}\n")
         
-        return report
+        return "".join(parts)
     
     def show_dashboard(self):
         """Show usage analytics dashboard"""
@@ -268,14 +358,37 @@ Overall Success Rate: {stats['success_rate']:.1f}%
         print("=" * 35)
         print(self.generate_usage_report())
 
+def get_analytics(analytics_file=".vesc_analytics.db"):
+    """Return the shared analytics instance, opening the database on first use"""
+    global _INSTANCE
+    if _INSTANCE is None or _INSTANCE.analytics_file != Path(analytics_file):
+        if _INSTANCE is not None:
+            _INSTANCE.close()
+        _INSTANCE = ESP32ToolAnalytics(analytics_file)
+    return _INSTANCE
+
 def track_command(tool_name, success=True, duration=None):
     """Convenience function to track command usage"""
-    analytics = ESP32ToolAnalytics()
+    analytics = get_analytics()
     analytics.record_tool_usage(tool_name, success, duration)
 
+def track_batch(batch_file):
+    """Track every event listed in a JSON Lines file, returning how many were recorded
+    
+    Each line is an object with a "tool" name and optional "success" and "duration".
+    """
+    events = []
+    with open(batch_file, 'r') as f:
+        for line in f:
+            if line.strip():
+                event = json.loads(line)
+                events.append((event["tool"], event.get("success", True), event.get("duration")))
+    get_analytics().record_many(events)
+    return len(events)
+
 def show_recommendations():
     """Show intelligent recommendations"""
-    analytics = ESP32ToolAnalytics()
+    analytics = get_analytics()
     recommendations = analytics.get_intelligent_recommendations()
     
     if not recommendations:
@@ -286,7 +399,7 @@ def show_recommendations():
     print("=" * 40)
     
     for rec in recommendations:
-        priority_icon = {"high": "🚨", "medium": "⚠️", "low": "💡"}[rec["priority"]]
+        priority_icon = PRIORITY_ICONS[rec["priority"]]
         print(f"{priority_icon} {rec['priority'].upper()}: {rec['tool']}")
         print(f"   📝 {rec['reason']}")
         print(f"   🏷️  Category: {rec['category']}")
@@ -300,24 +413,29 @@ def main():
     parser.add_argument('--dashboard', action='store_true', help='Show usage dashboard')
     parser.add_argument('--recommend', action='store_true', help='Show recommendations')
     parser.add_argument('--track', help='Track tool usage')
+    parser.add_argument('--track-batch', metavar='FILE', help='Track every event in a JSON Lines file')
     parser.add_argument('--success', action='store_true', help='Mark tracked command as successful')
     parser.add_argument('--duration', type=float, help='Command duration in seconds')
     
     args = parser.parse_args()
     
     if args.dashboard:
-        analytics = ESP32ToolAnalytics()
+        analytics = get_analytics()
         analytics.show_dashboard()
     elif args.recommend:
         show_recommendations()
     elif args.track:
         track_command(args.track, args.success, args.duration)
         print(f"✅ Tracked usage of: {args.track}")
+    elif args.track_batch:
+        count = track_batch(args.track_batch)
+        print(f"✅ Tracked {count} events from: {args.track_batch}")
     else:
         print("ESP32 Tool Usage Analytics")
         print("Usage: python tools/usage_analytics.py --dashboard")
         print("       python tools/usage_analytics.py --recommend")
         print("       python tools/usage_analytics.py --track 'tool_name' --success")
+        print("       python tools/usage_analytics.py --track-batch events.jsonl")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -4,17 +4,44 @@ ESP32-C6 VESC Express Verification Suite
 Automated implementation correctness verification
 """
 
-import subprocess
 import re
+import bisect
 import json
+import logging
+import os
+import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, fields, is_dataclass
 from typing import Dict, List, Tuple, Optional
 from datetime import datetime
-import hashlib
+from functools import lru_cache
 
-@dataclass
+def _encode_default(obj):
+    """Shallow field dict for dataclasses, str() for anything else"""
+    if is_dataclass(obj):
+        return {f.name: getattr(obj, f.name) for f in fields(obj)}
+    return str(obj)
+
+# orjson serializes dataclasses natively straight to bytes when available;
+# output is compact unless pretty is requested
+try:
+    import orjson
+    
+    def _dumps(obj, pretty: bool = False) -> bytes:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_INDENT_2 if pretty else None)
+except ImportError:
+    def _dumps(obj, pretty: bool = False) -> bytes:
+        if pretty:
+            return json.dumps(obj, indent=2, default=_encode_default, ensure_ascii=False).encode()
+        return json.dumps(obj, separators=(",", ":"), default=_encode_default, ensure_ascii=False).encode()
+
+# __slots__ dataclasses need Python 3.10+; older interpreters keep a __dict__
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+@dataclass(**_SLOTS)
 class VerificationResult:
     """Result of a verification check"""
     test_name: str
@@ -24,6 +51,137 @@ class VerificationResult:
     score: float = 0.0
     critical: bool = False
 
+@lru_cache(maxsize=None)
+def compile_patterns(patterns: Tuple[str, ...], flags: int = 0):
+    """Compile non-overlapping literal terms into one capturing bytes regex"""
+    return re.compile(b"(" + b"|".join(re.escape(p.encode()) for p in patterns) + b")", flags)
+
+@lru_cache(maxsize=None)
+def encode_patterns(patterns: Tuple[str, ...]) -> Tuple[Tuple[str, bytes], ...]:
+    """Pair each term with its bytes form, encoded once per pattern set"""
+    return tuple((p, p.encode()) for p in patterns)
+
+def scan_patterns(data: bytes, patterns, flags: int = 0) -> set:
+    """Return which of patterns occur in data"""
+    patterns = tuple(patterns)
+    if not flags:
+        # Literal terms: C-level bytes search beats a regex alternation on these small files
+        return {p for p, encoded in encode_patterns(patterns) if data.find(encoded) >= 0}
+    regex = compile_patterns(patterns, flags)
+    fold = (lambda term: term.lower()) if flags & re.IGNORECASE else (lambda term: term)
+    wanted = {fold(p.encode()): p for p in patterns}
+    found = set()
+    for match in regex.finditer(data):
+        found.add(wanted[fold(match.group(1))])
+        if len(found) == len(wanted):
+            break
+    return found
+
+@dataclass(frozen=True)
+class VerifySpec:
+    """Declarative file-presence check: each file scores 1.0 when found, 0.0 when missing"""
+    files: Dict[str, str]
+    name: str
+    detail: str
+    critical: Tuple[str, ...] = ()
+
+# name/detail are formatted with the file's {description}, {path} and {filename}
+ESP32C6_SPEC = VerifySpec(
+    files={
+        "main/hwconf/hw_devkit_c6.c": "Hardware configuration",
+        "main/hwconf/hw_devkit_c6.h": "Hardware header",
+        "main/wifi_c6_enhancements.c": "WiFi 6 enhancements",
+        "main/ble_c6_enhancements.c": "BLE 5.3 enhancements",
+        "main/power_management_c6.c": "Power management",
+        "main/ieee802154_c6.c": "IEEE 802.15.4 support",
+        "main/vesc_c6_integration.c": "VESC integration"
+    },
+    name="ESP32-C6 {description}",
+    detail="File {filename}",
+    critical=("main/hwconf/hw_devkit_c6.c", "main/hwconf/hw_devkit_c6.h")
+)
+
+ANDROID_SPEC = VerifySpec(
+    files={
+        "main/android_compat.c": "Android compatibility source",
+        "main/android_compat.h": "Android compatibility header",
+        "main/test_android_compat.c": "Android compatibility tests"
+    },
+    name="Android Compatibility",
+    detail="File {path}"
+)
+
+# Security terms, matched case-insensitively by one regex compiled on first use
+SECURITY_PATTERNS = {
+    "WPA3": "WiFi WPA3 security",
+    "PMF": "Protected Management Frames",
+    "secure_boot": "Secure boot configuration",
+    "flash_encryption": "Flash encryption",
+    "esp_encrypted": "ESP encryption features"
+}
+
+logger = logging.getLogger("vesc.verify")
+
+class _CachedTimeFormatter(logging.Formatter):
+    """Formatter whose timestamp is rendered at most once per second"""
+    
+    _cache = (0, "")
+    
+    def formatTime(self, record, datefmt=None):
+        second = int(record.created)
+        cached_at, text = self._cache
+        if second != cached_at:
+            text = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(second))
+            self._cache = (second, text)
+        return text
+
+def _configure_logging(level: int = logging.INFO):
+    """Attach the console handler once; records are formatted only if emitted"""
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(_CachedTimeFormatter("[%(asctime)s] %(levelname)s: %(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(level)
+
+# CLI key, display name and suite method of each verification test, in run order
+VERIFICATION_TESTS = (
+    ("build", "Build System", "verify_build_system"),
+    ("esp32c6", "ESP32-C6 Features", "verify_esp32c6_features"),
+    ("android", "Android Compatibility", "verify_android_compatibility"),
+    ("comm", "Communication Stack", "verify_communication_stack"),
+    ("lispbm", "LispBM Integration", "verify_lispbm_integration"),
+    ("security", "Security Implementation", "verify_security_implementation"),
+    ("memory", "Memory Optimization", "verify_memory_optimization"),
+    ("docs", "Documentation", "verify_documentation")
+)
+TEST_METHODS = {key: method for key, _, method in VERIFICATION_TESTS}
+TEST_CHOICES = tuple(TEST_METHODS) + ("all",)
+
+# Worker threads used to overlap the I/O of the independent verify_* tests
+MAX_WORKERS = 4
+
+# Binary size buckets for a 4MB ESP32-C6 flash: < 1MB, < 1.5MB, < 2MB, larger
+BIN_SIZE_LIMITS = (1024 * 1024, 1536 * 1024, 2048 * 1024)
+BIN_SIZE_GRADES = (("Excellent", 1.0), ("Good", 0.8), ("Acceptable", 0.6), ("Large", 0.3))
+
+# Files read by the verify_* tests, fetched concurrently before they run
+READ_PLAN = (
+    "main/CMakeLists.txt",
+    "main/android_compat.h",
+    "main/comm_wifi.c",
+    "main/comm_ble.c",
+    "main/comm_can.c",
+    "main/comm_uart.c",
+    "main/commands.c",
+    "main/packet.c",
+    "main/conf_general.h",
+    "sdkconfig"
+)
+
+# Directories whose entries are listed once and shared by every existence check
+INDEXED_DIRS = ("", "main", "main/hwconf", "main/lispBM", "build")
+
 class VESCVerificationSuite:
     """Comprehensive verification suite for VESC Express implementation"""
     
@@ -32,11 +190,69 @@ class VESCVerificationSuite:
         self.results: List[VerificationResult] = []
         self.logs_dir = self.project_root / "logs"
         self.logs_dir.mkdir(exist_ok=True)
+        self._existing: Optional[set] = None
+        self._file_cache: Dict[Path, bytes] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        _configure_logging(logger.level or logging.INFO)
+        
+    def _build_fs_index(self):
+        """List the indexed directories once so existence checks avoid a stat() each"""
+        existing = set()
+        self._indexed_dirs = {self.project_root / rel for rel in INDEXED_DIRS}
+        for directory in self._indexed_dirs:
+            try:
+                with os.scandir(directory) as entries:
+                    existing.update(directory / entry.name for entry in entries)
+            except OSError:
+                continue
+        self._existing = existing
+        return existing
+    
+    def _exists(self, path: Path) -> bool:
+        """Existence check against the scandir index, falling back to stat() outside it"""
+        if self._existing is None:
+            self._build_fs_index()
+        if path in self._existing:
+            return True
+        if path.parent in self._indexed_dirs:
+            return False
+        return path.exists()
+    
+    def _batch_read(self):
+        """Read every existing READ_PLAN file concurrently into _file_cache"""
+        paths = [p for p in (self.project_root / rel for rel in READ_PLAN) if self._exists(p)]
         
-    def log(self, message: str, level: str = "INFO"):
-        """Enhanced logging"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"[{timestamp}] {level}: {message}")
+        def read(path):
+            try:
+                return path, path.read_bytes()
+            except OSError:
+                return path, None
+        
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            for path, data in executor.map(read, paths):
+                if data is not None:
+                    self._file_cache[path] = data
+    
+    def _read_bytes(self, path: Path) -> bytes:
+        """Contents of path, read at most once per suite run"""
+        data = self._file_cache.get(path)
+        if data is None:
+            data = path.read_bytes()
+            with self._lock:
+                self._file_cache[path] = data
+        return data
+    
+    def log(self, message: str, *args, level: str = "INFO"):
+        """Log message % args; formatting is deferred until a handler emits it"""
+        levelno = getattr(logging, level)
+        if not logger.isEnabledFor(levelno):
+            return
+        buffered = getattr(self._local, "records", None)
+        if buffered is not None:
+            buffered.append(logger.makeRecord(logger.name, levelno, __file__, 0, message, args, None))
+        else:
+            logger.log(levelno, message, *args)
     
     def add_result(self, test_name: str, passed: bool, details: str, 
                    score: float = 0.0, critical: bool = False):
@@ -49,14 +265,33 @@ class VESCVerificationSuite:
             score=score,
             critical=critical
         )
-        self.results.append(result)
+        buffered = getattr(self._local, "results", None)
+        if buffered is not None:
+            buffered.append(result)
+        else:
+            with self._lock:
+                self.results.append(result)
         
         status = "✅ PASS" if passed else "❌ FAIL"
         criticality = " [CRITICAL]" if critical else ""
-        self.log(f"{status}{criticality} {test_name}: {details}")
+        self.log("%s%s %s: %s", status, criticality, test_name, details)
         
         return result
     
+    def _verify_spec(self, spec: VerifySpec) -> List[VerificationResult]:
+        """Record one presence result per file in spec"""
+        results = []
+        for path, description in spec.files.items():
+            exists = self._exists(self.project_root / path)
+            fmt = {"description": description, "path": path, "filename": path.rsplit("/", 1)[-1]}
+            results.append(self.add_result(
+                spec.name.format(**fmt), exists,
+                f"{spec.detail.format(**fmt)}: {'Found' if exists else 'Missing'}",
+                1.0 if exists else 0.0,
+                critical=(path in spec.critical)
+            ))
+        return results
+    
     def verify_build_system(self) -> VerificationResult:
         """Verify build system integrity"""
         self.log("🔍 Verifying build system...")
@@ -64,24 +299,20 @@ class VESCVerificationSuite:
         try:
             # Check CMakeLists.txt
             cmake_file = self.project_root / "main" / "CMakeLists.txt"
-            if not cmake_file.exists():
+            if not self._exists(cmake_file):
                 return self.add_result(
                     "Build System", False,
                     "main/CMakeLists.txt not found", 0.0, True
                 )
             
-            with open(cmake_file) as f:
-                cmake_content = f.read()
-            
             # Verify ESP-IDF components
             required_components = [
                 "esp_wifi", "bt", "esp_netif", "nvs_flash", "driver", "esp_coex"
             ]
+            c6_components = ["esp_adc", "esp_pm", "esp_timer"]
             
-            missing_components = []
-            for component in required_components:
-                if component not in cmake_content:
-                    missing_components.append(component)
+            found = scan_patterns(self._read_bytes(cmake_file), required_components + c6_components)
+            missing_components = [c for c in required_components if c not in found]
             
             if missing_components:
                 return self.add_result(
@@ -90,8 +321,7 @@ class VESCVerificationSuite:
                 )
             
             # Check for ESP32-C6 specific components
-            c6_components = ["esp_adc", "esp_pm", "esp_timer"]
-            c6_score = sum(1 for comp in c6_components if comp in cmake_content) / len(c6_components)
+            c6_score = sum(1 for comp in c6_components if comp in found) / len(c6_components)
             
             return self.add_result(
                 "Build System", True,
@@ -109,68 +339,21 @@ class VESCVerificationSuite:
         """Verify ESP32-C6 specific features"""
         self.log("🔍 Verifying ESP32-C6 features...")
         
-        results = []
-        
-        # Check for ESP32-C6 enhancement files
-        c6_files = {
-            "hw_devkit_c6.c": "Hardware configuration",
-            "hw_devkit_c6.h": "Hardware header",
-            "wifi_c6_enhancements.c": "WiFi 6 enhancements",
-            "ble_c6_enhancements.c": "BLE 5.3 enhancements",
-            "power_management_c6.c": "Power management",
-            "ieee802154_c6.c": "IEEE 802.15.4 support",
-            "vesc_c6_integration.c": "VESC integration"
-        }
-        
-        for filename, description in c6_files.items():
-            filepath = self.project_root / "main" / filename
-            if filename.startswith("hw_"):
-                filepath = self.project_root / "main" / "hwconf" / filename
-            
-            exists = filepath.exists()
-            results.append(self.add_result(
-                f"ESP32-C6 {description}", exists,
-                f"File {filename}: {'Found' if exists else 'Missing'}",
-                1.0 if exists else 0.0,
-                critical=(filename in ["hw_devkit_c6.c", "hw_devkit_c6.h"])
-            ))
-        
-        return results
+        return self._verify_spec(ESP32C6_SPEC)
     
     def verify_android_compatibility(self) -> List[VerificationResult]:
         """Verify Android compatibility implementation"""
         self.log("🔍 Verifying Android compatibility...")
         
-        results = []
-        
         # Check Android compatibility files
-        android_files = [
-            "main/android_compat.c",
-            "main/android_compat.h",
-            "main/test_android_compat.c"
-        ]
-        
-        for filepath in android_files:
-            full_path = self.project_root / filepath
-            exists = full_path.exists()
-            results.append(self.add_result(
-                f"Android Compatibility", exists,
-                f"File {filepath}: {'Found' if exists else 'Missing'}",
-                1.0 if exists else 0.0
-            ))
+        results = self._verify_spec(ANDROID_SPEC)
         
         # Check for Android optimization modes in code
         try:
             compat_file = self.project_root / "main" / "android_compat.h"
-            if compat_file.exists():
-                with open(compat_file) as f:
-                    content = f.read()
-                
-                modes_found = 0
+            if self._exists(compat_file):
                 android_modes = ["ANDROID_COMPAT_DISABLED", "ANDROID_COMPAT_BASIC", "ANDROID_COMPAT_OPTIMIZED"]
-                for mode in android_modes:
-                    if mode in content:
-                        modes_found += 1
+                modes_found = len(scan_patterns(self._read_bytes(compat_file), android_modes))
                 
                 results.append(self.add_result(
                     "Android Optimization Modes", modes_found == 3,
@@ -204,19 +387,18 @@ class VESCVerificationSuite:
         
         for filepath, description in comm_files.items():
             full_path = self.project_root / filepath
-            exists = full_path.exists()
+            exists = self._exists(full_path)
             
             if exists:
                 # Check for ESP32-C6 optimizations
                 try:
-                    with open(full_path) as f:
-                        content = f.read()
+                    content = self._read_bytes(full_path)
                     
                     # Look for stack size optimizations
-                    if "4096" in content and "1024" not in content:
+                    if b"4096" in content and b"1024" not in content:
                         score = 1.0
                         detail = f"{description}: Found with stack optimizations"
-                    elif filepath.endswith("comm_wifi.c") and "udp_multicast" in content:
+                    elif filepath.endswith("comm_wifi.c") and b"udp_multicast" in content:
                         score = 0.8
                         detail = f"{description}: Found, checking stack sizes"
                     else:
@@ -245,7 +427,7 @@ class VESCVerificationSuite:
         try:
             # Check LispBM directory
             lispbm_dir = self.project_root / "main" / "lispBM"
-            if not lispbm_dir.exists():
+            if not self._exists(lispbm_dir):
                 return self.add_result(
                     "LispBM Integration", False,
                     "LispBM directory not found", 0.0, True
@@ -253,7 +435,7 @@ class VESCVerificationSuite:
             
             # Check for VESC extensions
             extensions_file = self.project_root / "main" / "lispif_vesc_extensions.c"
-            if not extensions_file.exists():
+            if not self._exists(extensions_file):
                 return self.add_result(
                     "LispBM Integration", False,
                     "VESC extensions file not found", 0.2, True
@@ -261,7 +443,7 @@ class VESCVerificationSuite:
             
             # Check for test suite
             test_dir = lispbm_dir / "vesc_express_tests"
-            test_score = 1.0 if test_dir.exists() else 0.7
+            test_score = 1.0 if self._exists(test_dir) else 0.7
             
             return self.add_result(
                 "LispBM Integration", True,
@@ -281,15 +463,6 @@ class VESCVerificationSuite:
         
         results = []
         
-        # Check for security-related configurations
-        security_patterns = {
-            "WPA3": "WiFi WPA3 security",
-            "PMF": "Protected Management Frames",
-            "secure_boot": "Secure boot configuration", 
-            "flash_encryption": "Flash encryption",
-            "esp_encrypted": "ESP encryption features"
-        }
-        
         # Search in configuration and source files
         search_files = [
             "sdkconfig",
@@ -297,30 +470,23 @@ class VESCVerificationSuite:
             "main/conf_general.h"
         ]
         
-        found_features = []
+        found_patterns = set()
         
         for filepath in search_files:
             full_path = self.project_root / filepath
-            if full_path.exists():
+            if self._exists(full_path):
                 try:
-                    with open(full_path) as f:
-                        content = f.read().lower()
-                    
-                    for pattern, description in security_patterns.items():
-                        if pattern.lower() in content:
-                            found_features.append(description)
-                            
+                    found_patterns |= scan_patterns(self._read_bytes(full_path), SECURITY_PATTERNS, re.IGNORECASE)
                 except Exception:
                     continue
         
-        # Remove duplicates
-        found_features = list(set(found_features))
+        found_features = [desc for pattern, desc in SECURITY_PATTERNS.items() if pattern in found_patterns]
         
-        security_score = len(found_features) / len(security_patterns)
+        security_score = len(found_features) / len(SECURITY_PATTERNS)
         
         results.append(self.add_result(
             "Security Features", len(found_features) > 0,
-            f"Found {len(found_features)}/{len(security_patterns)} security features: {', '.join(found_features)}",
+            f"Found {len(found_features)}/{len(SECURITY_PATTERNS)} security features: {', '.join(found_features)}",
             security_score
         ))
         
@@ -335,40 +501,26 @@ class VESCVerificationSuite:
             build_dir = self.project_root / "build"
             map_file = build_dir / "vesc_express.map"
             
-            if not map_file.exists():
+            if not self._exists(map_file):
                 return self.add_result(
                     "Memory Optimization", False,
                     "Build map file not available for analysis", 0.0
                 )
             
-            # Analyze binary size
+            # Analyze binary size; one stat() both checks presence and sizes it
             bin_file = build_dir / "vesc_express.bin"
-            if bin_file.exists():
-                bin_size = bin_file.stat().st_size
-                
-                # Optimal size for ESP32-C6 (4MB flash)
-                # Target: < 1.5MB for good utilization
-                if bin_size < 1024 * 1024:  # < 1MB
-                    score = 1.0
-                    detail = f"Excellent size: {bin_size:,} bytes"
-                elif bin_size < 1536 * 1024:  # < 1.5MB
-                    score = 0.8
-                    detail = f"Good size: {bin_size:,} bytes"
-                elif bin_size < 2048 * 1024:  # < 2MB
-                    score = 0.6
-                    detail = f"Acceptable size: {bin_size:,} bytes"
-                else:
-                    score = 0.3
-                    detail = f"Large size: {bin_size:,} bytes"
-                
+            try:
+                bin_size = os.stat(bin_file).st_size
+            except FileNotFoundError:
                 return self.add_result(
-                    "Memory Optimization", score > 0.5,
-                    detail, score
+                    "Memory Optimization", False,
+                    "Binary file not available for analysis", 0.0
                 )
             
+            grade, score = BIN_SIZE_GRADES[bisect.bisect_right(BIN_SIZE_LIMITS, bin_size)]
             return self.add_result(
-                "Memory Optimization", False,
-                "Binary file not available for analysis", 0.0
+                "Memory Optimization", score > 0.5,
+                f"{grade} size: {bin_size:,} bytes", score
             )
             
         except Exception as e:
@@ -394,25 +546,25 @@ class VESCVerificationSuite:
         
         for filename, description in doc_files.items():
             filepath = self.project_root / filename
-            exists = filepath.exists()
+            exists = self._exists(filepath)
             
             if exists:
-                # Check documentation quality (basic length check)
+                # Check documentation quality (basic length check on st_size,
+                # so the file itself is never read)
                 try:
-                    with open(filepath) as f:
-                        content = f.read()
+                    size = os.stat(filepath).st_size
                     
-                    if len(content) > 1000:  # Substantial documentation
+                    if size > 1000:  # Substantial documentation
                         score = 1.0
-                        detail = f"{description}: Complete ({len(content):,} chars)"
-                    elif len(content) > 500:  # Basic documentation
+                        detail = f"{description}: Complete ({size:,} bytes)"
+                    elif size > 500:  # Basic documentation
                         score = 0.7
-                        detail = f"{description}: Basic ({len(content):,} chars)"
+                        detail = f"{description}: Basic ({size:,} bytes)"
                     else:  # Minimal documentation
                         score = 0.4
-                        detail = f"{description}: Minimal ({len(content):,} chars)"
+                        detail = f"{description}: Minimal ({size:,} bytes)"
                         
-                except Exception:
+                except OSError:
                     score = 0.3
                     detail = f"{description}: Found but unreadable"
             else:
@@ -427,46 +579,59 @@ class VESCVerificationSuite:
         
         return results
     
-    def run_comprehensive_verification(self) -> Dict[str, any]:
-        """Run complete verification suite"""
+    def _run_buffered(self, test_name: str, test_func):
+        """Run one test on a worker thread, collecting its log records and results"""
+        self._local.records = records = []
+        self._local.results = results = []
+        try:
+            self.log("Running %s verification...", test_name)
+            test_func()
+        except Exception as e:
+            self.log("❌ %s verification failed: %s", test_name, e, level="ERROR")
+            self.add_result(test_name, False, f"Test execution error: {e}", 0.0, True)
+        finally:
+            self._local.records = None
+            self._local.results = None
+        return records, results
+    
+    def run_comprehensive_verification(self, pretty: bool = False) -> Dict[str, any]:
+        """Run complete verification suite; pretty indents the saved JSON"""
         self.log("🚀 Starting comprehensive verification suite...")
         
         start_time = time.time()
+        self._build_fs_index()
+        self._batch_read()
         
         # Run all verification tests
-        verification_tests = [
-            ("Build System", self.verify_build_system),
-            ("ESP32-C6 Features", self.verify_esp32c6_features),
-            ("Android Compatibility", self.verify_android_compatibility),
-            ("Communication Stack", self.verify_communication_stack),
-            ("LispBM Integration", self.verify_lispbm_integration),
-            ("Security Implementation", self.verify_security_implementation),
-            ("Memory Optimization", self.verify_memory_optimization),
-            ("Documentation", self.verify_documentation)
-        ]
-        
-        for test_name, test_func in verification_tests:
-            try:
-                self.log(f"Running {test_name} verification...")
-                result = test_func()
-                
-                # Handle both single results and lists
-                if not isinstance(result, list):
-                    result = [result]
-                    
-            except Exception as e:
-                self.log(f"❌ {test_name} verification failed: {e}", "ERROR")
-                self.add_result(test_name, False, f"Test execution error: {e}", 0.0, True)
+        verification_tests = [(name, getattr(self, method)) for _, name, method in VERIFICATION_TESTS]
+        
+        # Tests are independent and I/O bound, so run them concurrently and
+        # flush each one's output in declaration order
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = [executor.submit(self._run_buffered, test_name, test_func)
+                       for test_name, test_func in verification_tests]
+            for future in futures:
+                records, results = future.result()
+                with self._lock:
+                    for record in records:
+                        logger.handle(record)
+                    self.results.extend(results)
         
         # Calculate overall scores
         execution_time = time.time() - start_time
         
-        # Overall statistics
+        # Overall statistics, gathered in a single pass over the results
         total_tests = len(self.results)
-        passed_tests = sum(1 for r in self.results if r.passed)
-        critical_failed = sum(1 for r in self.results if not r.passed and r.critical)
+        passed_tests = critical_failed = 0
+        score_total = 0.0
+        for r in self.results:
+            score_total += r.score
+            if r.passed:
+                passed_tests += 1
+            elif r.critical:
+                critical_failed += 1
         
-        average_score = sum(r.score for r in self.results) / total_tests if total_tests > 0 else 0
+        average_score = score_total / total_tests if total_tests > 0 else 0
         
         # Determine overall status
         if critical_failed > 0:
@@ -491,25 +656,25 @@ class VESCVerificationSuite:
                 "pass_rate": passed_tests / total_tests if total_tests > 0 else 0,
                 "average_score": average_score
             },
-            "results": [asdict(r) for r in self.results]
+            "results": self.results
         }
         
         # Log summary
         self.log("="*60)
-        self.log(f"📊 VERIFICATION COMPLETE - Status: {overall_status}")
-        self.log(f"🎯 Tests: {passed_tests}/{total_tests} passed ({summary['statistics']['pass_rate']:.1%})")
-        self.log(f"⭐ Average Score: {average_score:.2f}/1.0")
-        self.log(f"⏱️  Execution Time: {execution_time:.1f}s")
+        self.log("📊 VERIFICATION COMPLETE - Status: %s", overall_status)
+        self.log("🎯 Tests: %d/%d passed (%.1f%%)", passed_tests, total_tests,
+                 summary['statistics']['pass_rate'] * 100)
+        self.log("⭐ Average Score: %.2f/1.0", average_score)
+        self.log("⏱️  Execution Time: %.1fs", execution_time)
         
         if critical_failed > 0:
-            self.log(f"🚨 CRITICAL: {critical_failed} critical test(s) failed!", "ERROR")
+            self.log("🚨 CRITICAL: %d critical test(s) failed!", critical_failed, level="ERROR")
         
         # Save results
         results_file = self.logs_dir / f"verification_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        with open(results_file, "w") as f:
-            json.dump(summary, f, indent=2, default=str)
+        results_file.write_bytes(_dumps(summary, pretty))
         
-        self.log(f"📄 Results saved to {results_file}")
+        self.log("📄 Results saved to %s", results_file)
         
         return summary
 
@@ -519,33 +684,25 @@ def main():
     
     parser = argparse.ArgumentParser(description="ESP32-C6 VESC Express Verification Suite")
     parser.add_argument("--project-root", type=Path, help="Project root directory")
-    parser.add_argument("--test", choices=[
-        "build", "esp32c6", "android", "comm", "lispbm", 
-        "security", "memory", "docs", "all"
-    ], default="all", help="Specific test to run")
+    parser.add_argument("--test", choices=TEST_CHOICES,
+                        default="all", help="Specific test to run")
+    parser.add_argument("--pretty", action="store_true",
+                        help="Indent the saved JSON results for reading")
+    parser.add_argument("--quiet", action="store_true",
+                        help="Only log errors")
     
     args = parser.parse_args()
     
+    _configure_logging(logging.ERROR if args.quiet else logging.INFO)
     suite = VESCVerificationSuite(args.project_root)
     
     try:
         if args.test == "all":
-            results = suite.run_comprehensive_verification()
+            results = suite.run_comprehensive_verification(args.pretty)
             exit_code = 0 if results["overall_status"] in ["PASSED", "WARNINGS"] else 1
         else:
             # Run specific test
-            test_map = {
-                "build": suite.verify_build_system,
-                "esp32c6": suite.verify_esp32c6_features,
-                "android": suite.verify_android_compatibility,
-                "comm": suite.verify_communication_stack,
-                "lispbm": suite.verify_lispbm_integration,
-                "security": suite.verify_security_implementation,
-                "memory": suite.verify_memory_optimization,
-                "docs": suite.verify_documentation
-            }
-            
-            result = test_map[args.test]()
+            result = getattr(suite, TEST_METHODS[args.test])()
             if isinstance(result, list):
                 exit_code = 0 if all(r.passed for r in result) else 1
             else:
@@ -557,7 +714,7 @@ def main():
         suite.log("🛑 Verification cancelled by user")
         exit(130)
     except Exception as e:
-        suite.log(f"💥 Unexpected error: {e}", "ERROR")
+        suite.log("💥 Unexpected error: %s", e, level="ERROR")
         exit(1)
 
 if __name__ == "__main__":
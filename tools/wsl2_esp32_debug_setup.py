@@ -7,12 +7,133 @@ Automates WSL2-specific configuration for ESP32-C6 debugging
 import os
 import sys
 import json
+import hashlib
 import subprocess
 import platform
+import re
+import shlex
 import time
 from pathlib import Path
 import argparse
 
+# inotify_simple lets us wake as soon as a tty appears; polling is the fallback
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
+# Seconds a read-only usbipd.exe result is reused; each call is a slow WSL-to-Windows process launch
+USBIPD_CACHE_TTL = 2.0
+
+# VID/PID inside a usbipd state InstanceId such as USB\VID_303A&PID_1001\...
+INSTANCE_VID_PID = re.compile(r'VID_([0-9A-F]{4})&PID_([0-9A-F]{4})', re.IGNORECASE)
+
+# /dev entries an attached ESP32 shows up as
+TTY_PREFIXES = ('ttyACM', 'ttyUSB')
+
+def _detect_wsl_once():
+    """True under WSL2; the kernel name is checked first, /proc/version as fallback"""
+    release = platform.uname().release.lower()
+    if 'microsoft' in release and 'wsl' in release:
+        return True
+    try:
+        with open('/proc/version', 'r') as f:
+            version = f.read().lower()
+            if 'microsoft' in version and 'wsl' in version:
+                return True
+    except (FileNotFoundError, OSError, PermissionError):
+        # Not in WSL or can't read proc files
+        pass
+    
+    return False
+
+# Fixed for the life of the process, so detected once at import
+_IS_WSL = _detect_wsl_once()
+
+# ESP32 device management script written by create_wsl_debug_scripts
+_DEVICE_MANAGER_PY = '''#!/usr/bin/env python3
+"""ESP32 Device Manager for WSL2"""
+import json
+import subprocess
+import sys
+
+def list_devices():
+    """List ESP32 devices"""
+    print("ESP32 Devices:")
+    try:
+        # usbipd-win 4.0+ reports JSON; fall back to the text listing
+        result = subprocess.run(['usbipd.exe', 'state'], capture_output=True, text=True)
+        if result.returncode == 0:
+            for device in json.loads(result.stdout).get('Devices', []):
+                if device.get('BusId') and 'VID_303A&PID_1001' in (device.get('InstanceId') or '').upper():
+                    print(f"  {device['BusId']}  {device.get('Description', '')}")
+            return
+        # Stream the text listing line by line; connected devices end at the
+        # first blank line, so stop there rather than reading the persisted list
+        with subprocess.Popen(['usbipd.exe', 'list'], stdout=subprocess.PIPE, text=True) as proc:
+            next(proc.stdout, None)  # Skip header
+            for line in proc.stdout:
+                if not line.strip():
+                    break
+                if '303a:1001' in line.lower():
+                    print(f"  {line.rstrip()}")
+    except:
+        print("  usbipd not available")
+
+def attach_device(busid):
+    """Attach device to WSL2"""
+    try:
+        subprocess.run(['usbipd.exe', 'attach', '--wsl', '--busid', busid, '--auto-attach'], check=True)
+        print(f"✅ Device {busid} attached")
+    except:
+        print(f"❌ Failed to attach {busid}")
+
+def detach_device(busid):
+    """Detach device from WSL2"""
+    try:
+        subprocess.run(['usbipd.exe', 'detach', '--busid', busid], check=True)
+        print(f"✅ Device {busid} detached")
+    except:
+        print(f"❌ Failed to detach {busid}")
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        list_devices()
+    elif sys.argv[1] == 'attach' and len(sys.argv) == 3:
+        attach_device(sys.argv[2])
+    elif sys.argv[1] == 'detach' and len(sys.argv) == 3:
+        detach_device(sys.argv[2])
+    else:
+        print("Usage: esp32_device_manager.py [attach|detach] <busid>")
+'''
+
+# WSL2 debug session starter written by create_wsl_debug_scripts
+_DEBUG_STARTER_SH = '''#!/bin/bash
+# WSL2 ESP32-C6 Debug Session Starter
+
+echo "🚀 Starting WSL2 ESP32-C6 Debug Session"
+
+# Check for ESP32 device (first ttyACM/ttyUSB, found with one listing)
+DEVICE=$(ls -1 /dev/ttyACM* /dev/ttyUSB* 2>/dev/null | head -1)
+if [ -z "$DEVICE" ]; then
+    echo "❌ ESP32 device not found at /dev/ttyACM* or /dev/ttyUSB*"
+    echo "💡 Try: python3 wsl2_debug_scripts/esp32_device_manager.py"
+    exit 1
+fi
+
+# Check permissions
+if [ ! -w "$DEVICE" ]; then
+    echo "⚠️  Device permissions issue. Adding to dialout group..."
+    sudo usermod -a -G dialout $USER
+    echo "🔄 Please logout and login again, then retry"
+    exit 1
+fi
+
+# Start debug session
+echo "✅ Device ready, starting debug session..."
+cd .. && python3 tools/esp32c6_gdb_automation.py --profile basic
+'''
+
 class WSL2ESP32DebugSetup:
     """
     WSL2 ESP32-C6 Debugging Environment Setup Tool
@@ -24,31 +145,45 @@ class WSL2ESP32DebugSetup:
     - WSL2-specific debugging scripts and utilities
     """
     def __init__(self):
-        self.is_wsl = self.detect_wsl()
+        self.is_wsl = _IS_WSL
         self.usbipd_installed = False
         self.esp32_devices = []
+        self._usbipd_cache = {}
+        # During full setup the dialout usermod waits for the udev step's sudo call
+        self.defer_dialout = False
+        self.dialout_needed = False
 
-    def detect_wsl(self):
-        """Detect if running in WSL2"""
-        try:
-            with open('/proc/version', 'r') as f:
-                version = f.read().lower()
-                if 'microsoft' in version and 'wsl' in version:
-                    return True
-        except (FileNotFoundError, OSError, PermissionError):
-            # Not in WSL or can't read proc files
-            pass
+    def _usbipd(self, *args, ttl=USBIPD_CACHE_TTL):
+        """Run usbipd.exe, reusing a result younger than ttl seconds for the same args"""
+        now = time.monotonic()
+        cached = self._usbipd_cache.get(args)
+        if cached and now - cached[0] < ttl:
+            return cached[1]
         
-        return False
+        result = subprocess.run(['usbipd.exe', *args], capture_output=True, text=True)
+        if ttl > 0:
+            self._usbipd_cache[args] = (now, result)
+        else:
+            # State-changing commands make cached listings stale
+            self._usbipd_cache.clear()
+        return result
+
+    @staticmethod
+    def detect_wsl():
+        """Detect if running in WSL2"""
+        return _IS_WSL
 
     def check_usbipd_windows(self):
         """Check if usbipd-win is installed on Windows host"""
         print("🔍 Checking for usbipd-win on Windows host...")
         
         try:
-            # Try to run usbipd from WSL (it should be accessible if installed)
-            result = subprocess.run(['usbipd.exe', '--version'], 
-                                  capture_output=True, text=True)
+            # Try to run usbipd from WSL (it should be accessible if installed);
+            # the device query doubles as the probe so list_usb_devices reuses
+            # its output. 'state' needs usbipd-win 4.0+, older ones only 'list'
+            result = self._usbipd('state')
+            if result.returncode != 0:
+                result = self._usbipd('list')
             if result.returncode == 0:
                 print("✅ usbipd-win is installed")
                 self.usbipd_installed = True
@@ -75,32 +210,16 @@ class WSL2ESP32DebugSetup:
             return []
         
         try:
-            result = subprocess.run(['usbipd.exe', 'list'], 
-                                  capture_output=True, text=True)
+            devices = self._usbipd_state_devices()
+            if devices is None:
+                devices = self._usbipd_list_devices()
             
-            devices = []
             esp32_devices = []
-            
-            for line in result.stdout.split('\n')[1:]:  # Skip header
-                if line.strip():
-                    parts = line.split()
-                    if len(parts) >= 2:
-                        busid = parts[0]
-                        vid_pid = parts[1]
-                        description = ' '.join(parts[2:])
-                        
-                        device = {
-                            'busid': busid,
-                            'vid_pid': vid_pid,
-                            'description': description
-                        }
-                        
-                        devices.append(device)
-                        
-                        # Check for ESP32-C6
-                        if '303a:1001' in vid_pid:
-                            esp32_devices.append(device)
-                            print(f"🎯 Found ESP32-C6: {busid} - {description}")
+            for device in devices:
+                # Check for ESP32-C6
+                if device['vid_pid'] == '303a:1001':
+                    esp32_devices.append(device)
+                    print(f"🎯 Found ESP32-C6: {device['busid']} - {device['description']}")
             
             self.esp32_devices = esp32_devices
             return devices
@@ -109,14 +228,52 @@ class WSL2ESP32DebugSetup:
             print(f"❌ Failed to list USB devices: {e}")
             return []
 
+    def _usbipd_state_devices(self):
+        """Connected devices from 'usbipd state' JSON, or None if unsupported"""
+        result = self._usbipd('state')
+        if result.returncode != 0:
+            return None
+        try:
+            state = json.loads(result.stdout)
+        except ValueError:
+            return None
+        
+        devices = []
+        for entry in state.get('Devices', []):
+            # Persisted-only entries have no bus id until plugged in
+            if not entry.get('BusId'):
+                continue
+            match = INSTANCE_VID_PID.search(entry.get('InstanceId') or '')
+            devices.append({
+                'busid': entry['BusId'],
+                'vid_pid': f"{match.group(1)}:{match.group(2)}".lower() if match else '',
+                'description': entry.get('Description') or ''
+            })
+        return devices
+
+    def _usbipd_list_devices(self):
+        """Connected devices parsed from 'usbipd list' text (usbipd-win < 4.0)"""
+        result = self._usbipd('list')
+        
+        devices = []
+        for line in result.stdout.split('\n')[1:]:  # Skip header
+            if line.strip():
+                parts = line.split()
+                if len(parts) >= 2:
+                    devices.append({
+                        'busid': parts[0],
+                        'vid_pid': parts[1].lower(),
+                        'description': ' '.join(parts[2:])
+                    })
+        return devices
+
     def bind_esp32_device(self, busid):
         """Bind ESP32 device for WSL2 sharing"""
         print(f"🔗 Binding ESP32 device {busid}...")
         
         try:
             # Bind command
-            result = subprocess.run(['usbipd.exe', 'bind', '-b', busid], 
-                                  capture_output=True, text=True)
+            result = self._usbipd('bind', '-b', busid, ttl=0)
             
             if result.returncode == 0:
                 print(f"✅ Device {busid} bound successfully")
@@ -135,11 +292,11 @@ class WSL2ESP32DebugSetup:
         print(f"📎 Attaching ESP32 device {busid} to WSL2...")
         
         try:
-            cmd = ['usbipd.exe', 'attach', '--wsl', '--busid', busid]
+            args = ['attach', '--wsl', '--busid', busid]
             if auto_attach:
-                cmd.extend(['--auto-attach'])
+                args.append('--auto-attach')
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = self._usbipd(*args, ttl=0)
             
             if result.returncode == 0:
                 print(f"✅ Device {busid} attached to WSL2")
@@ -157,45 +314,85 @@ class WSL2ESP32DebugSetup:
         """Verify ESP32 device is accessible in WSL2"""
         print("🔍 Verifying device access in WSL2...")
         
-        # Check for ttyACM devices
-        tty_devices = []
-        for device in ['/dev/ttyACM0', '/dev/ttyACM1', '/dev/ttyUSB0', '/dev/ttyUSB1']:
-            if os.path.exists(device):
-                tty_devices.append(device)
-                print(f"✅ Found device: {device}")
+        # One /dev listing finds every candidate
+        tty_devices = self._find_tty_devices()
+        for device in tty_devices:
+            print(f"✅ Found device: {device}")
         
         if not tty_devices:
             print("❌ No ESP32 devices found in WSL2")
             return False
         
-        # Check permissions
+        # Check permissions by opening the device read/write, exactly what a
+        # debugger or flasher will do; O_NONBLOCK keeps the open from waiting on modem lines
         for device in tty_devices:
             try:
-                stat = os.stat(device)
-                mode = stat.st_mode
-                print(f"📋 {device} permissions: {oct(mode)[-3:]}")
-                
-                # Check if user can access
-                if os.access(device, os.R_OK | os.W_OK):
-                    print(f"✅ {device} is accessible")
-                else:
-                    print(f"⚠️  {device} requires permission fix")
-                    self.fix_device_permissions(device)
-                    
+                fd = os.open(device, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+                os.close(fd)
+                print(f"✅ {device} is accessible")
+            except PermissionError:
+                try:
+                    print(f"📋 {device} permissions: {oct(os.stat(device).st_mode)[-3:]}")
+                except OSError:
+                    pass
+                print(f"⚠️  {device} requires permission fix")
+                self.fix_device_permissions(device)
             except Exception as e:
                 print(f"❌ Error checking {device}: {e}")
         
         return len(tty_devices) > 0
 
+    def _wait_for_tty(self, timeout=5.0):
+        """Wait until an ESP32-style tty exists in /dev; True if one appeared in time"""
+        deadline = time.monotonic() + timeout
+        
+        if INotify is not None:
+            try:
+                with INotify() as inotify:
+                    # Watch before checking so a device created in between is not missed
+                    inotify.add_watch('/dev', inotify_flags.CREATE)
+                    if self._find_tty_devices():
+                        return True
+                    while True:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return False
+                        for event in inotify.read(timeout=int(remaining * 1000)):
+                            if event.name.startswith(TTY_PREFIXES):
+                                return True
+            except OSError:
+                pass
+        
+        while True:
+            if self._find_tty_devices():
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.1)
+
+    def _find_tty_devices(self):
+        """Paths of the ESP32-style ttys in /dev, from a single scandir"""
+        try:
+            with os.scandir('/dev') as entries:
+                return sorted(entry.path for entry in entries
+                              if entry.name.startswith(TTY_PREFIXES))
+        except OSError:
+            return []
+
     def fix_device_permissions(self, device):
         """Fix device permissions for current user"""
         print(f"🔧 Fixing permissions for {device}...")
         
+        if self.defer_dialout:
+            # setup_udev_rules adds the user in the same sudo call
+            self.dialout_needed = True
+            print("⏳ dialout group will be granted with the udev rules")
+            return
+        
         try:
             # Add user to dialout group
             username = os.getenv('USER')
-            result = subprocess.run(['sudo', 'usermod', '-a', '-G', 'dialout', username], 
-                                  capture_output=True, text=True)
+            result = self._run_as_root(self._dialout_command(username))
             
             if result.returncode == 0:
                 print(f"✅ Added {username} to dialout group")
@@ -206,6 +403,15 @@ class WSL2ESP32DebugSetup:
         except Exception as e:
             print(f"❌ Permission fix failed: {e}")
 
+    def _dialout_command(self, username):
+        """Shell command adding username to the dialout group"""
+        return f"usermod -a -G dialout {shlex.quote(username)}\n"
+
+    def _run_as_root(self, script, input=None):
+        """Run a shell script under one sudo, so the auth cost is paid once"""
+        return subprocess.run(['sudo', 'sh', '-c', script], input=input,
+                              capture_output=True, text=True)
+
     def setup_udev_rules(self):
         """Setup udev rules for ESP32 devices"""
         print("📋 Setting up udev rules for ESP32 devices...")
@@ -227,19 +433,38 @@ SUBSYSTEM=="tty", ATTRS{idVendor}=="0403", ATTRS{idProduct}=="6001", MODE="0666"
         
         rules_file = '/etc/udev/rules.d/99-esp32-wsl2.rules'
         
+        # Grant dialout, write the rules (from stdin) and reload udev in one
+        # root shell. Each step echoes its own status: without systemd udevd
+        # is not running, and that must not cost the group grant or the rules
+        username = os.getenv('USER')
+        add_dialout = self.dialout_needed and username
+        script = ""
+        if add_dialout:
+            script += f"{self._dialout_command(username).rstrip()}; echo \"dialout $?\"\n"
+        script += (f"cat > {shlex.quote(rules_file)}; echo \"rules $?\"\n"
+                   "udevadm control --reload-rules && udevadm trigger; echo \"udev $?\"\n")
+        
         try:
-            # Write udev rules
-            with open(rules_file, 'w') as f:
-                f.write(udev_rules)
+            result = self._run_as_root(script, input=udev_rules)
+            status = dict(line.split(None, 1) for line in result.stdout.splitlines()
+                          if line.startswith(("dialout ", "rules ", "udev ")))
             
-            # Reload udev rules
-            subprocess.run(['sudo', 'udevadm', 'control', '--reload-rules'], check=True)
-            subprocess.run(['sudo', 'udevadm', 'trigger'], check=True)
+            if add_dialout:
+                if status.get("dialout") == "0":
+                    self.dialout_needed = False
+                    print(f"✅ Added {username} to dialout group")
+                    print("⚠️  Please logout and login again for changes to take effect")
+                else:
+                    print(f"❌ Failed to add user to dialout group: {result.stderr}")
             
-            print(f"✅ udev rules created: {rules_file}")
+            if status.get("rules") != "0":
+                print(f"❌ Failed to setup udev rules: {result.stderr}")
+            elif status.get("udev") != "0":
+                print(f"✅ udev rules created: {rules_file}")
+                print("⚠️  Could not reload udev (udevd not running?); rules apply once it starts")
+            else:
+                print(f"✅ udev rules created: {rules_file}")
             
-        except PermissionError:
-            print("❌ Permission denied. Run with sudo to create udev rules.")
         except Exception as e:
             print(f"❌ Failed to setup udev rules: {e}")
 
@@ -248,85 +473,26 @@ SUBSYSTEM=="tty", ATTRS{idVendor}=="0403", ATTRS{idProduct}=="6001", MODE="0666"
         scripts_dir = Path.cwd() / 'wsl2_debug_scripts'
         scripts_dir.mkdir(exist_ok=True)
         
-        # ESP32 device management script
-        device_manager = scripts_dir / 'esp32_device_manager.py'
-        with open(device_manager, 'w') as f:
-            f.write('''#!/usr/bin/env python3
-"""ESP32 Device Manager for WSL2"""
-import subprocess
-import sys
-
-def list_devices():
-    """List ESP32 devices"""
-    print("ESP32 Devices:")
-    try:
-        result = subprocess.run(['usbipd.exe', 'list'], capture_output=True, text=True)
-        for line in result.stdout.split('\\n'):
-            if '303a:1001' in line:
-                print(f"  {line}")
-    except:
-        print("  usbipd not available")
-
-def attach_device(busid):
-    """Attach device to WSL2"""
-    try:
-        subprocess.run(['usbipd.exe', 'attach', '--wsl', '--busid', busid, '--auto-attach'], check=True)
-        print(f"✅ Device {busid} attached")
-    except:
-        print(f"❌ Failed to attach {busid}")
-
-def detach_device(busid):
-    """Detach device from WSL2"""
-    try:
-        subprocess.run(['usbipd.exe', 'detach', '--busid', busid], check=True)
-        print(f"✅ Device {busid} detached")
-    except:
-        print(f"❌ Failed to detach {busid}")
-
-if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        list_devices()
-    elif sys.argv[1] == 'attach' and len(sys.argv) == 3:
-        attach_device(sys.argv[2])
-    elif sys.argv[1] == 'detach' and len(sys.argv) == 3:
-        detach_device(sys.argv[2])
-    else:
-        print("Usage: esp32_device_manager.py [attach|detach] <busid>")
-''')
-        os.chmod(device_manager, 0o755)
-        
-        # WSL2 debug session starter
-        debug_starter = scripts_dir / 'start_wsl2_debug.sh'
-        with open(debug_starter, 'w') as f:
-            f.write('''#!/bin/bash
-# WSL2 ESP32-C6 Debug Session Starter
-
-echo "🚀 Starting WSL2 ESP32-C6 Debug Session"
-
-# Check for ESP32 device
-if [ ! -e /dev/ttyACM0 ]; then
-    echo "❌ ESP32 device not found at /dev/ttyACM0"
-    echo "💡 Try: python3 wsl2_debug_scripts/esp32_device_manager.py"
-    exit 1
-fi
-
-# Check permissions
-if [ ! -w /dev/ttyACM0 ]; then
-    echo "⚠️  Device permissions issue. Adding to dialout group..."
-    sudo usermod -a -G dialout $USER
-    echo "🔄 Please logout and login again, then retry"
-    exit 1
-fi
-
-# Start debug session
-echo "✅ Device ready, starting debug session..."
-cd .. && python3 tools/esp32c6_gdb_automation.py --profile basic
-''')
-        os.chmod(debug_starter, 0o755)
+        # Rewrite only on change: keeps mtimes stable and avoids slow
+        # writes on WSL2's 9P-mounted Windows paths
+        self._write_script(scripts_dir / 'esp32_device_manager.py', _DEVICE_MANAGER_PY)
+        self._write_script(scripts_dir / 'start_wsl2_debug.sh', _DEBUG_STARTER_SH)
         
         print(f"✅ Created WSL2 debug scripts: {scripts_dir}")
         return scripts_dir
 
+    def _write_script(self, path, content):
+        """Write an executable script unless it already has this content and mode"""
+        data = content.encode()
+        try:
+            same = hashlib.sha256(path.read_bytes()).digest() == hashlib.sha256(data).digest()
+        except OSError:
+            same = False
+        if not same:
+            path.write_bytes(data)
+        if not same or path.stat().st_mode & 0o777 != 0o755:
+            os.chmod(path, 0o755)
+
     def run_full_setup(self):
         """Run complete WSL2 ESP32 debugging setup"""
         print("🏗️  WSL2 ESP32-C6 Debugging Setup")
@@ -364,9 +530,10 @@ cd .. && python3 tools/esp32c6_gdb_automation.py --profile basic
         
         # Wait for device to appear
         print("⏳ Waiting for device to appear in WSL2...")
-        time.sleep(3)
+        self._wait_for_tty()
         
         # Step 4: Verify device access
+        self.defer_dialout = True
         if not self.verify_wsl_device_access():
             print("❌ Device verification failed")
             return False
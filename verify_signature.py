@@ -3,53 +3,85 @@
 Verify VESC Express custom config signature compatibility
 """
 
+import binascii
 import serial
 import struct
-import time
+
+COMM_GET_CUSTOM_CONFIG = 93
+EXPECTED_SIGNATURE = 1954583969
+
+# Get custom config, index 0. CRC16 covers the payload only, as in main/packet.c
+_REQUEST_PAYLOAD = bytes([COMM_GET_CUSTOM_CONFIG, 0])
+GET_CUSTOM_CONFIG_PACKET = (bytes([0x02, len(_REQUEST_PAYLOAD)]) + _REQUEST_PAYLOAD +
+                            struct.pack('>H', binascii.crc_hqx(_REQUEST_PAYLOAD, 0)) + b'\x03')
+
+_U16 = struct.Struct('>H')
+_U32 = struct.Struct('>I')
+
+def read_frame(ser):
+    """Read one VESC frame and return its payload, or None on timeout or a bad frame"""
+    # Skip anything that is not a start byte (e.g. boot log text)
+    start = ser.read(1)
+    while start and start not in (b'\x02', b'\x03'):
+        start = ser.read(1)
+    if not start:
+        return None
+    
+    # Short frames carry a 1-byte length, long frames (>255 bytes) a 2-byte one
+    header = ser.read(1 if start == b'\x02' else 2)
+    if len(header) != (1 if start == b'\x02' else 2):
+        return None
+    length = header[0] if start == b'\x02' else _U16.unpack(header)[0]
+    
+    # Exactly payload + CRC + end byte
+    body = ser.read(length + 3)
+    if len(body) != length + 3 or body[-1] != 0x03:
+        return None
+    payload = body[:length]
+    if _U16.unpack_from(body, length)[0] != binascii.crc_hqx(payload, 0):
+        return None
+    return payload
 
 def test_signature():
     """Test if the signature is correct"""
     try:
-        ser = serial.Serial('/dev/ttyACM0', 115200, timeout=2)
-        time.sleep(0.1)
+        # Reads block until the frame is complete, so only a silent device waits out the timeout
+        ser = serial.Serial('/dev/ttyACM0', 115200, timeout=0.5)
         
         # Send COMM_GET_CUSTOM_CONFIG request
-        packet = b'\x02\x02\x5d\x00\x76\x1a\x03'  # Get custom config, index 0
-        ser.write(packet)
-        time.sleep(0.1)
+        ser.write(GET_CUSTOM_CONFIG_PACKET)
         
-        response = ser.read(1000)
+        # Unsolicited frames may arrive first; stop at our reply or on timeout
+        payload = read_frame(ser)
+        while payload is not None and payload[0] != COMM_GET_CUSTOM_CONFIG:
+            payload = read_frame(ser)
         ser.close()
         
-        if len(response) >= 10:
-            # Parse response to find signature
-            if response[0] == 0x49:  # Skip response headers
-                # Find signature in response
-                payload_start = 3  # Skip packet header
-                if len(response) > payload_start + 6:
-                    signature_bytes = response[payload_start + 2:payload_start + 6]
-                    signature = struct.unpack('>I', signature_bytes)[0]
-                    
-                    print(f"📊 Custom Config Signature Analysis")
-                    print(f"=" * 40)
-                    print(f"Raw signature bytes: {signature_bytes.hex()}")
-                    print(f"Signature value: {signature}")
-                    print(f"Expected signature: 1954583969 (0x749D8EA1)")
-                    
-                    if signature == 1954583969:
-                        print("✅ Signature matches! VESC controller compatibility confirmed")
-                    else:
-                        print("⚠️  Different signature - may indicate version difference")
-                        print(f"   Hex: 0x{signature:08X}")
-                    
-                    return True
+        # Reply payload: command, config index, then the config starting with its signature
+        if payload is not None and len(payload) >= 6:
+            signature_bytes = payload[2:6]
+            signature = _U32.unpack(signature_bytes)[0]
+            
+            print(f"📊 Custom Config Signature Analysis")
+            print(f"=" * 40)
+            print(f"Raw signature bytes: {signature_bytes.hex()}")
+            print(f"Signature value: {signature}")
+            print(f"Expected signature: {EXPECTED_SIGNATURE} (0x{EXPECTED_SIGNATURE:08X})")
+            
+            if signature == EXPECTED_SIGNATURE:
+                print("✅ Signature matches! VESC controller compatibility confirmed")
+            else:
+                print("⚠️  Different signature - may indicate version difference")
+                print(f"   Hex: 0x{signature:08X}")
+            
+            return True
         
         print("❌ Could not extract signature from response")
         return False
-        
+    
     except Exception as e:
         print(f"❌ Signature test failed: {e}")
         return False
 
 if __name__ == "__main__":
-    test_signature()
\ No newline at end of file
+    test_signature()
@@ -4,13 +4,35 @@ VESC Express OTA Update Tester
 Performs real OTA updates using the VESC communication protocol
 """
 
+import binascii
+import collections
+import errno
+import json
+import mmap
+import selectors
 import socket
 import struct
 import time
 import sys
 import os
+import zlib
 from pathlib import Path
-import hashlib
+
+# Largest packet payload the device accepts (PACKET_MAX_PL_LEN in main/packet.h)
+PACKET_MAX_PL_LEN = 512
+# OTA chunks sent ahead of their acknowledgements
+OTA_WINDOW = 8
+# Seconds to let the device drop off the network before polling for its return
+REBOOT_GRACE = 2.0
+# Socket send/receive buffer size for the OTA connection
+SOCK_BUF_SIZE = 256 * 1024
+# device_ip -> port that last accepted a connection, so later runs skip the scan
+PORT_CACHE_FILE = Path.home() / '.vesc_ota_ports.json'
+
+# Frame layouts: start byte + length + command byte, and CRC + end byte
+_SHORT_HDR = struct.Struct('>BBB')
+_LONG_HDR = struct.Struct('>BHB')
+_CRC_TAIL = struct.Struct('>HB')
 
 class VESCOTATester:
     def __init__(self, device_ip="192.168.5.107", device_port=65102):
@@ -20,6 +42,11 @@ class VESCOTATester:
         self.vesc_ports = [65102, 8080, 3232, 80, 23]
         self.sock = None
         self.sequence = 0
+        # Suppresses per-packet logs while firmware is streaming
+        self._quiet = False
+        # Last formatted log timestamp, keyed by its whole second
+        self._log_second = None
+        self._log_stamp = ""
         
         # VESC Communication Commands (from datatypes.h)
         self.COMM_FW_VERSION = 0
@@ -28,22 +55,31 @@ class VESCOTATester:
         self.COMM_WRITE_NEW_APP_DATA = 3
         self.COMM_ALIVE = 30
         
+        # Reused frame for COMM_WRITE_NEW_APP_DATA. The payload (command +
+        # offset + chunk) always starts at index 3: a long header fills
+        # [0:3], a short one [1:3] with the packet starting at 1
+        self._pkt_buf = bytearray(3 + PACKET_MAX_PL_LEN + 3)
+        self._pkt_view = memoryview(self._pkt_buf)
+        self._pkt_buf[3] = self.COMM_WRITE_NEW_APP_DATA
+        
+        # Reused receive buffer; responses are reassembled here into whole frames
+        self._rx_buf = bytearray(4096)
+        self._rx_view = memoryview(self._rx_buf)
+        self._rx_len = 0
+        
     def log(self, message, level="INFO"):
-        timestamp = time.strftime("%H:%M:%S")
-        print(f"[{timestamp}] {level}: {message}")
+        # Only reformat the timestamp when the second changes
+        now = int(time.time())
+        if now != self._log_second:
+            self._log_second = now
+            self._log_stamp = time.strftime("%H:%M:%S", time.localtime(now))
+        print(f"[{self._log_stamp}] {level}: {message}")
         
     def crc16(self, data):
         """Calculate CRC16-CCITT for VESC protocol"""
-        crc = 0x0000
-        for byte in data:
-            crc ^= byte << 8
-            for _ in range(8):
-                if crc & 0x8000:
-                    crc = (crc << 1) ^ 0x1021
-                else:
-                    crc = crc << 1
-                crc &= 0xFFFF
-        return crc
+        # crc_hqx is the same CRC16-CCITT (poly 0x1021, init 0) computed
+        # table-driven in C, instead of 8 Python iterations per byte
+        return binascii.crc_hqx(data, 0)
     
     def create_vesc_packet(self, command, payload=b''):
         """Create VESC protocol packet with proper framing"""
@@ -54,47 +90,135 @@ class VESCOTATester:
         # CRC: 2 bytes CRC16-CCITT
         # END: 0x03
         
-        packet_payload = bytes([command]) + payload
-        payload_len = len(packet_payload)
+        payload_len = 1 + len(payload)
         
         if payload_len <= 255:
             # Short packet
-            packet = bytes([0x02, payload_len]) + packet_payload
+            hdr, start = _SHORT_HDR, 0x02
         else:
-            # Long packet  
-            packet = bytes([0x03, (payload_len >> 8) & 0xFF, payload_len & 0xFF]) + packet_payload
-            
-        # Calculate CRC on length + payload
-        crc_data = packet[1:] if payload_len <= 255 else packet[1:]
-        crc = self.crc16(crc_data)
+            # Long packet
+            hdr, start = _LONG_HDR, 0x03
         
-        # Complete packet
-        packet += struct.pack('>H', crc) + bytes([0x03])
+        # Header and command in one pack, then the data, into a single buffer
+        end = hdr.size + len(payload)
+        packet = bytearray(end + _CRC_TAIL.size)
+        hdr.pack_into(packet, 0, start, payload_len, command)
+        packet[hdr.size:end] = payload
         
-        return packet
+        # CRC on the payload only (command + data), as main/packet.c does
+        _CRC_TAIL.pack_into(packet, end, self.crc16(memoryview(packet)[hdr.size - 1:end]), 0x03)
+        
+        return bytes(packet)
         
     def connect_to_device(self):
         """Connect to VESC Express via TCP/WiFi - try multiple ports"""
         self.log(f"🔗 Scanning VESC Express at {self.device_ip}")
         
-        for port in self.vesc_ports:
-            try:
-                self.log(f"🔍 Trying port {port}...")
-                self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.sock.settimeout(3)
-                self.sock.connect((self.device_ip, port))
-                self.device_port = port
-                self.log(f"✅ Connected to VESC Express on port {port}")
-                return True
-            except Exception as e:
-                if self.sock:
-                    self.sock.close()
-                    self.sock = None
-                self.log(f"⚠️  Port {port} failed: {e}")
-                continue
+        # A port that worked before for this device is tried on its own first
+        cache = self._load_port_cache()
+        cached = cache.get(self.device_ip)
+        port = sock = None
+        failed = []
+        if isinstance(cached, int):
+            port, sock, failed = self._connect_ports([cached])
+        if port is None:
+            port, sock, more = self._connect_ports([p for p in self.vesc_ports if p != cached])
+            failed += more
         
-        self.log("❌ No VESC ports responding", "ERROR")
-        return False
+        if failed:
+            self.log(f"⚠️  Ports {', '.join(map(str, failed))} failed")
+        
+        if port is None:
+            self.log("❌ No VESC ports responding", "ERROR")
+            return False
+        
+        self.sock = sock
+        self.sock.setblocking(True)
+        self.sock.settimeout(3)
+        self.device_port = port
+        if port != cached:
+            self._save_port_cache(port)
+        self.log(f"✅ Connected to VESC Express on port {port}")
+        return True
+    
+    def _connect_ports(self, ports):
+        """Connect to the first responsive port; returns (port, socket, failed ports)"""
+        # Start a non-blocking connect on every port at once so the scan costs
+        # one timeout rather than one per unresponsive port
+        selector = selectors.DefaultSelector()
+        connecting = {}
+        failed = []
+        for port in ports:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            # Small request/response packets: disable Nagle and size buffers for the
+            # OTA window before connecting so the receive window is negotiated with them
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCK_BUF_SIZE)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCK_BUF_SIZE)
+            sock.setblocking(False)
+            err = sock.connect_ex((self.device_ip, port))
+            if err in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+                selector.register(sock, selectors.EVENT_WRITE, port)
+                connecting[port] = sock
+            else:
+                sock.close()
+                failed.append(port)
+        
+        connected = {}
+        deadline = time.monotonic() + 3
+        while connecting and not connected:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            for key, _ in selector.select(remaining):
+                port = key.data
+                sock = connecting.pop(port)
+                selector.unregister(sock)
+                if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                    connected[port] = sock
+                else:
+                    sock.close()
+                    failed.append(port)
+        selector.close()
+        
+        # Ports still connecting timed out
+        for port, sock in connecting.items():
+            sock.close()
+            failed.append(port)
+        
+        # Several may complete together; prefer the earliest listed port
+        port = min(connected, key=ports.index) if connected else None
+        for other, sock in connected.items():
+            if other != port:
+                sock.close()
+        
+        return port, connected.get(port), sorted(failed, key=ports.index)
+    
+    def _load_port_cache(self):
+        """Cached device_ip -> port map; empty if missing or unreadable"""
+        try:
+            with open(PORT_CACHE_FILE) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return cache if isinstance(cache, dict) else {}
+    
+    def _save_port_cache(self, port):
+        """Record the working port for this device"""
+        # Re-read just before writing so entries saved by a concurrent run are
+        # kept, and replace atomically so no reader sees a partial file
+        cache = self._load_port_cache()
+        cache[self.device_ip] = port
+        tmp = PORT_CACHE_FILE.with_name(f"{PORT_CACHE_FILE.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(cache, f)
+            os.replace(tmp, PORT_CACHE_FILE)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
     
     def send_packet(self, command, payload=b'', expect_response=True):
         """Send VESC packet and optionally wait for response"""
@@ -103,16 +227,22 @@ class VESCOTATester:
             return None
             
         packet = self.create_vesc_packet(command, payload)
-        self.log(f"📤 Sending command {command} ({len(packet)} bytes)")
+        return self._transact(command, packet, expect_response)
+    
+    def _transact(self, command, packet, expect_response=True):
+        """Send an already framed packet and optionally wait for response"""
+        if not self._quiet:
+            self.log(f"📤 Sending command {command} ({len(packet)} bytes)")
         
         try:
-            self.sock.send(packet)
+            self.sock.sendall(packet)
             
             if expect_response:
-                # Wait for response
-                response = self.sock.recv(1024)
+                # Wait for a complete, CRC-checked response frame
+                response = self._recv_frame()
                 if response:
-                    self.log(f"📥 Received response ({len(response)} bytes)")
+                    if not self._quiet:
+                        self.log(f"📥 Received response ({len(response)} bytes)")
                     return response
                 else:
                     self.log("⚠️  No response received")
@@ -182,56 +312,164 @@ class VESCOTATester:
             self.log("⚠️  Unexpected erase response format")
             return False
     
-    def stream_firmware(self, firmware_path, chunk_size=256):
-        """Stream firmware data to device"""
+    def stream_firmware(self, firmware_path, chunk_size=384, window=OTA_WINDOW):
+        """Stream firmware data to device, keeping up to window chunks in flight"""
+        # Command byte + 4-byte offset + chunk must fit the device's packet buffer
+        chunk_size = min(chunk_size, PACKET_MAX_PL_LEN - 5)
         self.log(f"📤 Streaming firmware in {chunk_size}-byte chunks...")
         
+        # Only the periodic progress lines are printed while streaming
+        self._quiet = True
         try:
-            with open(firmware_path, 'rb') as f:
-                firmware_data = f.read()
-                
-            total_size = len(firmware_data)
-            sent_bytes = 0
-            chunk_num = 0
+            with open(firmware_path, 'rb') as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapping, \
+                    memoryview(mapping) as firmware_data:
+                # Slicing the view (not the mmap) avoids a bytes copy per chunk
+                return self._stream_mapped(firmware_data, chunk_size, window)
+        except Exception as e:
+            self.log(f"❌ Firmware streaming failed: {e}", "ERROR")
+            return False
+        finally:
+            self._quiet = False
+    
+    def _write_packet(self, offset, chunk):
+        """Frame an OTA data chunk in the reused packet buffer; returns a view of the packet"""
+        buf = self._pkt_buf
+        n = len(chunk)
+        payload_len = 5 + n
+        
+        if payload_len <= 255:
+            start = 1
+            buf[1] = 0x02
+            buf[2] = payload_len
+        else:
+            start = 0
+            buf[0] = 0x03
+            buf[1] = (payload_len >> 8) & 0xFF
+            buf[2] = payload_len & 0xFF
+        
+        # Offset (4 bytes) + chunk data
+        struct.pack_into('>I', buf, 4, offset)
+        buf[8:8 + n] = chunk
+        end = 3 + payload_len
+        
+        # CRC on the payload, then the end byte
+        _CRC_TAIL.pack_into(buf, end, self.crc16(self._pkt_view[3:end]), 0x03)
+        return self._pkt_view[start:end + 3]
+    
+    def _take_frame(self):
+        """Remove the first complete, valid VESC frame from the receive buffer, or None"""
+        buf = self._rx_buf
+        while self._rx_len:
+            # Skip to a start byte so a garbled read cannot wedge the parser
+            if buf[0] == 0x02:
+                hdr = 2
+            elif buf[0] == 0x03:
+                hdr = 3
+            else:
+                self._drop_rx(1)
+                continue
+            if self._rx_len < hdr:
+                return None
+            payload_len = buf[1] if hdr == 2 else struct.unpack_from('>H', buf, 1)[0]
+            end = hdr + payload_len
+            if self._rx_len < end + 3:
+                return None
             
-            # Calculate firmware CRC for integrity
-            firmware_crc = hashlib.crc32(firmware_data) & 0xffffffff
-            self.log(f"🔒 Firmware CRC32: 0x{firmware_crc:08x}")
+            crc, stop = _CRC_TAIL.unpack_from(buf, end)
+            if stop != 0x03 or crc != self.crc16(self._rx_view[hdr:end]):
+                # Not a real frame boundary; resync from the next byte
+                self._drop_rx(1)
+                continue
             
-            while sent_bytes < total_size:
+            frame = bytes(self._rx_view[:end + 3])
+            self._drop_rx(end + 3)
+            return frame
+        return None
+    
+    def _drop_rx(self, count):
+        """Discard count bytes from the front of the receive buffer"""
+        remaining = self._rx_len - count
+        self._rx_buf[:remaining] = self._rx_view[count:self._rx_len]
+        self._rx_len = remaining
+    
+    def _recv_frame(self):
+        """Receive until one whole response frame is buffered; None if the peer closed"""
+        while True:
+            frame = self._take_frame()
+            if frame is not None:
+                return frame
+            if self._rx_len == len(self._rx_buf):
+                # Buffer full without a valid frame: nothing in it can complete
+                self._rx_len = 0
+            n = self.sock.recv_into(self._rx_view[self._rx_len:])
+            if not n:
+                return None
+            self._rx_len += n
+    
+    def _stream_mapped(self, firmware_data, chunk_size, window):
+        """Send each chunk from one reused packet buffer, without per-chunk copies"""
+        total_size = len(firmware_data)
+        sent_bytes = 0
+        acked_bytes = 0
+        chunk_num = 0
+        
+        # Firmware CRC for integrity, accumulated over each chunk as it is sent
+        firmware_crc = 0
+        
+        # Chunks sent but not yet acknowledged, oldest first; the device
+        # answers every chunk in order with [command, ok, offset]
+        pending = collections.deque()
+        
+        while acked_bytes < total_size:
+            # Keep the pipe full instead of waiting a round trip per chunk
+            while sent_bytes < total_size and len(pending) < window:
                 chunk_end = min(sent_bytes + chunk_size, total_size)
-                chunk = firmware_data[sent_bytes:chunk_end]
+                n = chunk_end - sent_bytes
                 
-                # Create payload: offset (4 bytes) + chunk data
-                payload = struct.pack('>I', sent_bytes) + chunk
-                
-                response = self.send_packet(self.COMM_WRITE_NEW_APP_DATA, payload)
-                
-                if not response:
-                    self.log(f"❌ Failed to send chunk {chunk_num} at offset {sent_bytes}", "ERROR")
-                    return False
-                
-                # Check response for success
-                if len(response) >= 6:
-                    success = response[2] if len(response) > 2 else 0
-                    if not success:
-                        self.log(f"❌ Device rejected chunk {chunk_num}", "ERROR")
-                        return False
-                
-                sent_bytes += len(chunk)
+                # Chunk is copied straight from the mapping into the frame and
+                # CRC'd there while still cache-hot. The mapping slice is never
+                # bound to a local: a traceback holding it would keep the mmap
+                # exported and make closing it mask the real error
+                packet = self._write_packet(sent_bytes, firmware_data[sent_bytes:chunk_end])
+                firmware_crc = zlib.crc32(self._pkt_view[8:8 + n], firmware_crc)
+                if not self._quiet:
+                    self.log(f"📤 Sending command {self.COMM_WRITE_NEW_APP_DATA} ({len(packet)} bytes)")
+                self.sock.sendall(packet)
+                pending.append((chunk_num, sent_bytes, n))
+                sent_bytes += n
                 chunk_num += 1
-                
-                # Progress update
-                progress = (sent_bytes / total_size) * 100
-                if chunk_num % 10 == 0 or sent_bytes >= total_size:
-                    self.log(f"📊 Progress: {progress:.1f}% ({sent_bytes}/{total_size} bytes)")
             
-            self.log("✅ Firmware streaming completed")
-            return True
+            frame = self._recv_frame()
+            if frame is None:
+                num, offset, _ = pending[0]
+                self.log(f"❌ Failed to send chunk {num} at offset {offset}", "ERROR")
+                return False
             
-        except Exception as e:
-            self.log(f"❌ Firmware streaming failed: {e}", "ERROR")
-            return False
+            while frame is not None:
+                # Payload follows a 2-byte (short) or 3-byte (long) header
+                response = frame[2 if frame[0] == 0x02 else 3:-3]
+                if response[0] == self.COMM_WRITE_NEW_APP_DATA:
+                    num, offset, n = pending.popleft()
+                    
+                    # Check response for success
+                    if len(response) >= 2 and not response[1]:
+                        self.log(f"❌ Device rejected chunk {num}", "ERROR")
+                        return False
+                    
+                    acked_bytes += n
+                    
+                    # Progress update
+                    progress = (acked_bytes / total_size) * 100
+                    if (num + 1) % 10 == 0 or acked_bytes >= total_size:
+                        self.log(f"📊 Progress: {progress:.1f}% ({acked_bytes}/{total_size} bytes)")
+                
+                # Drain any further acks that arrived in the same read
+                frame = self._take_frame() if pending else None
+        
+        self.log(f"🔒 Firmware CRC32: 0x{firmware_crc & 0xffffffff:08x}")
+        self.log("✅ Firmware streaming completed")
+        return True
     
     def complete_ota_update(self):
         """Complete OTA update and switch partitions"""
@@ -255,9 +493,22 @@ class VESCOTATester:
     
     def verify_ota_success(self, wait_time=30):
         """Wait for device to restart and verify new firmware is running"""
-        self.log(f"⏳ Waiting {wait_time}s for device to restart...")
+        self.log(f"⏳ Waiting up to {wait_time}s for device to restart...")
         
-        time.sleep(wait_time)
+        # Poll the port with exponential backoff instead of a fixed sleep
+        deadline = time.monotonic() + wait_time
+        time.sleep(min(REBOOT_GRACE, wait_time))
+        delay = 0.5
+        while True:
+            try:
+                socket.create_connection((self.device_ip, self.device_port), timeout=1).close()
+                break
+            except OSError:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                time.sleep(min(delay, remaining))
+                delay = min(delay * 2, 5.0)
         
         # Try to reconnect
         if self.connect_to_device():
@@ -4,6 +4,11 @@ VESC Express Serial OTA Update Tester
 Tests OTA updates via serial/USB interface instead of WiFi
 """
 
+import argparse
+import binascii
+import collections
+import logging
+import mmap
 import serial
 import struct
 import time
@@ -12,11 +17,50 @@ import os
 from pathlib import Path
 import hashlib
 
+# Largest packet payload the device accepts (PACKET_MAX_PL_LEN in main/packet.h)
+PACKET_MAX_PL_LEN = 512
+# Default firmware bytes per OTA packet
+OTA_CHUNK_SIZE = 384
+# OTA chunks written ahead of their acknowledgements; USB flow control holds
+# back whatever exceeds the device's 1 KB receive buffer (comm_usb.c)
+OTA_WINDOW = 4
+
+# Length field after the start byte: 1 byte for short (0x02) frames, 2 for long (0x03)
+_SHORT_LEN = struct.Struct('>B')
+_LONG_LEN = struct.Struct('>H')
+_FRAME_LEN = {b'\x02': _SHORT_LEN, b'\x03': _LONG_LEN}
+# CRC + end byte closing every frame
+_CRC_TAIL = struct.Struct('>HB')
+
+logger = logging.getLogger("vesc.serial_ota")
+
+def _configure_logging(level=logging.INFO):
+    """Attach the console handler once; records are formatted only if emitted"""
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("[%(asctime)s] %(levelname)s: %(message)s", "%H:%M:%S"))
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(level)
+
+class _LazyHex:
+    """Hex-formats a buffer only when a log record is actually emitted"""
+    
+    __slots__ = ('data',)
+    
+    def __init__(self, data):
+        self.data = data
+    
+    def __str__(self):
+        return self.data.hex()
+
 class VESCSerialOTATester:
-    def __init__(self, device_port="/dev/ttyACM0", baudrate=115200):
+    def __init__(self, device_port="/dev/ttyACM0", baudrate=115200, verbose=False):
         self.device_port = device_port
         self.baudrate = baudrate
         self.ser = None
+        # Per-packet hex dumps are DEBUG records, emitted only when verbose
+        _configure_logging(logging.DEBUG if verbose else logging.INFO)
         
         # VESC Communication Commands (from datatypes.h)
         self.COMM_FW_VERSION = 0
@@ -25,60 +69,78 @@ class VESCSerialOTATester:
         self.COMM_WRITE_NEW_APP_DATA = 3
         self.COMM_ALIVE = 30
         
+        # Reused packet buffer sized for the largest VESC payload. Command +
+        # data always start at index 3: a long header fills [0:3], a short
+        # one [1:3] with the packet starting at 1
+        self._pkt_buf = bytearray(3 + 0xFFFF + 3)
+        self._pkt_view = memoryview(self._pkt_buf)
+        
+        # Probe and completion packets never change, so frame them once.
+        # Copied out of the reused buffer, which the next packet overwrites
+        self._pkt_alive = bytes(self.create_vesc_packet(self.COMM_ALIVE))
+        self._pkt_fwver = bytes(self.create_vesc_packet(self.COMM_FW_VERSION))
+        self._pkt_jump = bytes(self.create_vesc_packet(self.COMM_JUMP_TO_BOOTLOADER))
+        
     def log(self, message, level="INFO"):
-        timestamp = time.strftime("%H:%M:%S")
-        print(f"[{timestamp}] {level}: {message}")
+        logger.log(getattr(logging, level), message)
         
     def crc16(self, data):
         """Calculate CRC16-CCITT for VESC protocol"""
-        crc = 0x0000
-        for byte in data:
-            crc ^= byte << 8
-            for _ in range(8):
-                if crc & 0x8000:
-                    crc = (crc << 1) ^ 0x1021
-                else:
-                    crc = crc << 1
-                crc &= 0xFFFF
-        return crc
+        # crc_hqx is the same CRC16-CCITT (poly 0x1021, init 0) computed
+        # table-driven in C, instead of 8 Python iterations per byte
+        return binascii.crc_hqx(data, 0)
     
     def create_vesc_packet(self, command, payload=b''):
-        """Create VESC protocol packet with proper framing"""
-        packet_payload = bytes([command]) + payload
-        payload_len = len(packet_payload)
+        """Create VESC protocol packet with proper framing
         
-        packet = b''
+        Returns a view of the reused packet buffer, valid until the next packet is built.
+        """
+        self._pkt_buf[4:4 + len(payload)] = payload
+        return self._frame_packet(command, len(payload))
+    
+    def _frame_packet(self, command, data_len):
+        """Add header, command, CRC and end byte around data already at _pkt_buf[4:]"""
+        buf = self._pkt_buf
+        payload_len = 1 + data_len
         
         if payload_len <= 255:
             # Short packet
-            packet += bytes([0x02, payload_len])
+            start = 1
+            buf[1] = 0x02
+            _SHORT_LEN.pack_into(buf, 2, payload_len)
         else:
-            # Long packet  
-            packet += bytes([0x03, (payload_len >> 8) & 0xFF, payload_len & 0xFF])
-            
-        # Add payload
-        packet += packet_payload
-        
-        # Calculate CRC on payload only (not start/length bytes)
-        crc = self.crc16(packet_payload)
+            # Long packet
+            start = 0
+            buf[0] = 0x03
+            _LONG_LEN.pack_into(buf, 1, payload_len)
+        buf[3] = command
         
-        # Add CRC and end byte
-        packet += struct.pack('>H', crc) + bytes([0x03])
+        # CRC on payload only (not start/length bytes), then the end byte
+        end = 3 + payload_len
+        _CRC_TAIL.pack_into(buf, end, self.crc16(self._pkt_view[3:end]), 0x03)
         
-        return packet
+        return self._pkt_view[start:end + 3]
         
     def connect_to_device(self):
         """Connect to VESC Express via serial/USB"""
         self.log(f"🔗 Connecting to VESC Express at {self.device_port}")
         
         try:
-            self.ser = serial.Serial(self.device_port, self.baudrate, timeout=3)
+            self.ser = serial.Serial(self.device_port, self.baudrate, timeout=0.05)
             time.sleep(0.5)  # Let serial settle
             
             # Clear any pending data
             self.ser.flushInput()
             self.ser.flushOutput()
             
+            # Ask the driver not to hold back received bytes (pyserial on Linux);
+            # USB CDC drivers that lack ASYNC_LOW_LATENCY simply refuse
+            if hasattr(self.ser, 'set_low_latency_mode'):
+                try:
+                    self.ser.set_low_latency_mode(True)
+                except (OSError, ValueError):
+                    pass
+            
             self.log("✅ Connected to VESC Express via serial")
             return True
         except Exception as e:
@@ -87,42 +149,24 @@ class VESCSerialOTATester:
     
     def send_packet(self, command, payload=b'', expect_response=True):
         """Send VESC packet via serial and optionally wait for response"""
+        return self.send_raw(self.create_vesc_packet(command, payload), expect_response)
+    
+    def send_raw(self, packet, expect_response=True):
+        """Send an already framed packet and optionally wait for response"""
         if not self.ser:
             self.log("❌ Not connected to device", "ERROR")
             return None
             
-        packet = self.create_vesc_packet(command, payload)
-        self.log(f"📤 Sending command {command} ({len(packet)} bytes): {packet.hex()}")
-        
         try:
-            self.ser.write(packet)
-            self.ser.flush()
+            # Command follows the 1-byte (short) or 2-byte (long) length
+            self._send_frame(packet[2] if packet[0] == 0x02 else packet[3], packet)
             
             if expect_response:
-                # Wait for response with timeout
-                response = b''
-                start_time = time.time()
-                
-                while time.time() - start_time < 5.0:  # 5 second timeout
-                    if self.ser.in_waiting:
-                        data = self.ser.read(self.ser.in_waiting)
-                        response += data
-                        self.log(f"📥 Received {len(data)} bytes: {data.hex()}")
-                        
-                        # Check if we have a complete packet
-                        if len(response) >= 4 and response[0] in [0x02, 0x03]:
-                            if response[0] == 0x02 and len(response) >= response[1] + 4:
-                                # Complete short packet
-                                break
-                            elif response[0] == 0x03 and len(response) >= 4:
-                                expected_len = (response[1] << 8) | response[2]
-                                if len(response) >= expected_len + 5:
-                                    # Complete long packet
-                                    break
-                    time.sleep(0.01)
+                # Blocking reads sized from the frame header, 5 second timeout
+                response = self._read_frame(time.monotonic() + 5.0)
                 
                 if response:
-                    self.log(f"📥 Complete response ({len(response)} bytes): {response.hex()}")
+                    logger.debug("📥 Complete response (%d bytes): %s", len(response), _LazyHex(response))
                     return response
                 else:
                     self.log("⚠️  No response received")
@@ -133,12 +177,45 @@ class VESCSerialOTATester:
             self.log(f"❌ Send failed: {e}", "ERROR")
             return None
     
+    def _send_frame(self, command, packet, flush=True):
+        """Write an already framed packet"""
+        logger.debug("📤 Sending command %d (%d bytes): %s", command, len(packet), _LazyHex(packet))
+        self.ser.write(packet)
+        if flush:
+            # Blocks until the OS has transmitted everything written
+            self.ser.flush()
+    
+    def _read_exact(self, n, deadline):
+        """Read n bytes, returning fewer only if the deadline passes"""
+        data = self.ser.read(n)
+        while len(data) < n and time.monotonic() < deadline:
+            data += self.ser.read(n - len(data))
+        return data
+    
+    def _read_frame(self, deadline):
+        """Read one VESC frame: start byte, length, then exactly payload + CRC + end byte"""
+        # Skip anything before a start byte (e.g. boot log text)
+        start = b''
+        while start not in _FRAME_LEN:
+            if time.monotonic() >= deadline:
+                return b''
+            start = self.ser.read(1)
+        
+        # The start byte selects the length field's layout
+        length_field = _FRAME_LEN[start]
+        header = self._read_exact(length_field.size, deadline)
+        if len(header) != length_field.size:
+            return start + header
+        length, = length_field.unpack(header)
+        
+        return start + header + self._read_exact(length + 3, deadline)
+    
     def test_connection(self):
         """Test basic communication with VESC Express"""
         self.log("🔍 Testing VESC communication...")
         
         # Test ALIVE command
-        response = self.send_packet(self.COMM_ALIVE)
+        response = self.send_raw(self._pkt_alive)
         if response:
             self.log("✅ VESC communication working")
             return True
@@ -150,7 +227,7 @@ class VESCSerialOTATester:
         """Get current firmware version"""
         self.log("📋 Getting firmware version...")
         
-        response = self.send_packet(self.COMM_FW_VERSION)
+        response = self.send_raw(self._pkt_fwver)
         if response and len(response) > 4:
             self.log(f"📦 Firmware version data: {response.hex()}")
             return True
@@ -187,54 +264,83 @@ class VESCSerialOTATester:
             self.log("⚠️  Unexpected erase response format")
             return False
     
-    def stream_firmware(self, firmware_path, chunk_size=256):
-        """Stream firmware data to device via serial"""
+    def stream_firmware(self, firmware_path, chunk_size=OTA_CHUNK_SIZE, window=OTA_WINDOW):
+        """Stream firmware data to device via serial, keeping up to window chunks in flight"""
+        # Command byte + 4-byte offset + chunk must fit the device's packet buffer
+        chunk_size = min(chunk_size, PACKET_MAX_PL_LEN - 5)
         self.log(f"📤 Streaming firmware in {chunk_size}-byte chunks...")
         
         try:
-            with open(firmware_path, 'rb') as f:
-                firmware_data = f.read()
-                
-            total_size = len(firmware_data)
-            sent_bytes = 0
-            chunk_num = 0
-            
-            while sent_bytes < total_size:
+            with open(firmware_path, 'rb') as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapping, \
+                    memoryview(mapping) as firmware_data:
+                # Slicing the view (not the mmap) avoids a bytes copy per chunk
+                return self._stream_mapped(firmware_data, chunk_size, window)
+        except Exception as e:
+            self.log(f"❌ Firmware streaming failed: {e}", "ERROR")
+            return False
+    
+    def _stream_mapped(self, firmware_data, chunk_size, window):
+        """Send each chunk straight from the mapped firmware image"""
+        total_size = len(firmware_data)
+        sent_bytes = 0
+        acked_bytes = 0
+        chunk_num = 0
+        
+        # Chunks written but not yet acknowledged, oldest first; the device
+        # answers every chunk in order with [command, ok, offset]
+        pending = collections.deque()
+        
+        while acked_bytes < total_size:
+            # Keep the link busy while the device processes earlier chunks
+            while sent_bytes < total_size and len(pending) < window:
                 chunk_end = min(sent_bytes + chunk_size, total_size)
-                chunk = firmware_data[sent_bytes:chunk_end]
-                
-                # Create payload: offset (4 bytes) + chunk data
-                payload = struct.pack('>I', sent_bytes) + chunk
+                n = chunk_end - sent_bytes
                 
-                response = self.send_packet(self.COMM_WRITE_NEW_APP_DATA, payload)
+                # Payload is offset (4 bytes) + chunk data, written straight
+                # from the mapping into the packet buffer
+                struct.pack_into('>I', self._pkt_buf, 4, sent_bytes)
+                self._pkt_buf[8:8 + n] = firmware_data[sent_bytes:chunk_end]
+                packet = self._frame_packet(self.COMM_WRITE_NEW_APP_DATA, 4 + n)
+                # No per-chunk drain: the ack read below paces the writes
+                self._send_frame(self.COMM_WRITE_NEW_APP_DATA, packet, flush=False)
                 
-                if not response:
-                    self.log(f"❌ Failed to send chunk {chunk_num} at offset {sent_bytes}", "ERROR")
-                    return False
-                
-                sent_bytes += len(chunk)
+                pending.append((chunk_num, sent_bytes, n))
+                sent_bytes += n
                 chunk_num += 1
-                
-                # Progress update
-                progress = (sent_bytes / total_size) * 100
-                if chunk_num % 10 == 0 or sent_bytes >= total_size:
-                    self.log(f"📊 Progress: {progress:.1f}% ({sent_bytes}/{total_size} bytes)")
-                
-                # Small delay to prevent overwhelming the device
-                time.sleep(0.01)
             
-            self.log("✅ Firmware streaming completed")
-            return True
+            response = self._read_frame(time.monotonic() + 5.0)
+            if not response:
+                num, offset, _ = pending[0]
+                self.log(f"❌ Failed to send chunk {num} at offset {offset}", "ERROR")
+                return False
             
-        except Exception as e:
-            self.log(f"❌ Firmware streaming failed: {e}", "ERROR")
-            return False
+            # Payload follows a 2-byte (short) or 3-byte (long) header
+            reply = response[2 if response[0] == 0x02 else 3:-3]
+            if not reply or reply[0] != self.COMM_WRITE_NEW_APP_DATA:
+                continue
+            
+            num, offset, n = pending.popleft()
+            if len(reply) >= 2 and not reply[1]:
+                self.log(f"❌ Device rejected chunk {num} at offset {offset}", "ERROR")
+                return False
+            acked_bytes += n
+            
+            # Progress update
+            progress = (acked_bytes / total_size) * 100
+            if (num + 1) % 10 == 0 or acked_bytes >= total_size:
+                self.log(f"📊 Progress: {progress:.1f}% ({acked_bytes}/{total_size} bytes)")
+        
+        # One C-level pass over the mapping already in memory, no second file read
+        self.log(f"🔒 Firmware SHA256: {hashlib.sha256(firmware_data).hexdigest()}")
+        self.log("✅ Firmware streaming completed")
+        return True
     
     def complete_ota_update(self):
         """Complete OTA update and switch partitions"""
         self.log("🔄 Completing OTA update and switching partitions...")
         
-        response = self.send_packet(self.COMM_JUMP_TO_BOOTLOADER, expect_response=False)
+        response = self.send_raw(self._pkt_jump, expect_response=False)
         
         if response is not None:
             self.log("✅ OTA completion command sent")
@@ -266,7 +372,7 @@ class VESCSerialOTATester:
         self.log("❌ Failed to verify OTA success - device not responding", "ERROR")
         return False
     
-    def run_full_ota_test(self, firmware_path):
+    def run_full_ota_test(self, firmware_path, chunk_size=OTA_CHUNK_SIZE):
         """Run complete OTA update test via serial"""
         self.log("🔍 VESC Express Serial OTA Update Test")
         self.log("=" * 60)
@@ -286,7 +392,7 @@ class VESCSerialOTATester:
             return False
         
         # Step 4: Stream firmware
-        if not self.stream_firmware(firmware_path):
+        if not self.stream_firmware(firmware_path, chunk_size):
             return False
         
         # Step 5: Complete update
@@ -297,17 +403,23 @@ class VESCSerialOTATester:
         return self.verify_ota_success()
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python3 vesc_serial_ota_tester.py <firmware.bin> [device_port] [baudrate]")
-        print("Example: python3 vesc_serial_ota_tester.py build/vesc_express.bin /dev/ttyACM0 115200")
-        return 1
-    
-    firmware_path = sys.argv[1]
-    device_port = sys.argv[2] if len(sys.argv) > 2 else "/dev/ttyACM0"
-    baudrate = int(sys.argv[3]) if len(sys.argv) > 3 else 115200
+    parser = argparse.ArgumentParser(
+        description='VESC Express Serial OTA Update Tester',
+        epilog='Example: python3 vesc_serial_ota_tester.py build/vesc_express.bin /dev/ttyACM0 115200')
+    parser.add_argument('firmware', help='Firmware image (.bin)')
+    parser.add_argument('device_port', nargs='?', default='/dev/ttyACM0',
+                        help='Serial device (default: /dev/ttyACM0)')
+    parser.add_argument('baudrate', nargs='?', type=int, default=115200,
+                        help='Baud rate (default: 115200)')
+    parser.add_argument('--chunk-size', type=int, default=OTA_CHUNK_SIZE,
+                        help=f'Firmware bytes per OTA packet, at most {PACKET_MAX_PL_LEN - 5} '
+                             f'(default: {OTA_CHUNK_SIZE})')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='Log every packet sent and received as hex')
+    args = parser.parse_args()
     
-    tester = VESCSerialOTATester(device_port, baudrate)
-    success = tester.run_full_ota_test(firmware_path)
+    tester = VESCSerialOTATester(args.device_port, args.baudrate, args.verbose)
+    success = tester.run_full_ota_test(args.firmware, args.chunk_size)
     
     return 0 if success else 1
 
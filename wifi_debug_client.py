@@ -4,11 +4,24 @@ WiFi Debug Client for ESP32-C6 VESC Express
 Connects to the WiFi debugging interface and displays real-time logs
 """
 
+import binascii
+import selectors
 import socket
+import subprocess
+import sys
 import time
 import threading
 import json
-import urllib.request
+import http.client
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+def _vesc_packet(payload):
+    """Frame a short VESC packet; CRC16 covers the payload only, as in main/packet.c"""
+    return bytes([0x02, len(payload)]) + payload + binascii.crc_hqx(payload, 0).to_bytes(2, 'big') + b'\x03'
+
+# Fixed test command packets (COMM_FW_VERSION, COMM_GET_VALUES), framed once
+FW_VERSION_PACKET = _vesc_packet(bytes([0]))
+GET_VALUES_PACKET = _vesc_packet(bytes([4]))
 
 class VESCWiFiDebugClient:
     def __init__(self, host='192.168.5.107', tcp_port=23456, web_port=80):
@@ -17,51 +30,108 @@ class VESCWiFiDebugClient:
         self.web_port = web_port
         self.tcp_sock = None
         self.running = False
+        # Readiness for the debug socket, so the receiver sleeps in the kernel
+        # instead of cycling through recv timeouts
+        self._sel = selectors.DefaultSelector()
+        # One keep-alive connection shared by every web API request
+        self._http = None
         
     def test_connectivity(self):
         """Test basic connectivity to VESC Express"""
         print(f"🔍 Testing connectivity to {self.host}")
         
-        # Test ping
-        import subprocess
+        # The probes only wait on the network, so run them together: the
+        # worst case is the slowest probe rather than the sum of all three
+        probes = (self._probe_ping, self._probe_web, self._probe_tcp)
+        with ThreadPoolExecutor(max_workers=len(probes)) as pool:
+            for future in as_completed([pool.submit(probe) for probe in probes]):
+                print(future.result())
+    
+    def _probe_ping(self):
+        """Ping the device once"""
         try:
             result = subprocess.run(['ping', '-c', '1', self.host], 
                                   capture_output=True, text=True, timeout=5)
             if result.returncode == 0:
-                print("✅ Ping: Success")
-            else:
-                print("❌ Ping: Failed")
+                return "✅ Ping: Success"
+            return "❌ Ping: Failed"
         except:
-            print("❌ Ping: Failed")
-        
-        # Test web dashboard
+            return "❌ Ping: Failed"
+    
+    def _probe_web(self):
+        """Check the web dashboard answers"""
         try:
-            response = urllib.request.urlopen(f'http://{self.host}:{self.web_port}', timeout=5)
-            if response.status == 200:
-                print("✅ Web Dashboard: Online")
-            else:
-                print(f"❌ Web Dashboard: HTTP {response.status}")
+            status, _ = self._http_get('/')
+            if status == 200:
+                return "✅ Web Dashboard: Online"
+            return f"❌ Web Dashboard: HTTP {status}"
         except Exception as e:
-            print(f"❌ Web Dashboard: {e}")
-            
-        # Test TCP debug port
+            return f"❌ Web Dashboard: {e}"
+    
+    def _probe_tcp(self):
+        """Check the TCP debug port accepts connections, keeping the socket for monitoring"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             sock.settimeout(5)
-            result = sock.connect_ex((self.host, self.tcp_port))
-            if result == 0:
-                print("✅ TCP Debug Server: Online")
-                sock.close()
-            else:
-                print("❌ TCP Debug Server: Not responding")
+            if sock.connect_ex((self.host, self.tcp_port)) == 0:
+                # connect_tcp_debug reuses this instead of a second handshake
+                sock.settimeout(10)
+                if self.tcp_sock is not None:
+                    self.tcp_sock.close()
+                self.tcp_sock = sock
+                return "✅ TCP Debug Server: Online"
+            sock.close()
+            return "❌ TCP Debug Server: Not responding"
         except Exception as e:
-            print(f"❌ TCP Debug Server: {e}")
+            sock.close()
+            return f"❌ TCP Debug Server: {e}"
+    
+    def _http_get(self, path):
+        """GET path over the shared keep-alive connection; returns (status, body)"""
+        for attempt in range(2):
+            if self._http is None:
+                self._http = http.client.HTTPConnection(self.host, self.web_port, timeout=5)
+            try:
+                self._http.request('GET', path, headers={'Connection': 'keep-alive'})
+                response = self._http.getresponse()
+                # The body must be drained before the connection can be reused
+                body = response.read()
+                if response.will_close:
+                    self._close_http()
+                return response.status, body
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # The server dropped the idle connection; reconnect once
+                self._close_http()
+                if attempt:
+                    raise
+            except Exception:
+                self._close_http()
+                raise
+    
+    def _get_json(self, path):
+        """GET path and decode its JSON body"""
+        status, body = self._http_get(path)
+        if status != 200:
+            raise http.client.HTTPException(f"HTTP {status}")
+        return json.loads(body)
+    
+    def _close_http(self):
+        """Close the web API connection only, leaving the debug socket alone"""
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+    
+    def close(self):
+        """Close the web API and TCP debug connections"""
+        self._close_http()
+        if self.tcp_sock is not None:
+            self.tcp_sock.close()
+            self.tcp_sock = None
     
     def get_system_status(self):
         """Get system status from web API"""
         try:
-            response = urllib.request.urlopen(f'http://{self.host}:{self.web_port}/api/status', timeout=5)
-            data = json.loads(response.read().decode())
+            data = self._get_json('/api/status')
             
             print("\n📊 System Status:")
             print(f"   Uptime: {data['uptime_ms']/1000:.1f}s")
@@ -77,8 +147,7 @@ class VESCWiFiDebugClient:
     def get_vesc_status(self):
         """Get VESC status from web API"""
         try:
-            response = urllib.request.urlopen(f'http://{self.host}:{self.web_port}/api/vesc', timeout=5)
-            data = json.loads(response.read().decode())
+            data = self._get_json('/api/vesc')
             
             print("\n🚗 VESC Status:")
             print(f"   CAN Connected: {'✅' if data['can_connected'] else '❌'}")
@@ -94,13 +163,19 @@ class VESCWiFiDebugClient:
     def connect_tcp_debug(self):
         """Connect to TCP debug server"""
         try:
-            self.tcp_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.tcp_sock.settimeout(10)
-            self.tcp_sock.connect((self.host, self.tcp_port))
+            # test_connectivity leaves its probe connection open for this
+            if self.tcp_sock is None:
+                self.tcp_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                self.tcp_sock.settimeout(10)
+                self.tcp_sock.connect((self.host, self.tcp_port))
+            self._sel.register(self.tcp_sock, selectors.EVENT_READ)
             print(f"✅ Connected to TCP debug server at {self.host}:{self.tcp_port}")
             return True
         except Exception as e:
             print(f"❌ Failed to connect to TCP debug server: {e}")
+            if self.tcp_sock is not None:
+                self.tcp_sock.close()
+                self.tcp_sock = None
             return False
     
     def tcp_receiver(self):
@@ -108,19 +183,37 @@ class VESCWiFiDebugClient:
         print("\n📡 Real-time debug logs:")
         print("-" * 60)
         
+        # Pass the device's bytes straight to the binary stdout layer instead of
+        # decoding and re-encoding every chunk; flush the header text first so
+        # it stays ahead of them
+        sys.stdout.flush()
+        out = getattr(sys.stdout, 'buffer', None)
+        unflushed = 0
+        last_flush = time.monotonic()
+        
         while self.running:
             try:
-                if self.tcp_sock:
-                    self.tcp_sock.settimeout(1)
-                    data = self.tcp_sock.recv(1024)
-                    if data:
-                        message = data.decode('utf-8', errors='ignore')
-                        print(message, end='')
-                    else:
+                # Wake per arrival; the timeout only bounds how long a stop takes to notice
+                events = self._sel.select(timeout=0.1 if unflushed else 0.5)
+                for key, _ in events:
+                    data = key.fileobj.recv(4096)
+                    if not data:
+                        if out:
+                            out.flush()
                         print("🔌 TCP connection closed by server")
-                        break
-            except socket.timeout:
-                continue
+                        return
+                    if out:
+                        out.write(data)
+                        unflushed += len(data)
+                    else:
+                        print(data.decode('utf-8', errors='ignore'), end='')
+                
+                # Flush per 4 KB, every 100 ms, or once the stream goes quiet
+                now = time.monotonic()
+                if unflushed and (unflushed >= 4096 or now - last_flush >= 0.1 or not events):
+                    out.flush()
+                    unflushed = 0
+                    last_flush = now
             except Exception as e:
                 print(f"\n❌ TCP receive error: {e}")
                 break
@@ -146,9 +239,9 @@ class VESCWiFiDebugClient:
             except KeyboardInterrupt:
                 print("\n\n⏹️  Monitoring stopped by user")
                 self.running = False
+            self._sel.unregister(self.tcp_sock)
         
-        if self.tcp_sock:
-            self.tcp_sock.close()
+        self.close()
     
     def send_test_commands(self):
         """Send test VESC commands via TCP to generate debug output"""
@@ -161,15 +254,13 @@ class VESCWiFiDebugClient:
             vesc_sock.connect((self.host, 65102))
             
             # Send VESC firmware version request
-            cmd = bytes([0x02, 0x01, 0x00, 0x01, 0x03])
-            vesc_sock.send(cmd)
+            vesc_sock.sendall(FW_VERSION_PACKET)
             print("📤 Sent: Get Firmware Version")
             
             time.sleep(0.5)
             
             # Send VESC values request  
-            cmd = bytes([0x02, 0x01, 0x04, 0x05, 0x03])
-            vesc_sock.send(cmd)
+            vesc_sock.sendall(GET_VALUES_PACKET)
             print("📤 Sent: Get Values")
             
             vesc_sock.close()
@@ -179,8 +270,6 @@ class VESCWiFiDebugClient:
             print(f"❌ Failed to send test commands: {e}")
 
 def main():
-    import sys
-    
     print("🔧 ESP32-C6 VESC Express WiFi Debug Client")
     print("==========================================")
     
@@ -197,6 +286,7 @@ def main():
         client.get_system_status() 
         client.get_vesc_status()
         client.send_test_commands()
+        client.close()
     else:
         # Start full monitoring
         client.start_monitoring()